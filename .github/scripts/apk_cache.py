@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+from hashing import digest_many, file_digest
+from icons import install_icon
+from instrument import count
+
+# Bump whenever the layout of a cache entry changes
+SCHEMA_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get("REPO_CACHE_DIR", ".repo-cache")
+
+class ApkCache:
+    """
+    Persistent APK metadata cache.
+
+    Entries are content-addressed by the SHA-256 of the APK and hold the parsed
+    badging fields, the signer's fingerprint and a copy of the extracted icon.
+    A (size, mtime) record per file name lets unchanged APKs skip hashing
+    altogether; a renamed or touched APK with the same content is still a hit
+    after hashing it.
+    """
+
+    def __init__(self, cache_dir, tool_version):
+        self.cache_dir = Path(cache_dir)
+        self.icon_dir = self.cache_dir / "icons"
+        self.index_path = self.cache_dir / "cache.json"
+        self.tool_version = tool_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._files = {}
+        self._entries = {}
+        self._used = set()
+        self._digests = {}
+        self._pending_icons = {}
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with self.index_path.open(encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable metadata cache: {e}")
+            return
+        if data.get("schema") != SCHEMA_VERSION:
+            print("Metadata cache schema changed, starting from scratch")
+            return
+        if data.get("tool") != self.tool_version:
+            print(f"Badging tool changed ({data.get('tool')} -> {self.tool_version}), starting from scratch")
+            return
+        self._files = data.get("files", {})
+        self._entries = data.get("entries", {})
+
+    def _is_fresh(self, record, stat):
+        return record is not None and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns
+
+    def prefetch(self, apk_paths, workers=None):
+        """
+        Hashes every APK whose (size, mtime) record is stale in one concurrent
+        batch, so that the following lookups don't have to.
+        """
+        stale = [
+            Path(x) for x in apk_paths
+            if not self._is_fresh(self._files.get(Path(x).name), Path(x).stat())
+        ]
+        digests = digest_many(stale, workers)
+        with self._lock:
+            self._digests.update(digests)
+
+    def lookup(self, apk_path):
+        """
+        Returns (sha256, size, entry) for the APK. entry is None on a miss.
+        """
+        apk_path = Path(apk_path)
+        stat = apk_path.stat()
+        with self._lock:
+            record = self._files.get(apk_path.name)
+            prefetched = self._digests.pop(apk_path, None)
+        if self._is_fresh(record, stat):
+            sha256 = record["sha256"]
+        elif prefetched is not None and prefetched[0] == stat.st_size:
+            sha256 = prefetched[1]
+        else:
+            _, sha256 = file_digest(apk_path)
+
+        with self._lock:
+            self._files[apk_path.name] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+            }
+            entry = self._entries.get(sha256)
+            if entry is not None and entry["icon"] and not (self.cache_dir / entry["icon"]).exists():
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._used.add(sha256)
+        count("metadata cache misses" if entry is None else "metadata cache hits")
+        return sha256, stat.st_size, entry
+
+    def store(self, sha256, badging, icon_path=None, sig=None):
+        """
+        Records an inspected APK. The icon at icon_path is copied into the cache
+        on save(), so any post-processing done to it in between is kept.
+        """
+        with self._lock:
+            self._entries[sha256] = {
+                "badging": badging,
+                "icon": f"icons/{sha256}.png" if icon_path else None,
+                "sig": sig,
+            }
+            self._used.add(sha256)
+            if icon_path:
+                self._pending_icons[sha256] = icon_path
+
+    def restore_icon(self, entry, dest):
+        """
+        Copies the cached icon of an entry to dest unless dest is already identical.
+        Returns False if there is no cached icon.
+        """
+        if not entry["icon"]:
+            return False
+        install_icon(self.cache_dir / entry["icon"], dest)
+        return True
+
+    def save(self):
+        # Only keep what this run used so the cache doesn't grow forever
+        entries = {k: v for k, v in self._entries.items() if k in self._used}
+        files = {k: v for k, v in self._files.items() if v["sha256"] in entries}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if self._pending_icons:
+            self.icon_dir.mkdir(parents=True, exist_ok=True)
+        for sha256, icon_path in self._pending_icons.items():
+            install_icon(icon_path, self.cache_dir / entries[sha256]["icon"])
+        self._pending_icons.clear()
+
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({
+                "schema": SCHEMA_VERSION,
+                "tool": self.tool_version,
+                "files": files,
+                "entries": entries,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+        if self.icon_dir.exists():
+            referenced = {v["icon"] for v in entries.values() if v["icon"]}
+            for icon in self.icon_dir.iterdir():
+                if f"icons/{icon.name}" not in referenced:
+                    icon.unlink(missing_ok=True)
+
+    def summary(self):
+        return f"Metadata cache: {self.hits} hit(s), {self.misses} miss(es)"
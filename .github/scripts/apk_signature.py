@@ -0,0 +1,267 @@
+"""
+Reads the signing certificate of an APK without apksigner or keytool.
+
+The signer is taken from the APK Signature Scheme v3.1/v3/v2 block that sits
+between the ZIP entries and the central directory, or, for APKs signed with
+v1 only, from the PKCS#7 META-INF/*.RSA (or .DSA, .EC) file. Its fingerprint
+is the SHA-256 of the DER certificate, which is what the repo index calls
+sig. Signatures themselves aren't verified; apksigner does that at build time.
+"""
+import argparse
+import hashlib
+import os
+import re
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import BadZipFile, ZipFile
+
+from instrument import count, span
+
+# The key the published extensions are signed with
+REPO_FINGERPRINT = os.environ.get("REPO_SIGNING_FINGERPRINT") or (
+    "212199045691887b32eb2397f167f4b7d53a73131119975df9914595bc95880a"
+)
+
+APK_SIG_BLOCK_MAGIC = b"APK Sig Block 42"
+# Newest scheme first, as the platform reads them
+SIGNATURE_SCHEME_IDS = (
+    ("v3.1", 0x1B93AD61),
+    ("v3", 0xF05368C0),
+    ("v2", 0x7109871A),
+)
+
+EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+EOCD_SIZE = 22
+MAX_COMMENT_SIZE = 0xFFFF
+
+V1_SIGNATURE_REGEX = re.compile(r"^META-INF/[^/]+\.(RSA|DSA|EC)$", re.IGNORECASE)
+
+class SignatureError(ValueError):
+    pass
+
+class SignerMismatchError(SignatureError):
+    pass
+
+def _central_directory_offset(f, file_size):
+    tail_size = min(file_size, EOCD_SIZE + MAX_COMMENT_SIZE)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    eocd = tail.rfind(EOCD_SIGNATURE)
+    if eocd < 0 or eocd + EOCD_SIZE > len(tail):
+        raise SignatureError("not a ZIP file")
+    offset = struct.unpack_from("<I", tail, eocd + 16)[0]
+    if offset == 0xFFFFFFFF:
+        locator = eocd - 20
+        if locator < 0 or tail[locator:locator + 4] != ZIP64_LOCATOR_SIGNATURE:
+            raise SignatureError("ZIP64 end of central directory locator missing")
+        record_offset = struct.unpack_from("<Q", tail, locator + 8)[0]
+        f.seek(record_offset + 48)
+        offset = struct.unpack("<Q", f.read(8))[0]
+    return offset
+
+def read_signing_block(f, file_size):
+    """
+    Returns {scheme id: value} from the APK Signing Block, or {} if there is none.
+    """
+    cd_offset = _central_directory_offset(f, file_size)
+    if cd_offset < 32:
+        return {}
+    f.seek(cd_offset - 24)
+    footer = f.read(24)
+    if footer[8:] != APK_SIG_BLOCK_MAGIC:
+        return {}
+    block_size = struct.unpack_from("<Q", footer)[0]
+    block_start = cd_offset - block_size - 8
+    if block_size < 24 or block_start < 0:
+        raise SignatureError("invalid APK Signing Block size")
+    f.seek(block_start)
+    block = f.read(block_size + 8)
+    if struct.unpack_from("<Q", block)[0] != block_size:
+        raise SignatureError("APK Signing Block sizes don't match")
+
+    values = {}
+    pos, end = 8, len(block) - 24
+    while pos < end:
+        if pos + 12 > end:
+            raise SignatureError("truncated APK Signing Block entry")
+        length, scheme_id = struct.unpack_from("<QI", block, pos)
+        if length < 4 or pos + 8 + length > end:
+            raise SignatureError("invalid APK Signing Block entry length")
+        values[scheme_id] = block[pos + 12:pos + 8 + length]
+        pos += 8 + length
+    return values
+
+def _length_prefixed(data, pos, end=None):
+    """
+    Returns (start, end) of the uint32 length-prefixed value at pos.
+    """
+    end = len(data) if end is None else end
+    if pos + 4 > end:
+        raise SignatureError("truncated length-prefixed value")
+    length = struct.unpack_from("<I", data, pos)[0]
+    if pos + 4 + length > end:
+        raise SignatureError("length-prefixed value overruns its container")
+    return pos + 4, pos + 4 + length
+
+def scheme_certificate(value):
+    """
+    The DER certificate of the first signer in a v2/v3 signature scheme block.
+    """
+    signers_start, signers_end = _length_prefixed(value, 0)
+    signer_start, signer_end = _length_prefixed(value, signers_start, signers_end)
+    # signer: signed data, signatures, public key; signed data: digests, certificates, ...
+    signed_start, signed_end = _length_prefixed(value, signer_start, signer_end)
+    _, digests_end = _length_prefixed(value, signed_start, signed_end)
+    certs_start, certs_end = _length_prefixed(value, digests_end, signed_end)
+    cert_start, cert_end = _length_prefixed(value, certs_start, certs_end)
+    if cert_start == cert_end:
+        raise SignatureError("signer without a certificate")
+    return value[cert_start:cert_end]
+
+def _der(data, pos, end=None):
+    """
+    Returns (tag, content start, content end) of the DER element at pos.
+    """
+    end = len(data) if end is None else end
+    if pos + 2 > end:
+        raise SignatureError("truncated DER element")
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or size > 4 or pos + size > end:
+            raise SignatureError("unsupported DER length")
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    if pos + length > end:
+        raise SignatureError("DER element overruns its container")
+    return tag, pos, pos + length
+
+def _der_children(data, start, end):
+    """
+    Yields (tag, element start, content start, content end) of each child element.
+    """
+    pos = start
+    while pos < end:
+        tag, content_start, content_end = _der(data, pos, end)
+        yield tag, pos, content_start, content_end
+        pos = content_end
+
+def pkcs7_certificate(data):
+    """
+    The DER certificate of the first signer in a PKCS#7 SignedData file.
+    """
+    # ContentInfo ::= SEQUENCE { contentType, [0] EXPLICIT SignedData }
+    _, info_start, info_end = _der(data, 0)
+    children = list(_der_children(data, info_start, info_end))
+    if len(children) < 2 or children[1][0] != 0xA0:
+        raise SignatureError("PKCS#7 file without SignedData")
+    _, signed_start, signed_end = _der(data, children[1][2], children[1][3])
+
+    certificates = []
+    signer_infos = None
+    for tag, _, start, end in list(_der_children(data, signed_start, signed_end))[3:]:
+        if tag == 0xA0:
+            certificates = [data[x[1]:x[3]] for x in _der_children(data, start, end)]
+        elif tag == 0x31:
+            signer_infos = (start, end)
+    if not certificates:
+        raise SignatureError("PKCS#7 file without certificates")
+    if len(certificates) == 1 or signer_infos is None:
+        return certificates[0]
+
+    # Match the first signer's issuer and serial number against the certificates
+    for _, _, start, end in _der_children(data, *signer_infos):
+        fields = list(_der_children(data, start, end))
+        # Signers identified by subject key identifier instead (version 3) can't be matched here
+        if len(fields) < 2 or data[fields[0][2]:fields[0][3]] != b"\x01" or fields[1][0] != 0x30:
+            break
+        sid = list(_der_children(data, fields[1][2], fields[1][3]))
+        if len(sid) < 2:
+            break
+        issuer, serial = (data[x[1]:x[3]] for x in sid[:2])
+        for certificate in certificates:
+            _, cert_start, cert_end = _der(certificate, 0)
+            _, tbs_start, tbs_end = _der(certificate, cert_start, cert_end)
+            fields = list(_der_children(certificate, tbs_start, tbs_end))
+            # Skip the optional [0] version
+            if fields and fields[0][0] == 0xA0:
+                fields = fields[1:]
+            if len(fields) >= 3 and (
+                certificate[fields[0][1]:fields[0][3]] == serial and certificate[fields[2][1]:fields[2][3]] == issuer
+            ):
+                return certificate
+        break
+    return certificates[0]
+
+def signer_certificate(apk_path):
+    """
+    Returns (scheme, DER certificate) of the APK's signer.
+    """
+    with open(apk_path, "rb") as f:
+        try:
+            file_size = os.fstat(f.fileno()).st_size
+            block = read_signing_block(f, file_size)
+            for scheme, scheme_id in SIGNATURE_SCHEME_IDS:
+                if scheme_id in block:
+                    return scheme, scheme_certificate(block[scheme_id])
+
+            with ZipFile(f) as z:
+                for name in sorted(z.namelist()):
+                    if V1_SIGNATURE_REGEX.match(name):
+                        return "v1", pkcs7_certificate(z.read(name))
+        except (struct.error, BadZipFile) as e:
+            raise SignatureError(str(e)) from e
+    raise SignatureError("APK is not signed")
+
+def signer_fingerprint(apk_path):
+    """
+    SHA-256 of the APK's signing certificate, as a hex string.
+    """
+    _, certificate = signer_certificate(apk_path)
+    count("signers read")
+    return hashlib.sha256(certificate).hexdigest()
+
+def signer_fingerprints(apk_paths, workers=None):
+    """
+    Reads the signers of several APKs concurrently. Only a few kilobytes are
+    read per APK, so the time goes into I/O rather than parsing.
+    Returns a dict of path -> fingerprint, or the SignatureError raised for it.
+    """
+    def read(apk_path):
+        try:
+            return signer_fingerprint(apk_path)
+        except (OSError, SignatureError) as e:
+            return SignatureError(f"{apk_path}: {e}")
+
+    apk_paths = list(apk_paths)
+    with span("read signers"), ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        return dict(zip(apk_paths, executor.map(read, apk_paths)))
+
+def check_signer(apk_name, fingerprint, expected=REPO_FINGERPRINT):
+    if fingerprint != expected:
+        raise SignerMismatchError(
+            f"{apk_name} is signed by {fingerprint[:12]}..., expected {expected[:12]}... "
+            "(set REPO_SIGNING_FINGERPRINT if the repo key changed)"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the signing certificate fingerprints of APKs")
+    parser.add_argument("apks", nargs="+", help="APK files")
+    parser.add_argument("--check", action="store_true", help=f"fail unless every APK is signed by {REPO_FINGERPRINT[:12]}...")
+    parser.add_argument("-j", "--workers", type=int, help="number of APKs to read concurrently (default: CPU count)")
+    args = parser.parse_args()
+
+    failed = False
+    for apk, result in signer_fingerprints(args.apks, args.workers).items():
+        if isinstance(result, SignatureError):
+            print(result)
+            failed = True
+            continue
+        print(f"{apk}: {result}")
+        if args.check and result != REPO_FINGERPRINT:
+            print(f"{apk}: not signed by the repo key")
+            failed = True
+    sys.exit(1 if failed else 0)
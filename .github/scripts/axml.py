@@ -0,0 +1,289 @@
+"""
+Minimal readers for the compiled Android resource formats: binary XML
+(AndroidManifest.xml) and the resource table (resources.arsc).
+
+Only what the repo index needs is implemented: walking manifest elements with
+their typed attribute values, and resolving resource IDs to their values per
+configuration.
+"""
+import struct
+
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+
+UTF8_FLAG = 0x100
+
+TYPE_NULL = 0x00
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+TYPE_INT_BOOLEAN = 0x12
+# Decimal, hex, boolean and color values are all plain integers
+TYPE_FIRST_INT = 0x10
+TYPE_LAST_INT = 0x1f
+
+ENTRY_FLAG_COMPLEX = 0x0001
+ENTRY_FLAG_COMPACT = 0x0008
+TYPE_FLAG_SPARSE = 0x01
+TYPE_FLAG_OFFSET16 = 0x02
+NO_ENTRY = 0xFFFFFFFF
+
+DENSITY_ANY = 0xFFFE
+
+class FormatError(Exception):
+    pass
+
+def _chunk_header(data, offset):
+    if offset + 8 > len(data):
+        raise FormatError(f"truncated chunk header at {offset}")
+    chunk_type, header_size, size = struct.unpack_from("<HHI", data, offset)
+    if size < header_size or offset + size > len(data):
+        raise FormatError(f"invalid chunk size at {offset}")
+    return chunk_type, header_size, size
+
+def _decode_length(data, offset, utf8):
+    if utf8:
+        length = data[offset]
+        if length & 0x80:
+            return ((length & 0x7F) << 8) | data[offset + 1], offset + 2
+        return length, offset + 1
+    length = struct.unpack_from("<H", data, offset)[0]
+    if length & 0x8000:
+        return ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, offset + 2)[0], offset + 4
+    return length, offset + 2
+
+def read_string_pool(data, offset):
+    _, header_size, _ = _chunk_header(data, offset)
+    string_count, _, flags, strings_start, _ = struct.unpack_from("<IIIII", data, offset + 8)
+    utf8 = bool(flags & UTF8_FLAG)
+    offsets = struct.unpack_from(f"<{string_count}I", data, offset + header_size)
+
+    strings = []
+    for string_offset in offsets:
+        position = offset + strings_start + string_offset
+        if utf8:
+            # UTF-16 length first, then the UTF-8 byte length we actually need
+            _, position = _decode_length(data, position, True)
+            length, position = _decode_length(data, position, True)
+            strings.append(data[position:position + length].decode("utf-8", "replace"))
+        else:
+            length, position = _decode_length(data, position, False)
+            strings.append(data[position:position + length * 2].decode("utf-16-le", "replace"))
+    return strings
+
+class Value:
+    __slots__ = ("type", "data", "string")
+
+    def __init__(self, value_type, data, string=None):
+        self.type = value_type
+        self.data = data
+        self.string = string
+
+    def __repr__(self):
+        return f"Value(type={self.type:#x}, data={self.data:#x}, string={self.string!r})"
+
+class Element:
+    __slots__ = ("name", "attributes", "children", "parent")
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        # (name, resource id or None) -> Value
+        self.attributes = attributes
+        self.children = []
+        self.parent = parent
+
+    def get(self, name, resource_id=None):
+        """
+        Looks an attribute up by its android resource ID, falling back to its name
+        since some toolchains strip attribute names from the string pool.
+        """
+        for (attr_name, attr_id), value in self.attributes.items():
+            if resource_id is not None and attr_id == resource_id:
+                return value
+        for (attr_name, _), value in self.attributes.items():
+            if attr_name == name:
+                return value
+        return None
+
+    def iter(self, name):
+        for child in self.children:
+            if child.name == name:
+                yield child
+            yield from child.iter(name)
+
+def parse_xml(data):
+    """
+    Parses a binary XML document and returns its root Element.
+    """
+    chunk_type, header_size, size = _chunk_header(data, 0)
+    if chunk_type != RES_XML_TYPE:
+        raise FormatError("not a binary XML document")
+
+    strings = []
+    resource_ids = []
+    root = None
+    current = None
+
+    offset = header_size
+    while offset < size:
+        chunk_type, chunk_header_size, chunk_size = _chunk_header(data, offset)
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = read_string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            count = (chunk_size - chunk_header_size) // 4
+            resource_ids = struct.unpack_from(f"<{count}I", data, offset + chunk_header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            extension = offset + chunk_header_size
+            _, name_index, attribute_start, attribute_size, attribute_count = struct.unpack_from(
+                "<IIHHH", data, extension
+            )
+            attributes = {}
+            for i in range(attribute_count):
+                position = extension + attribute_start + i * attribute_size
+                _, attr_name_index, raw_index, _, _, value_type, value_data = struct.unpack_from(
+                    "<IIIHBBI", data, position
+                )
+                attr_name = strings[attr_name_index] if attr_name_index < len(strings) else ""
+                attr_id = resource_ids[attr_name_index] if attr_name_index < len(resource_ids) else None
+                raw = strings[raw_index] if raw_index != NO_ENTRY and raw_index < len(strings) else None
+                if value_type == TYPE_STRING and value_data < len(strings):
+                    raw = strings[value_data]
+                attributes[(attr_name, attr_id)] = Value(value_type, value_data, raw)
+
+            element = Element(strings[name_index], attributes, current)
+            if current is None:
+                root = element
+            else:
+                current.children.append(element)
+            current = element
+        elif chunk_type == RES_XML_END_ELEMENT_TYPE:
+            if current is not None:
+                current = current.parent
+        offset += chunk_size
+
+    if root is None:
+        raise FormatError("binary XML document has no elements")
+    return root
+
+class Config:
+    __slots__ = ("language", "country", "density")
+
+    def __init__(self, language, country, density):
+        self.language = language
+        self.country = country
+        self.density = density
+
+    @property
+    def is_default_locale(self):
+        return not self.language and not self.country
+
+class ResourceTable:
+    """
+    Index of resources.arsc: resource ID -> [(Config, Value)].
+    """
+
+    def __init__(self, data):
+        self.strings = []
+        self.entries = {}
+
+        chunk_type, header_size, size = _chunk_header(data, 0)
+        if chunk_type != RES_TABLE_TYPE:
+            raise FormatError("not a resource table")
+
+        offset = header_size
+        while offset < size:
+            chunk_type, _, chunk_size = _chunk_header(data, offset)
+            if chunk_type == RES_STRING_POOL_TYPE:
+                self.strings = read_string_pool(data, offset)
+            elif chunk_type == RES_TABLE_PACKAGE_TYPE:
+                self._read_package(data, offset)
+            offset += chunk_size
+
+    def _read_package(self, data, package_offset):
+        _, header_size, size = _chunk_header(data, package_offset)
+        package_id = struct.unpack_from("<I", data, package_offset + 8)[0]
+
+        offset = package_offset + header_size
+        end = package_offset + size
+        while offset < end:
+            chunk_type, _, chunk_size = _chunk_header(data, offset)
+            if chunk_type == RES_TABLE_TYPE_TYPE:
+                self._read_type(data, offset, package_id)
+            offset += chunk_size
+
+    def _read_type(self, data, offset, package_id):
+        _, header_size, _ = _chunk_header(data, offset)
+        type_id, flags, _, entry_count, entries_start = struct.unpack_from("<BBHII", data, offset + 8)
+
+        config_offset = offset + 20
+        language = data[config_offset + 8:config_offset + 10].rstrip(b"\0").decode("latin-1")
+        country = data[config_offset + 10:config_offset + 12].rstrip(b"\0").decode("latin-1")
+        density = struct.unpack_from("<H", data, config_offset + 14)[0]
+        config = Config(language, country, density)
+
+        index_offset = offset + header_size
+        if flags & TYPE_FLAG_SPARSE:
+            indices = [
+                struct.unpack_from("<HH", data, index_offset + i * 4)
+                for i in range(entry_count)
+            ]
+            slots = [(index, entry_offset * 4) for index, entry_offset in indices]
+        elif flags & TYPE_FLAG_OFFSET16:
+            raw = struct.unpack_from(f"<{entry_count}H", data, index_offset)
+            slots = [(i, x * 4) for i, x in enumerate(raw) if x != 0xFFFF]
+        else:
+            raw = struct.unpack_from(f"<{entry_count}I", data, index_offset)
+            slots = [(i, x) for i, x in enumerate(raw) if x != NO_ENTRY]
+
+        for index, entry_offset in slots:
+            position = offset + entries_start + entry_offset
+            entry_size, entry_flags = struct.unpack_from("<HH", data, position)
+            if entry_flags & ENTRY_FLAG_COMPACT:
+                value_type = entry_flags >> 8
+                value_data = struct.unpack_from("<I", data, position + 4)[0]
+            elif entry_flags & ENTRY_FLAG_COMPLEX:
+                # Bags (styles, arrays, ...) are never needed for the index
+                continue
+            else:
+                _, _, value_type, value_data = struct.unpack_from("<HBBI", data, position + entry_size)
+
+            string = self.strings[value_data] if value_type == TYPE_STRING and value_data < len(self.strings) else None
+            resource_id = (package_id << 24) | (type_id << 16) | index
+            self.entries.setdefault(resource_id, []).append((config, Value(value_type, value_data, string)))
+
+    def resolve(self, resource_id, density=None, depth=0):
+        """
+        Resolves a resource ID to a single Value, following references.
+        Prefers the default locale and, when density is given, the best bitmap
+        match for it: exact, then the closest higher, then the closest lower
+        density, then density-independent resources.
+        """
+        candidates = self.entries.get(resource_id)
+        if not candidates or depth > 8:
+            return None
+
+        default_locale = [x for x in candidates if x[0].is_default_locale] or candidates
+        if density is None:
+            config, value = min(default_locale, key=lambda x: x[0].density)
+        else:
+            def rank(candidate):
+                candidate_density = candidate[0].density
+                if candidate_density == density:
+                    return (0, 0)
+                if candidate_density == 0 or candidate_density == DENSITY_ANY:
+                    return (3, candidate_density)
+                if candidate_density > density:
+                    return (1, candidate_density - density)
+                return (2, density - candidate_density)
+            config, value = min(default_locale, key=rank)
+
+        if value.type == TYPE_REFERENCE:
+            return self.resolve(value.data, density, depth + 1)
+        return value
@@ -0,0 +1,196 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from zipfile import ZipFile
+
+import axml
+
+PACKAGE_NAME_REGEX = re.compile(r"package: name='([^']+)'")
+VERSION_CODE_REGEX = re.compile(r"versionCode='([^']+)'")
+VERSION_NAME_REGEX = re.compile(r"versionName='([^']+)'")
+IS_NSFW_REGEX = re.compile(r"'tachiyomi.extension.nsfw' value='([^']+)'")
+# aapt doesn't escape quotes in labels, so the label runs up to the last one on its line
+APPLICATION_LABEL_REGEX = re.compile(r"^application-label:'(.+)'$", re.MULTILINE)
+# How aapt escapes strings in its output (ResTable::normalizeForOutput)
+OUTPUT_ESCAPE_REGEX = re.compile(r'\\([\\n"])')
+APPLICATION_ICON_320_REGEX = re.compile(r"^application-icon-320:'([^']+)'", re.MULTILINE)
+
+# Bump whenever the native reader's output may change, so cached results get dropped
+NATIVE_READER_VERSION = 2
+
+ICON_DENSITY = 320
+NSFW_META_DATA = "tachiyomi.extension.nsfw"
+
+ATTR_LABEL = 0x01010001
+ATTR_ICON = 0x01010002
+ATTR_NAME = 0x01010003
+ATTR_VALUE = 0x01010024
+ATTR_VERSION_CODE = 0x0101021b
+ATTR_VERSION_NAME = 0x0101021c
+
+def find_aapt():
+    """
+    Resolves the aapt binary, preferring the latest build-tools in ANDROID_HOME.
+    """
+    try:
+        android_home = os.environ.get("ANDROID_HOME")
+        if android_home:
+            build_tools = sorted((Path(android_home) / "build-tools").iterdir())
+            if build_tools:
+                return str(build_tools[-1] / "aapt")
+    except OSError:
+        pass
+    return "aapt"
+
+def aapt_version(aapt_cmd):
+    try:
+        return subprocess.check_output([aapt_cmd, "version"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_badging(badging):
+    """
+    Picks the fields used by the repo index out of `aapt dump badging` output.
+    Missing fields are returned as None.
+    """
+    package_info = next((x for x in badging.splitlines() if x.startswith("package: ")), "")
+
+    def first(regex, text):
+        match = regex.search(text)
+        if not match:
+            return None
+        return OUTPUT_ESCAPE_REGEX.sub(lambda x: "\n" if x[1] == "n" else x[1], match[1])
+
+    code = first(VERSION_CODE_REGEX, package_info)
+    nsfw = first(IS_NSFW_REGEX, badging)
+    return {
+        "pkg": first(PACKAGE_NAME_REGEX, package_info),
+        "code": int(code) if code is not None else None,
+        "version": first(VERSION_NAME_REGEX, package_info),
+        "label": first(APPLICATION_LABEL_REGEX, badging),
+        "icon": first(APPLICATION_ICON_320_REGEX, badging),
+        "nsfw": int(nsfw) if nsfw is not None else None,
+    }
+
+def dump_badging(aapt_cmd, apk_path):
+    badging = subprocess.check_output(
+        [
+            aapt_cmd,
+            "dump",
+            "--include-meta-data",
+            "badging",
+            str(apk_path),
+        ]
+    ).decode()
+    return parse_badging(badging)
+
+def _value_to_string(value, table, density=None):
+    if value is None:
+        return None
+    if value.type == axml.TYPE_REFERENCE:
+        value = table.resolve(value.data, density) if table is not None else None
+        if value is None:
+            return None
+    if value.string is not None:
+        # aapt's regexes above never match an empty value
+        return value.string or None
+    if axml.TYPE_FIRST_INT <= value.type <= axml.TYPE_LAST_INT:
+        # Printed as a signed int like aapt does, so a true boolean is -1
+        return str(value.data - (1 << 32) if value.data & 0x80000000 else value.data)
+    return None
+
+def _to_int(text):
+    try:
+        return int(text) if text is not None else None
+    except ValueError:
+        return None
+
+def _version_code(text):
+    # aapt prints versionCode='' unless it is positive
+    code = _to_int(text)
+    return code if code is not None and code > 0 else None
+
+def read_native_badging(apk_path):
+    """
+    Reads the same fields as parse_badging() straight from the APK's binary
+    AndroidManifest.xml and resources.arsc, without spawning aapt.
+    """
+    with ZipFile(apk_path) as z:
+        manifest = axml.parse_xml(z.read("AndroidManifest.xml"))
+        names = set(z.namelist())
+        table = axml.ResourceTable(z.read("resources.arsc")) if "resources.arsc" in names else None
+
+    if manifest.name != "manifest":
+        raise axml.FormatError(f"unexpected root element <{manifest.name}>")
+
+    application = next(manifest.iter("application"), None)
+    label = icon = nsfw = None
+    if application is not None:
+        label = _value_to_string(application.get("label", ATTR_LABEL), table)
+        icon = _value_to_string(application.get("icon", ATTR_ICON), table, ICON_DENSITY)
+        for meta_data in application.iter("meta-data"):
+            if _value_to_string(meta_data.get("name", ATTR_NAME), table) == NSFW_META_DATA:
+                nsfw = _to_int(_value_to_string(meta_data.get("value", ATTR_VALUE), table))
+
+    return {
+        "pkg": _value_to_string(manifest.get("package"), table),
+        "code": _version_code(_value_to_string(manifest.get("versionCode", ATTR_VERSION_CODE), table)),
+        "version": _value_to_string(manifest.get("versionName", ATTR_VERSION_NAME), table),
+        "label": label,
+        "icon": icon,
+        "nsfw": nsfw,
+    }
+
+def read_badging(apk_path, aapt_cmd):
+    """
+    Reads APK badging in-process, falling back to aapt when the native reader
+    can't make sense of the APK.
+    """
+    try:
+        badging = read_native_badging(apk_path)
+        if badging["pkg"] and badging["code"] is not None:
+            return badging
+        print(f"Native badging reader found no package info in {Path(apk_path).name}, falling back to aapt")
+    except Exception as e:
+        print(f"Native badging reader failed for {Path(apk_path).name} ({e}), falling back to aapt")
+    return dump_badging(aapt_cmd, apk_path)
+
+def tool_version(aapt_cmd):
+    """
+    Identifies everything read_badging() may use, for cache invalidation.
+    """
+    return f"native-{NATIVE_READER_VERSION}/{aapt_version(aapt_cmd)}"
+
+def compare(apk_paths, aapt_cmd):
+    """
+    Checks that the native reader agrees with aapt. Returns the mismatch count.
+    """
+    mismatches = 0
+    for apk_path in apk_paths:
+        native = read_native_badging(apk_path)
+        reference = dump_badging(aapt_cmd, apk_path)
+        diff = {k: (native[k], reference[k]) for k in reference if native[k] != reference[k]}
+        if diff:
+            mismatches += 1
+            for key, (native_value, reference_value) in diff.items():
+                print(f"{Path(apk_path).name}: {key}: native={native_value!r} aapt={reference_value!r}")
+        else:
+            print(f"{Path(apk_path).name}: OK")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print or verify APK badging as used by the repo index")
+    parser.add_argument("apks", nargs="+", help="APK files")
+    parser.add_argument("--compare", action="store_true", help="check the native reader against aapt")
+    args = parser.parse_args()
+
+    if args.compare:
+        mismatches = compare(args.apks, find_aapt())
+        print(f"{len(args.apks) - mismatches}/{len(args.apks)} APK(s) match aapt")
+        sys.exit(1 if mismatches else 0)
+
+    for apk in args.apks:
+        print(f"{apk}: {read_native_badging(apk)}")
@@ -0,0 +1,107 @@
+"""
+Benchmarks changed-file classification on a synthetic `git diff --name-status`.
+
+Compares changes.classify() with the previous per-file loop over four regexes
+and an uncached is_dir() per match. Runs against a throwaway source tree.
+
+    python .github/scripts/bench_classify.py --files 50000 --extensions 2000
+"""
+import argparse
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from changes import classify, parse_name_status
+
+EXTENSION_REGEX = re.compile(r"^src/(?P<lang>\w+)/(?P<extension>\w+)")
+MULTISRC_LIB_REGEX = re.compile(r"^lib-multisrc/(?P<multisrc>\w+)")
+LIB_REGEX = re.compile(r"^lib/(?P<lib>\w+)")
+CORE_FILES_REGEX = re.compile(
+    r"^(buildSrc/|core/|gradle/|build\.gradle\.kts|common\.gradle|gradle\.properties|settings\.gradle\.kts|.github/scripts)"
+)
+
+LANGS = ["all", "en", "es", "fr", "ja", "ko", "pt", "zh"]
+
+def make_tree(root: Path, extensions: int, libs: int) -> tuple[list[str], list[str]]:
+    rng = random.Random(0)
+    extension_dirs = [f"src/{rng.choice(LANGS)}/ext{i}" for i in range(extensions)]
+    lib_dirs = [f"lib/lib{i}" for i in range(libs)] + [f"lib-multisrc/theme{i}" for i in range(libs)]
+    for directory in extension_dirs + lib_dirs:
+        root.joinpath(directory).mkdir(parents=True, exist_ok=True)
+    return extension_dirs, lib_dirs
+
+def make_diff(files: int, extension_dirs: list[str], lib_dirs: list[str]) -> str:
+    rng = random.Random(1)
+    lines = []
+    for i in range(files):
+        roll = rng.random()
+        if roll < 0.8:
+            path = f"{rng.choice(extension_dirs)}/src/eu/kanade/File{i}.kt"
+        elif roll < 0.9:
+            path = f"{rng.choice(lib_dirs)}/src/main/File{i}.kt"
+        elif roll < 0.95:
+            path = f"src/en/removed{i}/build.gradle"
+        else:
+            path = f"docs/file{i}.md"
+        status = rng.choice("MAD")
+        lines.append(f"{status}\t{path}")
+    # Core files last, so the old loop doesn't short-circuit before doing the work
+    lines.append("M\tcore/build.gradle.kts")
+    return "\n".join(lines)
+
+def legacy_classify(files: list[str], root: Path):
+    modules, libs, deleted = set(), set(), set()
+    for file in files:
+        if CORE_FILES_REGEX.search(file):
+            break
+        elif match := EXTENSION_REGEX.search(file):
+            lang, extension = match.group("lang"), match.group("extension")
+            if root.joinpath("src", lang, extension).is_dir():
+                modules.add(f":src:{lang}:{extension}")
+            deleted.add(f"{lang}.{extension}")
+        elif match := MULTISRC_LIB_REGEX.search(file):
+            if root.joinpath("lib-multisrc", match.group("multisrc")).is_dir():
+                libs.add(f":lib-multisrc:{match.group('multisrc')}")
+        elif match := LIB_REGEX.search(file):
+            if root.joinpath("lib", match.group("lib")).is_dir():
+                libs.add(f":lib:{match.group('lib')}")
+    return modules, libs, deleted
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20000, help="changed files in the synthetic diff")
+    parser.add_argument("--extensions", type=int, default=1500, help="extension modules in the tree")
+    parser.add_argument("--libs", type=int, default=50, help="lib and lib-multisrc modules in the tree")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        extension_dirs, lib_dirs = make_tree(root, args.extensions, args.libs)
+        diff = make_diff(args.files, extension_dirs, lib_dirs)
+        files = parse_name_status(diff)
+
+        legacy = best_of(args.repeat, lambda: legacy_classify(files, root))
+        current = best_of(args.repeat, lambda: classify(files, root))
+
+        changes = classify(files, root)
+        modules, libs, deleted = legacy_classify(files, root)
+        assert changes.extensions == modules and changes.libs == libs and changes.deleted == deleted
+
+    print(f"{len(files)} changed paths, {args.extensions} extensions, {args.libs * 2} libs")
+    print(f"legacy loop:    {legacy * 1000:8.1f} ms")
+    print(f"classify():     {current * 1000:8.1f} ms ({legacy / current:.1f}x)")
+    print(f"breakdown:      {changes.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Synthetic fixtures for the publishing script benchmarks: APKs with a real
+binary AndroidManifest.xml and resources.arsc, a stub aapt, Inspector output,
+published indexes and git histories.
+"""
+import hashlib
+import json
+import os
+import random
+import stat
+import struct
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+DENSITIES = {160: "mdpi", 240: "hdpi", 320: "xhdpi", 480: "xxhdpi", 640: "xxxhdpi"}
+
+# Stands in for a DER certificate; only its SHA-256 is ever looked at
+FIXTURE_CERTIFICATE = b"0\x82bench signing certificate"
+FIXTURE_FINGERPRINT = hashlib.sha256(FIXTURE_CERTIFICATE).hexdigest()
+SIGNATURE_SCHEME_V2_ID = 0x7109871A
+
+def string_pool(strings, utf8=False):
+    data = bytearray()
+    offsets = []
+    for s in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = s.encode("utf-8")
+            for length in (len(s), len(encoded)):
+                data += bytes([length]) if length < 0x80 else bytes([0x80 | (length >> 8), length & 0xFF])
+            data += encoded + b"\0"
+        else:
+            data += struct.pack("<H", len(s)) + s.encode("utf-16-le") + b"\0\0"
+    while len(data) % 4:
+        data += b"\0"
+    header_size = 28
+    body = struct.pack(f"<{len(strings)}I", *offsets) + bytes(data)
+    return struct.pack(
+        "<HHIIIIII", 0x0001, header_size, header_size + len(body), len(strings), 0,
+        0x100 if utf8 else 0, header_size + 4 * len(strings), 0,
+    ) + body
+
+def _node(chunk_type, body):
+    return struct.pack("<HHIII", chunk_type, 16, 16 + len(body), 1, 0xFFFFFFFF) + body
+
+def binary_manifest(package, version_code, version_name, label, icon_id, nsfw, label_id=None, utf8=False,
+                    version_code_type=0x10, nsfw_type=0x10):
+    """
+    A compiled AndroidManifest.xml as produced by aapt2 for an extension.
+    Attribute names with a resource ID come first, mirroring the resource map.
+    The nsfw meta-data is left out when nsfw is None.
+    """
+    attributes = {
+        "label": 0x01010001, "icon": 0x01010002, "name": 0x01010003,
+        "value": 0x01010024, "versionCode": 0x0101021b, "versionName": 0x0101021c,
+    }
+    strings = list(attributes) + [
+        "android", ANDROID_NS, "manifest", "package", "application", "meta-data",
+        package, version_name, "tachiyomi.extension.nsfw", label,
+    ]
+    index = {}
+    for i, s in enumerate(strings):
+        index.setdefault(s, i)
+    ns = index[ANDROID_NS]
+    no_ns = 0xFFFFFFFF
+
+    def attribute(namespace, name, value_type, data, raw=0xFFFFFFFF):
+        return struct.pack("<IIIHBBI", namespace, index[name], raw, 8, 0, value_type, data)
+
+    def string_attribute(namespace, name, value):
+        return attribute(namespace, name, 0x03, index[value], index[value])
+
+    def start(name, attrs):
+        ext = struct.pack("<IIHHHHHH", no_ns, index[name], 20, 20, len(attrs), 0, 0, 0)
+        return _node(0x0102, ext + b"".join(attrs))
+
+    def end(name):
+        return _node(0x0103, struct.pack("<II", no_ns, index[name]))
+
+    namespace = struct.pack("<II", index["android"], ns)
+    resource_map = struct.pack(f"<{len(attributes)}I", *attributes.values())
+    label_attribute = (
+        attribute(ns, "label", 0x01, label_id) if label_id is not None
+        else string_attribute(ns, "label", label)
+    )
+    chunks = b"".join([
+        string_pool(strings, utf8),
+        struct.pack("<HHI", 0x0180, 8, 8 + len(resource_map)) + resource_map,
+        _node(0x0100, namespace),
+        start("manifest", [
+            attribute(ns, "versionCode", version_code_type, version_code),
+            string_attribute(ns, "versionName", version_name),
+            string_attribute(no_ns, "package", package),
+        ]),
+        start("application", [label_attribute, attribute(ns, "icon", 0x01, icon_id)]),
+        *([
+            start("meta-data", [
+                string_attribute(ns, "name", "tachiyomi.extension.nsfw"),
+                attribute(ns, "value", nsfw_type, nsfw),
+            ]),
+            end("meta-data"),
+        ] if nsfw is not None else []),
+        end("application"),
+        end("manifest"),
+        _node(0x0101, namespace),
+    ])
+    return struct.pack("<HHI", 0x0003, 8, 8 + len(chunks)) + chunks
+
+def resource_table(types, package_id=0x7F):
+    """
+    A resources.arsc holding simple values.
+
+    types is a list of (type name, [(entry name, [(language, density, value)])]);
+    values are strings. Returns (table bytes, {(type, entry): resource id}).
+    """
+    values = []
+    keys = []
+    ids = {}
+    type_chunks = bytearray()
+
+    def value_index(s):
+        if s not in values:
+            values.append(s)
+        return values.index(s)
+
+    for type_id, (type_name, entries) in enumerate(types, start=1):
+        configs = {}
+        for entry_index, (entry_name, variants) in enumerate(entries):
+            if entry_name not in keys:
+                keys.append(entry_name)
+            ids[(type_name, entry_name)] = (package_id << 24) | (type_id << 16) | entry_index
+            for language, density, value in variants:
+                configs.setdefault((language, density), {})[entry_index] = (keys.index(entry_name), value)
+
+        for (language, density), present in configs.items():
+            config = bytearray(64)
+            struct.pack_into("<I", config, 0, 64)
+            config[8:10] = language.encode().ljust(2, b"\0")[:2]
+            struct.pack_into("<H", config, 14, density)
+
+            offsets = []
+            entry_data = bytearray()
+            for entry_index in range(len(entries)):
+                if entry_index not in present:
+                    offsets.append(0xFFFFFFFF)
+                    continue
+                key, value = present[entry_index]
+                offsets.append(len(entry_data))
+                entry_data += struct.pack("<HHI", 8, 0, key) + struct.pack("<HBBI", 8, 0, 0x03, value_index(value))
+
+            header_size = 20 + len(config)
+            body = struct.pack(f"<{len(entries)}I", *offsets) + bytes(entry_data)
+            type_chunks += struct.pack(
+                "<HHIBBHII", 0x0201, header_size, header_size + len(body),
+                type_id, 0, 0, len(entries), header_size + 4 * len(entries),
+            ) + bytes(config) + body
+
+    type_pool = string_pool([name for name, _ in types])
+    key_pool = string_pool(keys)
+    package_header_size = 288
+    package_body = type_pool + key_pool + bytes(type_chunks)
+    package = struct.pack("<HHII", 0x0200, package_header_size, package_header_size + len(package_body), package_id)
+    package += "eu.kanade.tachiyomi.extension".encode("utf-16-le").ljust(256, b"\0")
+    package += struct.pack(
+        "<IIIII", package_header_size, len(types), package_header_size + len(type_pool), len(keys), 0,
+    ) + package_body
+
+    body = string_pool(values, utf8=True) + package
+    return struct.pack("<HHII", 0x0002, 12, 12 + len(body), 1) + body, ids
+
+def extension_name(i):
+    return f"Bench Extension {i}"
+
+def extension_module(i):
+    return ("all" if i % 7 == 0 else "en"), f"benchext{i}"
+
+def make_apk(path, i, apk_size=0):
+    lang, slug = extension_module(i)
+    package = f"eu.kanade.tachiyomi.extension.{lang}.{slug}"
+    label = f"Tachiyomi: {extension_name(i)}"
+    version_code = i % 50 + 1
+
+    table, ids = resource_table([
+        ("mipmap", [("ic_launcher", [
+            ("", density, f"res/mipmap-{qualifier}-v4/ic_launcher.png")
+            for density, qualifier in DENSITIES.items()
+        ])]),
+        ("string", [("app_name", [("", 0, label)])]),
+    ])
+    manifest = binary_manifest(
+        package, version_code, f"1.4.{version_code}", label,
+        ids[("mipmap", "ic_launcher")], i % 2,
+        label_id=ids[("string", "app_name")] if i % 2 else None,
+        utf8=i % 3 == 0,
+    )
+
+    rng = random.Random(i)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("AndroidManifest.xml", manifest)
+        z.writestr("resources.arsc", table)
+        for qualifier in DENSITIES.values():
+            z.writestr(f"res/mipmap-{qualifier}-v4/ic_launcher.png", b"\x89PNG\r\n\x1a\n" + rng.randbytes(2048))
+        # Stored, not deflated, so the APK ends up about apk_size bytes
+        z.writestr(zipfile.ZipInfo("classes.dex"), rng.randbytes(apk_size))
+    sign_apk(path)
+    return package
+
+def _length_prefixed(*values):
+    return b"".join(struct.pack("<I", len(x)) + x for x in values)
+
+def sign_apk(path, certificate=FIXTURE_CERTIFICATE, scheme_id=SIGNATURE_SCHEME_V2_ID):
+    """
+    Inserts an APK Signing Block naming certificate as the signer in front of
+    the central directory. Digests and signatures are dummies.
+    """
+    data = Path(path).read_bytes()
+    eocd = data.rfind(b"PK\x05\x06")
+    cd_offset = struct.unpack_from("<I", data, eocd + 16)[0]
+
+    # Signed data holds the digests, certificates and attributes sequences
+    signed_data = _length_prefixed(
+        _length_prefixed(struct.pack("<I", 0x0103) + _length_prefixed(bytes(32))),
+        _length_prefixed(certificate),
+        b"",
+    )
+    signer = _length_prefixed(signed_data, b"", b"public key")
+    value = _length_prefixed(_length_prefixed(signer))
+    pairs = struct.pack("<QI", len(value) + 4, scheme_id) + value
+    size = len(pairs) + 8 + 16
+    block = struct.pack("<Q", size) + pairs + struct.pack("<Q", size) + b"APK Sig Block 42"
+
+    eocd_record = bytearray(data[eocd:])
+    struct.pack_into("<I", eocd_record, 16, cd_offset + len(block))
+    Path(path).write_bytes(data[:cd_offset] + block + data[cd_offset:eocd] + eocd_record)
+
+def make_apks(apk_dir, count, apk_size=0):
+    apk_dir = Path(apk_dir)
+    packages = []
+    for i in range(count):
+        lang, slug = extension_module(i)
+        version_code = i % 50 + 1
+        packages.append(make_apk(apk_dir / f"tachiyomi-{lang}.{slug}-v1.4.{version_code}.apk", i, apk_size))
+    return packages
+
+def make_inspector_output(path, count):
+    output = {}
+    for i in range(count):
+        lang, slug = extension_module(i)
+        output[f"eu.kanade.tachiyomi.extension.{lang}.{slug}"] = [
+            {"name": extension_name(i), "lang": lang, "id": str(i), "baseUrl": f"https://{slug}.example"}
+        ]
+    Path(path).write_text(json.dumps(output), encoding="utf-8")
+
+def make_stub_aapt(bin_dir):
+    """
+    An `aapt` that prints badging from the native reader, so aapt's output
+    format and process spawn cost are reproduced without an Android SDK.
+    """
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    aapt = bin_dir / "aapt"
+    aapt.write_text(f"""#!{sys.executable}
+import sys
+sys.path.insert(0, {str(SCRIPTS_DIR)!r})
+from badging import read_native_badging
+
+if sys.argv[1] == "version":
+    print("Android Asset Packaging Tool, v0.2-bench")
+    sys.exit()
+b = read_native_badging(sys.argv[-1])
+print(f"package: name='{{b['pkg']}}' versionCode='{{b['code']}}' versionName='{{b['version']}}'")
+print(f"application-label:'{{b['label']}}'")
+print(f"application-icon-320:'{{b['icon']}}'")
+print(f"meta-data: name='tachiyomi.extension.nsfw' value='{{b['nsfw']}}'")
+""", encoding="utf-8")
+    aapt.chmod(aapt.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return aapt
+
+def make_remote_index(repo_dir, count, offset=10_000):
+    """
+    A published repo with count entries that don't overlap the generated APKs.
+    """
+    repo_dir = Path(repo_dir)
+    repo_dir.joinpath("apk").mkdir(parents=True, exist_ok=True)
+    repo_dir.joinpath("icon").mkdir(parents=True, exist_ok=True)
+    index = []
+    for i in range(offset, offset + count):
+        lang, slug = extension_module(i)
+        pkg = f"eu.kanade.tachiyomi.extension.{lang}.{slug}"
+        index.append({
+            "name": f"Tachiyomi: {extension_name(i)}",
+            "pkg": pkg,
+            "apk": f"tachiyomi-{lang}.{slug}-v1.4.1.apk",
+            "lang": lang,
+            "code": 1,
+            "version": "1.4.1",
+            "nsfw": 0,
+            "sha256": f"{i:064x}",
+            "icon": f"icon/{pkg}.png",
+            "sig": "",
+            "sources": [{"name": extension_name(i), "lang": lang, "id": str(i), "baseUrl": "", "versionId": 1}],
+        })
+    with repo_dir.joinpath("index.json").open("w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+
+def make_source_tree(root, extensions, libs):
+    """
+    A git repo shaped like this one, with a second commit touching files
+    across extensions, libs and a core file.
+    """
+    root = Path(root)
+    rng = random.Random(2)
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@localhost",
+        "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@localhost",
+    }
+
+    def git(*args):
+        subprocess.run(["git", *args], cwd=root, env=env, check=True, capture_output=True)
+
+    extension_dirs = []
+    for i in range(extensions):
+        lang, slug = extension_module(i)
+        directory = root / "src" / lang / slug
+        directory.mkdir(parents=True, exist_ok=True)
+        dependency = f'\ndependencies {{\n    implementation(project(":lib:lib{i % libs}"))\n}}\n' if libs and i % 5 == 0 else ""
+        directory.joinpath("build.gradle").write_text(
+            f"ext {{\n    extName = '{extension_name(i)}'\n    extClass = '.Bench{i}'\n"
+            f"    extVersionCode = {i % 50 + 1}\n}}\n\napply from: \"$rootDir/common.gradle\"\n{dependency}",
+            encoding="utf-8",
+        )
+        extension_dirs.append(directory)
+    for i in range(libs):
+        directory = root / "lib" / f"lib{i}"
+        directory.mkdir(parents=True, exist_ok=True)
+        directory.joinpath("build.gradle.kts").write_text('plugins {\n    id("lib-android")\n}\n', encoding="utf-8")
+    root.joinpath(".github").mkdir(exist_ok=True)
+    root.joinpath(".github/always_build.json").write_text("[]", encoding="utf-8")
+    root.joinpath("core").mkdir(exist_ok=True)
+    root.joinpath("core/build.gradle.kts").write_text("", encoding="utf-8")
+
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-q", "-m", "base")
+
+    for directory in rng.sample(extension_dirs, max(1, len(extension_dirs) // 4)):
+        directory.joinpath("Changed.kt").write_text("// changed\n", encoding="utf-8")
+    for i in range(0, libs, 3):
+        root.joinpath("lib", f"lib{i}", "Changed.kt").write_text("// changed\n", encoding="utf-8")
+    git("add", "-A")
+    git("commit", "-q", "-m", "extensions and libs")
+
+    root.joinpath("core/build.gradle.kts").write_text("// changed\n", encoding="utf-8")
+    git("add", "-A")
+    git("commit", "-q", "-m", "core")
@@ -0,0 +1,127 @@
+"""
+Benchmarks search.json lookups against scanning index.min.json.
+
+Writes a synthetic index and its search index, then times loading each and
+answering prefix, multi-word and misspelled queries: by filtering every entry
+on name, pkg and lang like clients do, and through SearchIndex.search().
+
+    python .github/scripts/bench_search.py --entries 20000 --queries 300
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from hashing import file_digest
+from index_writer import write_index, write_search_index
+from search_index import SEARCH_INDEX, SearchIndex
+
+LANGS = ["all", "en", "es", "fr", "ja", "ko", "pt-BR", "zh"]
+SYLLABLES = [
+    "ka", "mi", "ro", "to", "na", "shi", "man", "ga", "ton", "comi", "scan", "toon", "lib", "rea", "der", "fire",
+    "moon", "star", "ink", "web", "hub", "neko", "yuri", "dra", "gon", "zen", "lux", "nova", "pix", "sora",
+]
+
+def make_entries(count):
+    rng = random.Random(0)
+    entries = []
+    for i in range(count):
+        words = ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).capitalize() for _ in range(rng.randint(1, 3))]
+        name = " ".join(words)
+        lang = rng.choice(LANGS)
+        pkg = f"eu.kanade.tachiyomi.extension.{lang}.{''.join(words).lower()}"
+        if lang == "all":
+            sources = [{"name": name, "lang": x, "id": str(i * 10 + n), "baseUrl": ""} for n, x in enumerate(LANGS[1:4])]
+        else:
+            sources = [{"name": name, "lang": lang, "id": str(i * 10), "baseUrl": ""}]
+        entries.append({
+            "name": f"Tachiyomi: {name}", "pkg": pkg, "apk": f"tachiyomi-{lang}.x{i}-v1.4.1.apk", "lang": lang,
+            "code": 1, "version": "1.4.1", "nsfw": i % 5 == 0, "sources": sources,
+        })
+    return entries
+
+def make_queries(entries, count):
+    rng = random.Random(1)
+    queries = {"prefix": [], "words": [], "typo": []}
+    for _ in range(count):
+        words = rng.choice(entries)["name"].removeprefix("Tachiyomi: ").lower().split()
+        word = rng.choice(words)
+        queries["prefix"].append(word[:rng.randint(3, max(3, len(word)))])
+        queries["words"].append(" ".join(words))
+        position = rng.randrange(len(word))
+        queries["typo"].append(word[:position] + rng.choice("aeiouxz") + word[position + 1:])
+    return queries
+
+def linear_search(entries, query):
+    words = query.lower().split()
+    return [
+        i for i, entry in enumerate(entries)
+        if all(word in f"{entry['name']} {entry['pkg']} {entry['lang']}".lower() for word in words)
+    ]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def best_of(repeat, fn, *args):
+    return min(timed(fn, *args)[0] for _ in range(repeat))
+
+def latencies(fn, queries):
+    """
+    Returns the sorted timings and the result of each query.
+    """
+    runs = [timed(fn, query) for query in queries]
+    return sorted(x for x, _ in runs), [x for _, x in runs]
+
+def describe(timings):
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"median {statistics.median(timings) * 1e6:9.1f} us, p95 {p95 * 1e6:9.1f} us"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=20000, help="entries in the synthetic index")
+    parser.add_argument("--queries", type=int, default=200, help="queries of each kind")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    queries = make_queries(entries, args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        repo_dir = Path(tmp)
+        write_index(repo_dir, entries, {"meta": {}})
+        index_path = repo_dir / "index.min.json"
+        index_sha256 = file_digest(index_path)[1]
+        build_time = best_of(1, write_search_index, repo_dir, entries, index_sha256)
+        search_path = repo_dir / SEARCH_INDEX
+
+        def load_index():
+            with index_path.open(encoding="utf-8") as f:
+                return json.load(f)
+
+        index_load = best_of(args.repeat, load_index)
+        search_load = best_of(args.repeat, SearchIndex.load, search_path, index_sha256)
+        index = load_index()
+        search = SearchIndex.load(search_path, index_sha256)
+        index_size, search_size = index_path.stat().st_size, search_path.stat().st_size
+
+    print(f"{args.entries} entries, {len(search.tokens)} tokens, {args.queries} queries of each kind")
+    print(f"index.min.json: {index_size / 1024:8.0f} KiB, load {index_load * 1000:7.1f} ms")
+    print(f"search.json:    {search_size / 1024:8.0f} KiB, load {search_load * 1000:7.1f} ms, build {build_time * 1000:.1f} ms")
+    for kind, kind_queries in queries.items():
+        linear, linear_results = latencies(lambda q: linear_search(index, q), kind_queries)
+        indexed, indexed_results = latencies(search.search, kind_queries)
+        if kind != "typo":
+            # Token prefixes are substrings too, so the index never finds more than the scan
+            assert all(set(x) <= set(y) for x, y in zip(indexed_results, linear_results))
+        print(f"{kind:6} linear:  {describe(linear)}, {statistics.mean(map(len, linear_results)):7.1f} hits")
+        print(
+            f"{kind:6} indexed: {describe(indexed)}, {statistics.mean(map(len, indexed_results)):7.1f} hits "
+            f"({statistics.median(linear) / statistics.median(indexed):.0f}x)"
+        )
+
+if __name__ == "__main__":
+    main()
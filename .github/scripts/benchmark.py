@@ -0,0 +1,193 @@
+"""
+Benchmarks the repo publishing scripts on synthetic fixtures.
+
+Each script runs as its own process against a generated fixture, and its
+wall-clock time and peak RSS are recorded. The phases inside them (badging,
+hashing, icon extraction, JSON serialization) are then timed in-process.
+Everything runs offline: aapt is replaced by a stub on PATH.
+
+    python .github/scripts/benchmark.py --apks 200 --remote 2000 -o bench.json
+    python .github/scripts/benchmark.py --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from zipfile import ZipFile
+
+import bench_fixtures
+from apk_signature import signer_fingerprint
+from badging import dump_badging, read_native_badging
+from hashing import file_digest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+def run_stage(name, args, cwd, env):
+    """
+    Runs a script to completion and returns its wall time and peak RSS.
+    os.wait4() gives the resource usage of that one child.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, *map(str, args)],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    returncode = os.waitstatus_to_exitcode(status)
+    stderr = process.stderr.read().decode(errors="replace")
+    process.stderr.close()
+    # Popen would otherwise try to reap the already-waited child
+    process.returncode = returncode
+    if returncode != 0:
+        raise RuntimeError(f"{name} exited with {returncode}:\n{stderr}")
+    print(f"  {name:<32} {wall:8.3f} s  {usage.ru_maxrss / 1024:8.1f} MiB")
+    return {"wall_s": round(wall, 4), "max_rss_kib": usage.ru_maxrss}
+
+def time_phase(name, items, fn):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    total = time.perf_counter() - start
+    per_item = total / len(items) * 1000 if items else 0.0
+    print(f"  {name:<32} {total:8.3f} s  {per_item:8.2f} ms/item")
+    return {"total_s": round(total, 4), "per_item_ms": round(per_item, 4), "items": len(items)}
+
+def run_benchmarks(work, args):
+    env = {k: v for k, v in os.environ.items() if k != "ANDROID_HOME"}
+    env["PATH"] = f"{work / 'bin'}{os.pathsep}{env.get('PATH', '')}"
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    # The fixture APKs are signed with a stand-in certificate
+    env["REPO_SIGNING_FINGERPRINT"] = bench_fixtures.FIXTURE_FINGERPRINT
+
+    print(f"Generating fixtures in {work}...")
+    aapt = bench_fixtures.make_stub_aapt(work / "bin")
+    source = work / "source"
+    bench_fixtures.make_apks(source / "repo" / "apk", args.apks, args.apk_size * 1024)
+    bench_fixtures.make_inspector_output(source / "output.json", args.apks)
+    bench_fixtures.make_remote_index(work / "remote", args.remote)
+    tree = work / "tree"
+    bench_fixtures.make_source_tree(tree, args.extensions, args.libs)
+
+    stages = {}
+    print("Stages:")
+    cache = work / "cache"
+    stages["generate_repo.cold"] = run_stage(
+        "generate_repo (cold cache)",
+        [SCRIPTS_DIR / "generate_repo.py", "--cache-dir", cache, "-j", args.workers], source, env,
+    )
+    stages["generate_repo.warm"] = run_stage(
+        "generate_repo (warm cache)",
+        [SCRIPTS_DIR / "generate_repo.py", "--cache-dir", cache, "-j", args.workers], source, env,
+    )
+
+    create_env = {**env, "REPO_CACHE_DIR": str(work / "create-cache")}
+    stages["create-repo.cold"] = run_stage("create-repo (cold cache)", [SCRIPTS_DIR / "create-repo.py"], source, create_env)
+    stages["create-repo.warm"] = run_stage("create-repo (warm cache)", [SCRIPTS_DIR / "create-repo.py"], source, create_env)
+
+    # merge-repo resolves the local repo against the parent of its working directory
+    stages["merge-repo"] = run_stage(
+        "merge-repo", [SCRIPTS_DIR / "merge-repo.py", "[]", "source/repo"], work / "remote", env,
+    )
+    stages["merge-repo.noop"] = run_stage(
+        "merge-repo (no changes)", [SCRIPTS_DIR / "merge-repo.py", "[]", "source/repo"], work / "remote", env,
+    )
+
+    matrices_env = {**env, "IS_PR_CHECK": "true", "REPO_CACHE_DIR": str(work / "tree-cache")}
+    matrices_env.pop("CI", None)
+    subprocess.run(["git", "checkout", "-q", "HEAD~1"], cwd=tree, check=True)
+    stages["generate-build-matrices"] = run_stage(
+        "generate-build-matrices", [SCRIPTS_DIR / "generate-build-matrices.py", "HEAD~1", "Release"], tree, matrices_env,
+    )
+    subprocess.run(["git", "checkout", "-q", "-"], cwd=tree, check=True)
+    stages["generate-build-matrices.core"] = run_stage(
+        "generate-build-matrices (core)",
+        [SCRIPTS_DIR / "generate-build-matrices.py", "HEAD~2", "Release"], tree, matrices_env,
+    )
+
+    apks = sorted((source / "repo" / "apk").glob("*.apk"))
+    with (source / "repo" / "index.min.json").open(encoding="utf-8") as f:
+        index = json.load(f)
+
+    def extract_icon(apk):
+        icon = read_native_badging(apk)["icon"]
+        with ZipFile(apk) as z:
+            z.read(icon)
+
+    def serialize(_):
+        json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+        json.dumps(index, ensure_ascii=False, indent=2)
+
+    phases = {}
+    print("Phases:")
+    phases["badging.native"] = time_phase("badging (native)", apks, read_native_badging)
+    phases["badging.aapt"] = time_phase(
+        "badging (stub aapt)", apks[:args.aapt_sample], lambda apk: dump_badging(str(aapt), apk),
+    )
+    phases["hashing"] = time_phase("hashing", apks, file_digest)
+    phases["signer"] = time_phase("signer fingerprint", apks, signer_fingerprint)
+    phases["icon_extraction"] = time_phase("icon extraction", apks, extract_icon)
+    phases["json_serialization"] = time_phase("JSON serialization", range(10), serialize)
+
+    return {"stages": stages, "phases": phases}
+
+def compare(previous, current):
+    print(f"Compared with {previous['timestamp']}:")
+    for section, metric in (("stages", "wall_s"), ("stages", "max_rss_kib"), ("phases", "total_s")):
+        for name, result in current[section].items():
+            old = previous.get(section, {}).get(name, {}).get(metric)
+            if not old:
+                continue
+            change = (result[metric] - old) / old * 100
+            print(f"  {name:<32} {metric:<12} {old:>12} -> {result[metric]:>12}  {change:+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the repo publishing scripts on synthetic fixtures")
+    parser.add_argument("--apks", type=int, default=200, help="APKs to generate")
+    parser.add_argument("--apk-size", type=int, default=512, help="payload per APK in KiB")
+    parser.add_argument("--remote", type=int, default=2000, help="entries in the published index")
+    parser.add_argument("--extensions", type=int, default=500, help="extension modules in the source tree")
+    parser.add_argument("--libs", type=int, default=20, help="lib modules in the source tree")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="generate_repo worker count")
+    parser.add_argument("--aapt-sample", type=int, default=50, help="APKs to time the stub aapt on")
+    parser.add_argument("-o", "--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="previous results to compare with")
+    parser.add_argument("--keep", action="store_true", help="keep the fixture directory")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="repo-bench-"))
+    try:
+        results = run_benchmarks(work, args)
+    finally:
+        if args.keep:
+            print(f"Fixtures kept in {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep")},
+        **results,
+    }
+
+    if args.compare:
+        with args.compare.open(encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
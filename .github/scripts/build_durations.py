@@ -0,0 +1,106 @@
+"""
+Per-module build durations, for balancing the build matrix chunks.
+
+The push build runs Gradle with --profile; the "(total)" rows of the
+profile's Task Execution table give how long each project's tasks took.
+Those are merged into build-durations.json of the published repo, which
+generate-build-matrices.py reads back through BUILD_DURATIONS_FILE.
+
+    python .github/scripts/build_durations.py record ../repo build/reports/profile/profile-*.html
+"""
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+
+DURATIONS_FILE = "build-durations.json"
+
+# <td>:src:en:comix</td>
+# <td class="numeric">1m2.345s</td>
+# <td>(total)</td>
+PROJECT_TOTAL_REGEX = re.compile(r"""<td>(:[^<]+)</td>\s*<td class="numeric">([^<]+)</td>\s*<td>\(total\)</td>""")
+DURATION_REGEX = re.compile(r"^(?:(\d+)d)?\s*(?:(\d+)h)?\s*(?:(\d+)m)?\s*(?:([\d.]+)s)?$")
+MODULE_REGEX = re.compile(r"^:src:\w+:\w+$")
+
+def parse_duration(text):
+    """
+    Seconds in a Gradle duration such as "1h2m3.45s", or None if it isn't one.
+    """
+    match = DURATION_REGEX.match(text.strip())
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (float(x or 0) for x in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def parse_profile(html):
+    """
+    Returns a dict of extension module -> seconds its tasks took, from the
+    HTML report `gradlew --profile` writes.
+    """
+    durations = {}
+    for project, duration in PROJECT_TOTAL_REGEX.findall(html):
+        seconds = parse_duration(duration)
+        if MODULE_REGEX.match(project) and seconds is not None:
+            durations[project] = seconds
+    return durations
+
+def load_durations(path):
+    """
+    Reads a build-durations.json, returning {} if there is none.
+    """
+    if not path or not Path(path).exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def merge(old, new):
+    # Halve the weight of older builds, so one slow runner doesn't skew the chunks for long
+    return {
+        module: round((old[module] + seconds) / 2 if module in old else seconds, 3)
+        for module, seconds in new.items()
+    }
+
+def record(repo_dir, profiles, root="."):
+    """
+    Merges the module durations of the given profile reports into
+    repo_dir/build-durations.json. Durations of modules that no longer
+    exist are dropped.
+    """
+    path = Path(repo_dir) / DURATIONS_FILE
+    durations = load_durations(path)
+    measured = {}
+    for profile in profiles:
+        measured.update(parse_profile(Path(profile).read_text(encoding="utf-8")))
+    durations.update(merge(durations, measured))
+    durations = {
+        module: seconds for module, seconds in sorted(durations.items())
+        if Path(root, *module.lstrip(":").split(":")).is_dir()
+    }
+
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(durations, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    print(f"Recorded build durations of {len(measured)} module(s), {len(durations)} in {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record per-module build durations from Gradle profile reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parse_parser = subparsers.add_parser("parse", help="print the module durations of profile reports")
+    parse_parser.add_argument("profiles", nargs="+", help="HTML reports of gradlew --profile")
+    record_parser = subparsers.add_parser("record", help="merge the durations into a published repo")
+    record_parser.add_argument("repo", help="published repo directory")
+    record_parser.add_argument("profiles", nargs="+", help="HTML reports of gradlew --profile")
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        for profile in args.profiles:
+            for module, seconds in sorted(parse_profile(Path(profile).read_text(encoding="utf-8")).items()):
+                print(f"{module} {seconds:.3f}s")
+    else:
+        record(args.repo, args.profiles)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Static lib -> extension dependency graph.
+
+Built by scanning the Gradle build files for `project(":lib:...")` references
+and `themePkg`, instead of configuring the whole Gradle build to run
+printDependentExtensions. Parsed build files are cached by (size, mtime) so
+only edited files are read again.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR
+
+# Bump whenever the parsing below changes
+SCHEMA_VERSION = 1
+
+PROJECT_DEPENDENCY_REGEX = re.compile(r"""project\(\s*(?:path\s*=\s*)?["'](:lib(?:-multisrc)?:[\w-]+)["']\s*\)""")
+THEME_PKG_REGEX = re.compile(r"""themePkg\s*=\s*["']([\w-]+)["']""")
+
+BUILD_FILE_GLOBS = {
+    "src/*/*/build.gradle": lambda p: f":src:{p.parent.parent.name}:{p.parent.name}",
+    "lib/*/build.gradle.kts": lambda p: f":lib:{p.parent.name}",
+    "lib-multisrc/*/build.gradle.kts": lambda p: f":lib-multisrc:{p.parent.name}",
+}
+
+def parse_dependencies(text):
+    dependencies = set(PROJECT_DEPENDENCY_REGEX.findall(text))
+    if match := THEME_PKG_REGEX.search(text):
+        dependencies.add(f":lib-multisrc:{match[1]}")
+    return sorted(dependencies)
+
+class DependencyGraph:
+    def __init__(self, dependencies):
+        # project path -> projects it depends on
+        self.dependencies = dependencies
+        self.dependents = {}
+        for project, deps in dependencies.items():
+            for dep in deps:
+                self.dependents.setdefault(dep, set()).add(project)
+
+    def dependent_extensions(self, project):
+        """
+        Every :src: module depending on project, directly or through other libs.
+        """
+        extensions = set()
+        visited = {project}
+        pending = [project]
+        while pending:
+            for dependent in self.dependents.get(pending.pop(), ()):
+                if dependent in visited:
+                    continue
+                visited.add(dependent)
+                if dependent.startswith(":src:"):
+                    extensions.add(dependent)
+                else:
+                    pending.append(dependent)
+        return extensions
+
+    def module_dependencies(self, project):
+        """
+        Every lib module project depends on, transitively.
+        """
+        result = set()
+        pending = [project]
+        while pending:
+            for dep in self.dependencies.get(pending.pop(), ()):
+                if dep not in result:
+                    result.add(dep)
+                    pending.append(dep)
+        return result
+
+def load_graph(root=".", cache_dir=DEFAULT_CACHE_DIR):
+    root = Path(root)
+    cache_path = Path(cache_dir) / "build-graph.json" if cache_dir else None
+
+    cached = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            with cache_path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("schema") == SCHEMA_VERSION:
+                cached = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    files = {}
+    dependencies = {}
+    changed = False
+    for pattern, project_of in BUILD_FILE_GLOBS.items():
+        for build_file in sorted(root.glob(pattern)):
+            key = build_file.relative_to(root).as_posix()
+            stat = build_file.stat()
+            record = cached.get(key)
+            if not record or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+                record = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "deps": parse_dependencies(build_file.read_text(encoding="utf-8")),
+                }
+                changed = True
+            files[key] = record
+            dependencies[project_of(build_file)] = record["deps"]
+
+    if cache_path is not None and (changed or files.keys() != cached.keys()):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"schema": SCHEMA_VERSION, "files": files}, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+
+    return DependencyGraph(dependencies)
@@ -0,0 +1,177 @@
+"""
+Content hashes of what goes into each extension APK, for build avoidance.
+
+A module's inputs are the tracked files of its src/<lang>/<extension> tree,
+of every lib module it depends on (transitively), and of the build-wide
+Gradle files, plus the build type. The published repo keeps the hash each
+APK was built from in build-inputs.json, so the build matrix can leave out
+modules whose inputs haven't changed since, e.g. when only CI files changed
+or for always_build.json entries.
+
+    python .github/scripts/build_inputs.py record ../repo repo/index.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR
+from build_graph import load_graph
+from hashing import DigestCache
+from instrument import count, span
+
+# Bump whenever what goes into the hash changes
+SCHEMA_VERSION = 1
+
+INPUTS_FILE = "build-inputs.json"
+
+# Files every module is built with; .github/ isn't part of any APK
+SHARED_INPUTS = (
+    "buildSrc", "core", "gradle", "build.gradle.kts", "common.gradle", "gradle.properties", "settings.gradle.kts",
+)
+
+def module_dir(module):
+    # :src:en:comix -> src/en/comix, :lib:i18n -> lib/i18n
+    return "/".join(module.lstrip(":").split(":"))
+
+def tracked_files(paths, root="."):
+    """
+    The files git tracks under paths, as sorted POSIX paths relative to root.
+    Build outputs and other untracked files never count as inputs.
+    """
+    result = subprocess.run(
+        ["git", "ls-files", "-z", "--", *paths], cwd=root, capture_output=True, text=True, check=True,
+    )
+    return sorted(x for x in result.stdout.split("\0") if x)
+
+def module_hashes(modules, build_type, root=".", cache_dir=DEFAULT_CACHE_DIR, graph=None):
+    """
+    Returns a dict of module -> hex digest of its inputs.
+    """
+    root = Path(root)
+    modules = sorted(modules)
+    if not modules:
+        return {}
+    graph = graph or load_graph(root, cache_dir)
+    inputs = {
+        module: [module_dir(module), *sorted(module_dir(x) for x in graph.module_dependencies(module))]
+        for module in modules
+    }
+
+    with span("list inputs"):
+        files = {}
+        for path in tracked_files(SHARED_INPUTS + tuple({x for dirs in inputs.values() for x in dirs}), root):
+            files[path] = root / path
+    cache = DigestCache(os.path.join(cache_dir, "build-input-digests.json") if cache_dir else None)
+    with span("hash inputs"):
+        digests = cache.digest_many([x for x in files.values() if x.is_file()])
+    cache.save(keep=digests)
+
+    # One block of "path\0digest" lines per module directory or shared input
+    trees = {}
+    for path, file in files.items():
+        parts = path.split("/")
+        if parts[0] == "src":
+            key = "/".join(parts[:3])
+        elif parts[0] in ("lib", "lib-multisrc"):
+            key = "/".join(parts[:2])
+        else:
+            key = parts[0]
+        digest = digests[file][1] if file in digests else "missing"
+        trees.setdefault(key, []).append(f"{path}\0{digest}\n")
+    trees = {key: "".join(lines).encode() for key, lines in trees.items()}
+
+    shared = b"".join(trees.get(x, b"") for x in SHARED_INPUTS)
+    hashes = {}
+    for module in modules:
+        digest = hashlib.sha256(f"{SCHEMA_VERSION}\0{build_type}\n".encode())
+        digest.update(shared)
+        for directory in inputs[module]:
+            digest.update(f"{directory}/\n".encode())
+            digest.update(trees.get(directory, b""))
+        hashes[module] = digest.hexdigest()
+    count("modules hashed", len(hashes))
+    return hashes
+
+def load_inputs(path):
+    """
+    Reads a build-inputs.json, returning its module records or {} if there is none.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("schema") != SCHEMA_VERSION:
+        print(f"Ignoring {path}: schema {data.get('schema')}, expected {SCHEMA_VERSION}")
+        return {}
+    return data["modules"]
+
+def unchanged_modules(modules, build_type, published, root=".", cache_dir=DEFAULT_CACHE_DIR):
+    """
+    The modules whose inputs hash the same as when their published APK was
+    built, as a dict of module -> (hash, APK).
+    """
+    candidates = [x for x in modules if x in published]
+    hashes = module_hashes(candidates, build_type, root, cache_dir)
+    return {
+        module: (hashes[module], published[module]["apk"])
+        for module in candidates
+        if published[module].get("buildType") == build_type and published[module]["hash"] == hashes[module]
+    }
+
+def record(repo_dir, built_index, build_type, root=".", cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Stores the input hashes of the APKs in built_index in repo_dir/build-inputs.json.
+    Records of other modules are kept while their APK is still published.
+    """
+    repo_dir = Path(repo_dir)
+    modules = load_inputs(repo_dir / INPUTS_FILE)
+    with open(built_index, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    built = {}
+    for entry in entries:
+        # eu.kanade.tachiyomi.extension.en.comix -> :src:en:comix
+        lang, extension = entry["pkg"].rsplit(".", 2)[-2:]
+        module = f":src:{lang}:{extension}"
+        if Path(root, module_dir(module)).is_dir():
+            built[module] = entry["apk"].split("/")[-1]
+    hashes = module_hashes(built, build_type, root, cache_dir)
+    for module, apk in built.items():
+        modules[module] = {"hash": hashes[module], "buildType": build_type, "apk": apk}
+
+    published = {x.name for x in repo_dir.joinpath("apk").iterdir()} if repo_dir.joinpath("apk").exists() else set()
+    modules = {k: v for k, v in sorted(modules.items()) if v["apk"] in published}
+
+    path = repo_dir / INPUTS_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"schema": SCHEMA_VERSION, "modules": modules}, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    print(f"Recorded input hashes of {len(built)} module(s), {len(modules)} in {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash the build inputs of extension modules")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    hash_parser = subparsers.add_parser("hash", help="print the input hashes of modules")
+    hash_parser.add_argument("modules", nargs="+", help="modules, e.g. :src:en:comix")
+    hash_parser.add_argument("--build-type", default="Release", help="build type (default: Release)")
+    record_parser = subparsers.add_parser("record", help="record the hashes of freshly built APKs in a published repo")
+    record_parser.add_argument("repo", help="published repo directory")
+    record_parser.add_argument("index", help="index.json of the freshly built APKs")
+    record_parser.add_argument("--build-type", default="Release", help="build type (default: Release)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"where to cache digests (default: {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args()
+
+    if args.command == "hash":
+        for module, digest in module_hashes(args.modules, args.build_type, cache_dir=args.cache_dir).items():
+            print(f"{module} {digest}")
+    else:
+        record(args.repo, args.index, args.build_type, cache_dir=args.cache_dir)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,28 @@
+import argparse
+import json
 import os
+import subprocess
+import sys
+from pathlib import Path
+
+from build_graph import load_graph
+from changes import classify, parse_name_status
+from instrument import count, span
 
 def bump_version(file_path):
+    """
+    Increments extVersionCode in a build.gradle file.
+    Returns (old, new) version codes, or None if nothing was bumped.
+    """
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
-        return
+        return None
 
     with open(file_path, 'r') as f:
         lines = f.readlines()
 
     new_lines = []
-    found = False
+    bumped = None
     for line in lines:
         if 'extVersionCode' in line and '=' in line:
             try:
@@ -22,7 +35,7 @@ def bump_version(file_path):
                     # Reconstruct the line carefully keeping indentation
                     new_lines.append(f"{prefix}= {new_version}\n")
                     print(f"Bumped {file_path}: {current_version} -> {new_version}")
-                    found = True
+                    bumped = (int(current_version), new_version)
                 else:
                     new_lines.append(line)
             except Exception as e:
@@ -31,21 +44,91 @@ def bump_version(file_path):
         else:
             new_lines.append(line)
 
-    if found:
+    if bumped:
         with open(file_path, 'w') as f:
             f.writelines(new_lines)
     else:
         print(f"Could not find valid extVersionCode line in {file_path}")
+    return bumped
+
+def build_file(module):
+    # :src:en:comix -> src/en/comix/build.gradle
+    _, _, lang, extension = module.split(":")
+    return f"src/{lang}/{extension}/build.gradle"
+
+def all_extensions():
+    return {
+        f":src:{x.parent.parent.name}:{x.parent.name}"
+        for x in Path("src").glob("*/*/build.gradle")
+    }
+
+def modules_to_bump(ref):
+    """
+    The :src: modules whose APKs change with the commits since ref, and why.
+    Uses the same classification as the build matrix.
+    """
+    result = subprocess.run(["git", "diff", "--name-status", ref], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr.strip())
+        sys.exit(result.returncode)
+    with span("classify"):
+        changes = classify(parse_name_status(result.stdout))
+    print(f"Changed: {changes.summary()}")
+
+    # CI scripts count as core for the build matrix, but don't end up in any APK
+    core = [x for x in changes.core if not x.startswith(".github/")]
+    if core:
+        return {module: "core" for module in all_extensions()}
+
+    reasons = {module: "changed" for module in changes.extensions}
+    if changes.libs:
+        with span("build graph"):
+            graph = load_graph()
+        for lib in sorted(changes.libs):
+            for module in graph.dependent_extensions(lib):
+                reasons.setdefault(module, f"depends on {lib}")
+    return reasons
 
 if __name__ == "__main__":
-    files_to_bump = [
-        "src/en/comix/build.gradle",
-        "src/en/likemanga/build.gradle",
-        "src/en/likemangain/build.gradle",
-        "src/en/elftoon/build.gradle",
-        "src/en/madokami/build.gradle",
-        "src/all/mangafire/build.gradle"
-    ]
-    
-    for f in files_to_bump:
-        bump_version(f)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bump extVersionCode of the extensions affected by a change")
+    parser.add_argument("ref", nargs="?", default="HEAD~1", help="bump modules changed since this ref (default: HEAD~1)")
+    parser.add_argument("--all", action="store_true", help="bump every extension")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be bumped")
+    parser.add_argument("--summary", type=Path, help="write a JSON summary of the bumps to this file")
+    args = parser.parse_args()
+
+    if args.all:
+        reasons = {module: "all" for module in all_extensions()}
+    else:
+        reasons = modules_to_bump(args.ref)
+
+    bumped = []
+    for module in sorted(reasons):
+        file = build_file(module)
+        if args.dry_run:
+            print(f"Would bump {file} ({reasons[module]})")
+            continue
+        if versions := bump_version(file):
+            count("modules bumped")
+            bumped.append({
+                "module": module,
+                "file": file,
+                "reason": reasons[module],
+                "from": versions[0],
+                "to": versions[1],
+            })
+
+    summary = {
+        "ref": None if args.all else args.ref,
+        "dryRun": args.dry_run,
+        "modules": sorted(reasons),
+        "bumped": bumped,
+    }
+    print(f"Bumped {len(bumped)} of {len(all_extensions())} extension(s)")
+    if args.summary:
+        with args.summary.open("w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    if os.getenv("CI") == "true":
+        with open(os.getenv("GITHUB_OUTPUT"), 'a') as out_file:
+            out_file.write(f"bumped={json.dumps([x['module'] for x in bumped])}\n")
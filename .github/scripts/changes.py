@@ -0,0 +1,78 @@
+"""
+Classification of changed files into the modules they affect.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+CORE_FILES_PATTERN = (
+    r"buildSrc/|core/|gradle/|build\.gradle\.kts|common\.gradle|gradle\.properties|settings\.gradle\.kts|\.github/scripts"
+)
+
+# One alternation so every path is matched once, in the same order of precedence
+# as the individual regexes used to be tried
+CHANGE_REGEX = re.compile(
+    rf"^(?:(?P<core>{CORE_FILES_PATTERN})"
+    r"|src/(?P<lang>\w+)/(?P<extension>\w+)"
+    r"|lib-multisrc/(?P<multisrc>\w+)"
+    r"|lib/(?P<lib>\w+))"
+)
+
+@dataclass
+class ChangeSet:
+    core: list[str] = field(default_factory=list)
+    # :src:<lang>:<extension> modules that still exist
+    extensions: set[str] = field(default_factory=set)
+    # :lib:<name> and :lib-multisrc:<name> modules that still exist
+    libs: set[str] = field(default_factory=set)
+    # <lang>.<extension> of every touched extension, existing or not
+    deleted: set[str] = field(default_factory=set)
+
+    @property
+    def core_files_changed(self) -> bool:
+        return bool(self.core)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.core)} core file(s), {len(self.libs)} lib module(s), "
+            f"{len(self.extensions)} extension(s), {len(self.deleted)} touched extension path(s)"
+        )
+
+def parse_name_status(diff_output: str) -> list[str]:
+    """
+    Paths from `git diff --name-status`, including both sides of renames.
+    """
+    return [
+        Path(file).as_posix()
+        for line in diff_output.splitlines()
+        for file in line.split("\t", 2)[1:]
+    ]
+
+def classify(files, root: Path = Path(".")) -> ChangeSet:
+    @lru_cache(maxsize=None)
+    def is_dir(*parts: str) -> bool:
+        return root.joinpath(*parts).is_dir()
+
+    changes = ChangeSet()
+    for file in files:
+        if not (match := CHANGE_REGEX.match(file)):
+            continue
+        kind = match.lastgroup
+        if kind == "core":
+            changes.core.append(file)
+        elif kind == "extension":
+            lang = match.group("lang")
+            extension = match.group("extension")
+            if is_dir("src", lang, extension):
+                changes.extensions.add(f":src:{lang}:{extension}")
+            changes.deleted.add(f"{lang}.{extension}")
+        elif kind == "multisrc":
+            multisrc = match.group("multisrc")
+            if is_dir("lib-multisrc", multisrc):
+                changes.libs.add(f":lib-multisrc:{multisrc}")
+        elif kind == "lib":
+            lib = match.group("lib")
+            if is_dir("lib", lib):
+                changes.libs.add(f":lib:{lib}")
+    return changes
@@ -1,91 +1,28 @@
 import json
 import os
-import re
-import subprocess
-import hashlib
-from pathlib import Path
-from zipfile import ZipFile
 
-def get_file_sha256(file_path):
-    with open(file_path, "rb") as f:
-        return hashlib.sha256(f.read()).hexdigest()
-
-PACKAGE_NAME_REGEX = re.compile(r"package: name='([^']+)'")
-VERSION_CODE_REGEX = re.compile(r"versionCode='([^']+)'")
-VERSION_NAME_REGEX = re.compile(r"versionName='([^']+)'")
-IS_NSFW_REGEX = re.compile(r"'tachiyomi.extension.nsfw' value='([^']+)'")
-APPLICATION_LABEL_REGEX = re.compile(r"^application-label:'([^']+)'", re.MULTILINE)
-APPLICATION_ICON_320_REGEX = re.compile(r"^application-icon-320:'([^']+)'", re.MULTILINE)
-LANGUAGE_REGEX = re.compile(r"tachiyomi-([^.]+)")
-
-# We are in GitHub Actions, aapt should be available or we find it
-try:
-    # Try finding aapt in ANDROID_HOME
-    android_home = os.environ.get("ANDROID_HOME")
-    if android_home:
-        build_tools = list((Path(android_home) / "build-tools").iterdir())
-        if build_tools:
-            # Use the latest build tools
-            build_tools.sort()
-            aapt_cmd = str(build_tools[-1] / "aapt")
-        else:
-            aapt_cmd = "aapt"
-    else:
-        aapt_cmd = "aapt"
-except:
-    aapt_cmd = "aapt"
-
-REPO_DIR = Path("repo")
-REPO_APK_DIR = REPO_DIR / "apk"
-REPO_ICON_DIR = REPO_DIR / "icon"
-
-REPO_ICON_DIR.mkdir(parents=True, exist_ok=True)
-
-if not os.path.exists("output.json"):
-    print("Error: output.json not found!")
-    exit(1)
-
-with open("output.json", encoding="utf-8") as f:
-    inspector_data = json.load(f)
-
-index_min_data = []
-
-for apk in REPO_APK_DIR.iterdir():
-    if not apk.name.endswith(".apk"):
-        continue
-
-    try:
-        badging = subprocess.check_output(
-            [
-                aapt_cmd,
-                "dump",
-                "--include-meta-data",
-                "badging",
-                str(apk),
-            ]
-        ).decode()
-    except Exception as e:
-        print(f"Failed to dump badging for {apk.name}: {e}")
-        continue
-
-    package_info = next(x for x in badging.splitlines() if x.startswith("package: "))
-    package_name = PACKAGE_NAME_REGEX.search(package_info)[1]
-    
-    # Icon extraction
-    try:
-        application_icon_match = APPLICATION_ICON_320_REGEX.search(badging)
-        if application_icon_match:
-            application_icon = application_icon_match[1]
-            with ZipFile(apk) as z, z.open(application_icon) as i, (
-                REPO_ICON_DIR / f"{package_name}.png"
-            ).open("wb") as f:
-                f.write(i.read())
-    except:
-        pass
-
-    language = LANGUAGE_REGEX.search(apk.name)[1]
-    
-    # Get sources from Inspector output
+from apk_cache import DEFAULT_CACHE_DIR
+from apk_signature import SignatureError
+from extension_metadata import extension_sources
+from icons import ICON_OPTIMIZATION_MODES
+from index_writer import write_index
+from instrument import span
+from publish import LANGUAGE_REGEX, inspect_repo
+
+REPO_DIR = "repo"
+
+def inspector_item(apk_name, apk, inspector_data):
+    """
+    Builds an index entry from the APK's own badging and its sources from the
+    Inspector output. APKs whose badging couldn't be read are left out.
+    """
+    badging = apk.badging
+    if badging is None:
+        return None
+    package_name = badging["pkg"]
+    language = LANGUAGE_REGEX.search(apk_name)[1]
+
+    # Get sources from Inspector output (or the extension modules)
     sources = inspector_data.get(package_name, [])
 
     if len(sources) == 1:
@@ -97,42 +34,57 @@ for apk in REPO_APK_DIR.iterdir():
         ):
             language = source_language
 
-    common_data = {
-        "name": APPLICATION_LABEL_REGEX.search(badging)[1],
+    return package_name, {
+        "name": badging["label"],
         "pkg": package_name,
-        "apk": apk.name,
+        "apk": apk_name,
         "lang": language,
-        "code": int(VERSION_CODE_REGEX.search(package_info)[1]),
-        "version": VERSION_NAME_REGEX.search(package_info)[1],
-        "nsfw": int(IS_NSFW_REGEX.search(badging)[1]),
-        "size": os.path.getsize(apk),
-        "sha256": get_file_sha256(apk),
-        "icon": f"icon/{package_name}.png"
-    }
-    
-    min_data = {
-        **common_data,
+        "code": badging["code"],
+        "version": badging["version"],
+        "nsfw": badging["nsfw"],
+        "size": apk.size,
+        "sha256": apk.sha256,
+        "icon": f"icon/{package_name}.png",
+        "sig": apk.sig,
         "sources": sources,
     }
 
-    index_min_data.append(min_data)
+def main():
+    optimize_icons_mode = os.environ.get("REPO_OPTIMIZE_ICONS", "none")
+    if optimize_icons_mode not in ICON_OPTIMIZATION_MODES:
+        print(f"Error: REPO_OPTIMIZE_ICONS must be one of {', '.join(ICON_OPTIMIZATION_MODES)}")
+        exit(1)
 
-# Save index.min.json (The actual list of extensions)
-with REPO_DIR.joinpath("index.min.json").open("w", encoding="utf-8") as index_file:
-    json.dump(index_min_data, index_file, ensure_ascii=False, separators=(",", ":"))
-
-# Save index.json (Pretty print version)
-with REPO_DIR.joinpath("index.json").open("w", encoding="utf-8") as index_file:
-    json.dump(index_min_data, index_file, ensure_ascii=False, indent=2)
+    if os.path.exists("output.json"):
+        with open("output.json", encoding="utf-8") as f:
+            inspector_data = json.load(f)
+    else:
+        # The Inspector is only needed to double-check extension_metadata.py (see its --diff)
+        print("output.json not found, reading sources from the extension modules")
+        with span("read sources"):
+            inspector_data = extension_sources(".", DEFAULT_CACHE_DIR)
 
-# Save repo.json (METADATA - This was the bug!)
-repo_info = {
-    "meta": {
-        "name": "SalmanBappi Manga Repo",
-        "shortName": "SBManga",
-        "website": "https://salmanbappi.github.io/salmanbappi-manga-extension/",
-        "signingKeyFingerprint": "" 
+    try:
+        index_min_data = inspect_repo(
+            REPO_DIR, cache_dir=DEFAULT_CACHE_DIR, optimize_icons_mode=optimize_icons_mode,
+            sources=inspector_data, make_item=inspector_item,
+        )
+    except SignatureError as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    # Save index.min.json (The actual list of extensions), index.json (Pretty print version)
+    # and repo.json (METADATA - This was the bug!)
+    repo_info = {
+        "meta": {
+            "name": "SalmanBappi Manga Repo",
+            "shortName": "SBManga",
+            "website": "https://salmanbappi.github.io/salmanbappi-manga-extension/",
+            "signingKeyFingerprint": ""
+        }
     }
-}
-with REPO_DIR.joinpath("repo.json").open("w", encoding="utf-8") as repo_file:
-    json.dump(repo_info, repo_file, indent=2)
\ No newline at end of file
+    with span("write index"):
+        write_index(REPO_DIR, index_min_data, repo_info)
+
+if __name__ == "__main__":
+    main()
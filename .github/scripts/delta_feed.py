@@ -0,0 +1,91 @@
+"""
+Delta feed between published index versions.
+
+Every merge that changes the index bumps a generation number stored in
+repo.json and publishes deltas/<generation>.json with the entries that were
+added, updated or removed since the previous generation. deltas/index.json
+lists the retained chain, so an updater that last saw generation N fetches
+the deltas after N, or the full index when N is older than the chain.
+"""
+import argparse
+import json
+from pathlib import Path
+
+from index_writer import AtomicOutput
+
+DELTA_DIR = "deltas"
+DELTA_INDEX = "index.json"
+DEFAULT_MAX_DELTAS = 50
+
+def max_deltas_arg(value):
+    """
+    argparse type for --max-deltas: the newest delta is always kept, so at least 1.
+    """
+    max_deltas = int(value)
+    if max_deltas < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {max_deltas}")
+    return max_deltas
+
+def read_generation(repo_dir):
+    """
+    Returns the generation of the published repo.json, or 0 if there is none.
+    """
+    path = Path(repo_dir) / "repo.json"
+    if not path.exists():
+        return 0
+    with path.open(encoding="utf-8") as f:
+        return json.load(f).get("generation", 0)
+
+def _load_chain(delta_dir):
+    path = delta_dir / DELTA_INDEX
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)["deltas"]
+
+def write_delta(repo_dir, generation, current, added, updated, removed, max_deltas=DEFAULT_MAX_DELTAS):
+    """
+    Writes the delta from generation - 1 to generation and updates the chain,
+    dropping deltas beyond the newest max_deltas. Returns the written file names.
+    """
+    if max_deltas < 1:
+        raise ValueError(f"max_deltas must be at least 1, got {max_deltas}")
+    delta_dir = Path(repo_dir) / DELTA_DIR
+    delta_dir.mkdir(exist_ok=True)
+
+    delta = {
+        "generation": generation,
+        "previous": generation - 1,
+        "added": [current[pkg] for pkg in added],
+        "updated": [current[pkg] for pkg in updated],
+        "removed": removed,
+    }
+    name = f"{generation}.json"
+    output = AtomicOutput(delta_dir / name)
+    output.write(json.dumps(delta, ensure_ascii=False, separators=(",", ":")))
+    output.commit()
+
+    # A rerun of the same generation replaces its link instead of duplicating it
+    chain = [x for x in _load_chain(delta_dir) if x["generation"] < generation]
+    chain.append({
+        "generation": generation,
+        "file": f"{DELTA_DIR}/{name}",
+        "size": output.size,
+        "sha256": output.digest.hexdigest(),
+        "changes": len(added) + len(updated) + len(removed),
+    })
+    chain = chain[-max_deltas:]
+    for file in delta_dir.glob("*.json"):
+        if file.name != DELTA_INDEX and file.stem.isdigit() and int(file.stem) < chain[0]["generation"]:
+            print(f"Deleting expired delta {file.name}")
+            file.unlink()
+
+    chain_output = AtomicOutput(delta_dir / DELTA_INDEX)
+    chain_output.write(json.dumps({
+        "generation": generation,
+        # Updaters older than this need the full index
+        "oldest": chain[0]["generation"] - 1,
+        "deltas": chain,
+    }, indent=2))
+    chain_output.commit()
+    return [f"{DELTA_DIR}/{name}", f"{DELTA_DIR}/{DELTA_INDEX}"]
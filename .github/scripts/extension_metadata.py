@@ -0,0 +1,510 @@
+"""
+Source metadata read statically from the extension modules.
+
+Each src/<lang>/<extension>/build.gradle names the extension (extName) and
+its entry point (extClass); the name, lang, baseUrl and id of every source
+come from that Kotlin class, or from the classes it creates if it is a
+SourceFactory, following superclasses into the module's theme. Only literal
+values and constructor arguments passed as literals are understood, which is
+how extensions declare them. The result has the shape of the Inspector's
+output.json, without building or loading any APK. Modules are cached by the
+digests of their files, so only edited ones are parsed again.
+
+Packages in sources.json keep the source the registry publishes for them, as
+their IDs are already in users' libraries; --diff compares the values read
+from the code, before that override, and reports IDs claimed twice.
+
+    python .github/scripts/extension_metadata.py --diff output.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR
+from hashing import DigestCache
+from instrument import count, span
+from source_registry import get_http_source_id, pin_sources
+
+# Bump whenever the parsing below changes
+SCHEMA_VERSION = 1
+
+CACHE_FILE = "extension-metadata.json"
+PACKAGE_PREFIX = "eu.kanade.tachiyomi.extension"
+SOURCE_FIELDS = ("name", "lang", "id", "baseUrl")
+
+TOKEN_REGEX = re.compile(r'"""[\s\S]*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])+\'|//[^\n]*|/\*[\s\S]*?\*/')
+GRADLE_PROPERTY_REGEX = re.compile(r"""^\s*(\w+)\s*=\s*(?:(['"])(.*?)\2|(\d+)|(true|false))\s*$""", re.MULTILINE)
+CLASS_REGEX = re.compile(r"\b(?:class|object)\s+(\w+)")
+CONSTANT_REGEX = re.compile(r'\bconst\s+val\s+(\w+)(?:\s*:\s*\w+)?\s*=\s*("(?:\\.|[^"\\\n])*"|-?\d+[lL]?)')
+PROPERTY_REGEX = re.compile(
+    r"\boverride\s+val\s+(\w+)(?:\s*:\s*[\w.?]+)?\s*(?:=\s*([^\n]+)|\n\s*get\(\)\s*=\s*([^\n]+))"
+)
+TEMPLATE_REGEX = re.compile(r"\$\{(\w+)\}|\$(\w+)")
+CALL_REGEX = re.compile(r"(\w+)\s*\(")
+LIST_REGEX = re.compile(r"\b(?:listOf|arrayListOf|mutableListOf)\s*\(")
+MODIFIERS_REGEX = re.compile(r"\s*(?:(?:private|internal|public|protected)\s+)?(?:@\w+\s+)*(?:constructor\s*)?")
+COLON_REGEX = re.compile(r"\s*:")
+BRACE_REGEX = re.compile(r"\s*\{")
+
+# Stands for a value that isn't a literal, e.g. a constructor argument computed at runtime
+UNKNOWN = object()
+
+class MetadataError(ValueError):
+    pass
+
+@dataclass
+class KotlinClass:
+    name: str
+    # (name, default expression or None, declared "override val")
+    params: list = field(default_factory=list)
+    # (superclass name, argument expressions) of the constructor call, if any
+    super_call: tuple = None
+    supertypes: list = field(default_factory=list)
+    body: str = ""
+
+def strip_comments(text):
+    # String literals are matched too, so "https://..." isn't taken for a comment
+    return TOKEN_REGEX.sub(lambda m: " " if m[0].startswith("/") else m[0], text)
+
+def _skip_string(text, pos):
+    """
+    Returns the position after the string literal starting at pos.
+    """
+    quote = '"""' if text.startswith('"""', pos) else text[pos]
+    pos += len(quote)
+    while pos < len(text):
+        if text[pos] == "\\":
+            pos += 2
+        elif text.startswith(quote, pos):
+            return pos + len(quote)
+        else:
+            pos += 1
+    return pos
+
+def _matching(text, pos):
+    """
+    Returns the position after the bracket closing the one at pos.
+    """
+    pairs = {"(": ")", "[": "]", "{": "}", "<": ">"}
+    stack = [pairs[text[pos]]]
+    pos += 1
+    while pos < len(text) and stack:
+        char = text[pos]
+        if char in "\"'":
+            pos = _skip_string(text, pos)
+            continue
+        if char in "([{" or (char == "<" and stack[-1] == ">"):
+            stack.append(pairs[char])
+        elif char == stack[-1]:
+            stack.pop()
+        elif char in ")]}" and stack[-1] == ">":
+            # A comparison, not a type argument list
+            stack.pop()
+            continue
+        pos += 1
+    if stack:
+        raise MetadataError("unbalanced brackets")
+    return pos
+
+def split_arguments(text):
+    """
+    Splits a comma-separated argument list at its top level.
+    """
+    parts = []
+    start = pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char in "\"'":
+            pos = _skip_string(text, pos)
+            continue
+        if char in "([{":
+            pos = _matching(text, pos)
+            continue
+        if char == ",":
+            parts.append(text[start:pos])
+            start = pos + 1
+        pos += 1
+    parts.append(text[start:])
+    return [x.strip() for x in parts if x.strip()]
+
+def parse_build_gradle(text):
+    """
+    The properties set in a build.gradle's ext block, e.g. extName and extClass.
+    """
+    text = strip_comments(text)
+    match = re.search(r"\bext\s*\{", text)
+    if match:
+        text = text[match.end() - 1:_matching(text, match.end() - 1)]
+    properties = {}
+    for m in GRADLE_PROPERTY_REGEX.finditer(text):
+        if m[3] is not None:
+            properties[m[1]] = m[3]
+        elif m[4] is not None:
+            properties[m[1]] = int(m[4])
+        else:
+            properties[m[1]] = m[5] == "true"
+    return properties
+
+def parse_classes(text):
+    """
+    The classes and objects declared in a (comment-free) Kotlin file.
+    """
+    classes = {}
+    for match in CLASS_REGEX.finditer(text):
+        cls = KotlinClass(match[1])
+        pos = match.end()
+        if text.startswith("<", pos):
+            pos = _matching(text, pos)
+        pos = MODIFIERS_REGEX.match(text, pos).end()
+        if text.startswith("(", pos):
+            end = _matching(text, pos)
+            for param in split_arguments(text[pos + 1:end - 1]):
+                m = re.match(r"(?:@\w+\s+)*((?:\w+\s+)*)(\w+)\s*:\s*[^=]+?(?:=\s*(.+))?$", param, re.DOTALL)
+                if m:
+                    cls.params.append((m[2], m[3], bool(re.search(r"\boverride\s+val\b", m[1]))))
+            pos = end
+        colon = COLON_REGEX.match(text, pos)
+        if colon:
+            pos = colon.end()
+            supertypes_end = pos
+            while supertypes_end < len(text) and text[supertypes_end] != "{":
+                if text[supertypes_end] in "(<":
+                    supertypes_end = _matching(text, supertypes_end)
+                    continue
+                # A class without a body ends at its line, unless the list continues
+                header = text[pos:supertypes_end].rstrip()
+                if text[supertypes_end] == "\n" and header and not header.endswith(","):
+                    break
+                supertypes_end += 1
+            for supertype in split_arguments(text[pos:supertypes_end]):
+                call = CALL_REGEX.match(supertype)
+                if call and supertype.endswith(")"):
+                    arguments = split_arguments(supertype[call.end():-1])
+                    cls.super_call = (call[1], arguments)
+                    cls.supertypes.append(call[1])
+                else:
+                    cls.supertypes.append(re.split(r"[<\s]", supertype, 1)[0])
+            pos = supertypes_end
+        brace = BRACE_REGEX.match(text, pos)
+        if brace:
+            start = brace.end() - 1
+            cls.body = text[start + 1:_matching(text, start) - 1]
+        classes.setdefault(cls.name, cls)
+    return classes
+
+def evaluate(expression, env):
+    """
+    The value of a literal expression, interpolating names bound in env.
+    Returns UNKNOWN for anything else.
+    """
+    expression = expression.strip()
+    if m := re.fullmatch(r'"((?:\\.|[^"\\])*)"', expression):
+        unknown = False
+
+        def substitute(m):
+            nonlocal unknown
+            value = env.get(m[1] or m[2], UNKNOWN)
+            if value is UNKNOWN:
+                unknown = True
+                return ""
+            return str(value)
+
+        value = TEMPLATE_REGEX.sub(substitute, m[1])
+        if unknown:
+            return UNKNOWN
+        return re.sub(r"\\(.)", r"\1", value)
+    if m := re.fullmatch(r"(-?\d+)[lL]?", expression):
+        return int(m[1])
+    if re.fullmatch(r"\w+", expression):
+        return env.get(expression, UNKNOWN)
+    return UNKNOWN
+
+def bind_arguments(cls, arguments, caller_env):
+    """
+    Binds call argument expressions to the class's constructor parameters.
+    """
+    env = {}
+    positional = []
+    named = {}
+    for argument in arguments:
+        if m := re.match(r"(\w+)\s*=(?!=)\s*(.+)$", argument, re.DOTALL):
+            named[m[1]] = evaluate(m[2], caller_env)
+        else:
+            positional.append(evaluate(argument, caller_env))
+    for i, (name, default, _) in enumerate(cls.params):
+        if i < len(positional):
+            env[name] = positional[i]
+        elif name in named:
+            env[name] = named[name]
+        elif default is not None:
+            env[name] = evaluate(default, {**caller_env, **env})
+        else:
+            env[name] = UNKNOWN
+    return env
+
+def instantiate(classes, constants, name, arguments=(), caller_env=None, depth=0):
+    """
+    The literal properties of an instance of the named class, including the
+    ones set by its superclasses.
+    """
+    if depth > 16:
+        raise MetadataError(f"superclass chain of {name} is too deep")
+    cls = classes[name]
+    env = {**constants, **bind_arguments(cls, arguments, {**constants, **(caller_env or {})})}
+    properties = {}
+    if cls.super_call and cls.super_call[0] in classes:
+        properties = instantiate(classes, constants, cls.super_call[0], cls.super_call[1], env, depth + 1)
+    for param, _, is_override in cls.params:
+        if is_override:
+            properties[param] = env[param]
+    for m in PROPERTY_REGEX.finditer(cls.body):
+        properties[m[1]] = evaluate(m[2] or m[3], {**env, **properties})
+    return properties
+
+def factory_sources(cls):
+    """
+    The (class name, argument expressions) of each source a SourceFactory creates.
+    """
+    match = re.search(r"\bfun\s+createSources\s*\(\s*\)", cls.body)
+    if not match:
+        raise MetadataError(f"{cls.name} is a SourceFactory without createSources()")
+    listing = LIST_REGEX.search(cls.body, match.end())
+    if not listing:
+        raise MetadataError(f"{cls.name}.createSources() doesn't return a list literal")
+    end = _matching(cls.body, listing.end() - 1)
+    calls = []
+    for item in split_arguments(cls.body[listing.end():end - 1]):
+        call = CALL_REGEX.match(item)
+        if not call or not item.endswith(")"):
+            raise MetadataError(f"{cls.name}.createSources() creates {item!r}, not a constructor call")
+        calls.append((call[1], split_arguments(item[call.end():-1])))
+    return calls
+
+def make_source(properties, fallback_base_url):
+    name = properties.get("name", UNKNOWN)
+    lang = properties.get("lang", UNKNOWN)
+    base_url = properties.get("baseUrl", UNKNOWN)
+    if base_url is UNKNOWN:
+        base_url = fallback_base_url
+    for field_name, value in (("name", name), ("lang", lang), ("baseUrl", base_url)):
+        if value is UNKNOWN or value is None:
+            raise MetadataError(f"no literal {field_name}")
+    source_id = properties.get("id", UNKNOWN)
+    if source_id is UNKNOWN:
+        version_id = properties.get("versionId", 1)
+        if version_id is UNKNOWN:
+            raise MetadataError(f"no literal versionId for {name}")
+        source_id = get_http_source_id(name, lang, version_id)
+    return {"name": name, "lang": lang, "id": str(source_id), "baseUrl": base_url}
+
+def module_files(root, module_dir, theme=None):
+    """
+    The files a module's metadata is read from, relative to root.
+    """
+    root = Path(root)
+    files = [Path(module_dir, "build.gradle")]
+    directories = [Path(module_dir, "src")]
+    if theme:
+        directories.append(Path("lib-multisrc", theme, "src"))
+    for directory in directories:
+        files += sorted(x.relative_to(root) for x in root.joinpath(directory).glob("**/*.kt"))
+    return [x.as_posix() for x in files]
+
+def parse_module(root, module_dir):
+    """
+    Reads the metadata of the module at root/module_dir, e.g. src/en/comix.
+    Returns a dict with pkg and either the extension's fields or an error.
+    """
+    root = Path(root)
+    lang, extension = Path(module_dir).parts[-2:]
+    result = {"pkg": f"{PACKAGE_PREFIX}.{lang}.{extension}"}
+    try:
+        ext = parse_build_gradle(root.joinpath(module_dir, "build.gradle").read_text(encoding="utf-8"))
+        if "extClass" not in ext or "extName" not in ext:
+            raise MetadataError("build.gradle sets no extName or extClass")
+        result.update(
+            extName=ext["extName"],
+            extClass=ext["extClass"],
+            versionCode=ext.get("extVersionCode"),
+            nsfw=bool(ext.get("isNsfw", False)),
+        )
+
+        classes = {}
+        constants = {}
+        for path in module_files(root, module_dir, ext.get("themePkg"))[1:]:
+            text = strip_comments(root.joinpath(path).read_text(encoding="utf-8"))
+            for name, value in CONSTANT_REGEX.findall(text):
+                constants.setdefault(name, evaluate(value, {}))
+            for name, cls in parse_classes(text).items():
+                classes.setdefault(name, cls)
+
+        class_name = ext["extClass"].rsplit(".", 1)[-1]
+        if class_name not in classes:
+            raise MetadataError(f"class {class_name} not found")
+        cls = classes[class_name]
+        if "SourceFactory" in cls.supertypes:
+            calls = factory_sources(cls)
+        else:
+            calls = [(class_name, [])]
+        sources = []
+        for name, arguments in calls:
+            if name not in classes:
+                raise MetadataError(f"class {name} not found")
+            try:
+                sources.append(make_source(instantiate(classes, constants, name, arguments), ext.get("baseUrl")))
+            except MetadataError as e:
+                raise MetadataError(f"{name}: {e}") from e
+        result["sources"] = sources
+    except (OSError, UnicodeDecodeError, MetadataError) as e:
+        result["error"] = str(e)
+    return result
+
+def _module_dirs(root):
+    return sorted(x.parent.relative_to(root).as_posix() for x in Path(root).glob("src/*/*/build.gradle"))
+
+def extract(root=".", cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """
+    Reads the metadata of every extension module under root/src.
+    Returns a dict of module directory -> parse_module() result.
+    """
+    root = Path(root)
+    cache_path = Path(cache_dir) / CACHE_FILE if cache_dir else None
+    cached = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            with cache_path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("schema") == SCHEMA_VERSION:
+                cached = data["modules"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    module_dirs = _module_dirs(root)
+    inputs = {}
+    for module_dir in module_dirs:
+        # The theme decides which files are read, so it comes from the build file itself
+        try:
+            theme = parse_build_gradle(root.joinpath(module_dir, "build.gradle").read_text(encoding="utf-8")).get("themePkg")
+        except (OSError, UnicodeDecodeError, MetadataError):
+            theme = None
+        inputs[module_dir] = module_files(root, module_dir, theme)
+
+    digest_cache = DigestCache(os.path.join(cache_dir, "extension-source-digests.json") if cache_dir else None)
+    with span("hash sources"):
+        digests = digest_cache.digest_many(sorted({root / x for files in inputs.values() for x in files}))
+    digest_cache.save(keep=digests)
+
+    keys = {}
+    for module_dir, files in inputs.items():
+        digest = hashlib.sha256(f"{SCHEMA_VERSION}\n".encode())
+        for path in files:
+            digest.update(f"{path}\0{digests[root / path][1]}\n".encode())
+        keys[module_dir] = digest.hexdigest()
+
+    results = {x: cached[x]["metadata"] for x in module_dirs if cached.get(x, {}).get("key") == keys[x]}
+    stale = [x for x in module_dirs if x not in results]
+    count("modules cached", len(results))
+    count("modules parsed", len(stale))
+    workers = workers or os.cpu_count() or 1
+    with span("parse modules"):
+        # Parsing is pure Python, so it only scales on separate processes
+        if workers == 1 or len(stale) <= 1:
+            parsed = [parse_module(root, x) for x in stale]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(parse_module, [root] * len(stale), stale))
+    results.update(zip(stale, parsed))
+
+    if cache_path is not None and (stale or results.keys() != cached.keys()):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            modules = {x: {"key": keys[x], "metadata": results[x]} for x in module_dirs}
+            json.dump({"schema": SCHEMA_VERSION, "modules": modules}, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    return {x: results[x] for x in module_dirs}
+
+def extension_sources(root=".", cache_dir=DEFAULT_CACHE_DIR, workers=None, pinned=True):
+    """
+    The sources of every extension, as pkg -> list, like the Inspector's
+    output.json. Modules that couldn't be read are left out with a warning.
+    With pinned, registered packages get their sources from the registry.
+    """
+    sources = {}
+    for module_dir, metadata in extract(root, cache_dir, workers).items():
+        if "error" in metadata:
+            print(f"Warning: can't read the sources of {module_dir}: {metadata['error']}")
+            continue
+        sources[metadata["pkg"]] = metadata["sources"]
+    return pin_sources(sources) if pinned else sources
+
+def duplicate_ids(sources):
+    """
+    Source IDs used by more than one source, as id -> ["pkg (name, lang)", ...].
+    """
+    users = {}
+    for pkg, pkg_sources in sources.items():
+        for source in pkg_sources:
+            users.setdefault(str(source["id"]), []).append(f"{pkg} ({source['name']}, {source['lang']})")
+    return {source_id: names for source_id, names in sorted(users.items()) if len(names) > 1}
+
+def diff(static, inspector):
+    """
+    Compares two pkg -> sources mappings. Returns a list of differences.
+    """
+    differences = []
+    for pkg in sorted(static.keys() | inspector.keys()):
+        if pkg not in inspector:
+            differences.append(f"{pkg}: not in the Inspector output")
+            continue
+        if pkg not in static:
+            differences.append(f"{pkg}: not read statically")
+            continue
+        ours = {tuple(str(x.get(k, "")) for k in SOURCE_FIELDS) for x in static[pkg]}
+        theirs = {tuple(str(x.get(k, "")) for k in SOURCE_FIELDS) for x in inspector[pkg]}
+        for source in sorted(theirs - ours):
+            differences.append(f"{pkg}: Inspector has {dict(zip(SOURCE_FIELDS, source))}")
+        for source in sorted(ours - theirs):
+            differences.append(f"{pkg}: static has {dict(zip(SOURCE_FIELDS, source))}")
+    return differences
+
+def main():
+    parser = argparse.ArgumentParser(description="Read extension source metadata from the Gradle and Kotlin sources")
+    parser.add_argument("--root", default=".", help="source tree root (default: current directory)")
+    parser.add_argument("-o", "--output", help="write the sources as an output.json-style file")
+    parser.add_argument("--diff", metavar="OUTPUT_JSON", help="compare with the Inspector's output.json, exit 1 if they differ")
+    parser.add_argument("-j", "--workers", type=int, help="number of modules to parse concurrently (default: CPU count)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"where to cache metadata (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="parse every module from scratch")
+    args = parser.parse_args()
+
+    raw = extension_sources(args.root, None if args.no_cache else args.cache_dir, args.workers, pinned=False)
+    sources = pin_sources(raw)
+    print(f"Read {sum(len(x) for x in raw.values())} source(s) of {len(raw)} extension(s)")
+    for pkg in sorted(pkg for pkg in raw if sources[pkg] != raw[pkg]):
+        print(f"{pkg}: registry pins {sources[pkg]}, the code says {raw[pkg]}")
+    for source_id, names in duplicate_ids(raw).items():
+        print(f"Warning: source ID {source_id} is used by {', '.join(names)}")
+    if args.output:
+        tmp_path = f"{args.output}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sources, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp_path, args.output)
+    if args.diff:
+        with open(args.diff, encoding="utf-8") as f:
+            differences = diff(raw, json.load(f))
+        for difference in differences:
+            print(difference)
+        if differences:
+            sys.exit(1)
+        print(f"Matches {args.diff}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-import itertools
+import heapq
 import json
+import math
 import os
 import re
 import subprocess
@@ -7,13 +8,19 @@ import sys
 from pathlib import Path
 from typing import NoReturn
 
-EXTENSION_REGEX = re.compile(r"^src/(?P<lang>\w+)/(?P<extension>\w+)")
-MULTISRC_LIB_REGEX = re.compile(r"^lib-multisrc/(?P<multisrc>\w+)")
-LIB_REGEX = re.compile(r"^lib/(?P<lib>\w+)")
+from build_durations import load_durations
+from build_graph import load_graph
+from build_inputs import load_inputs, unchanged_modules
+from changes import classify, parse_name_status
+from instrument import count, span
+
 MODULE_REGEX = re.compile(r"^:src:(?P<lang>\w+):(?P<extension>\w+)$")
-CORE_FILES_REGEX = re.compile(
-    r"^(buildSrc/|core/|gradle/|build\.gradle\.kts|common\.gradle|gradle\.properties|settings\.gradle\.kts|.github/scripts)"
-)
+# build-durations.json of the published repo; every module costs the same without it
+BUILD_DURATIONS_FILE = os.getenv("BUILD_DURATIONS_FILE")
+# build-inputs.json of the published repo; build avoidance is off without it
+BUILD_INPUTS_FILE = os.getenv("BUILD_INPUTS_FILE")
+# JSON list of modules to build instead of those changed since the ref, [] for all
+BUILD_MODULES = os.getenv("BUILD_MODULES")
 
 def run_command(command: str) -> str:
     result = subprocess.run(command, capture_output=True, text=True, shell=True)
@@ -23,37 +30,16 @@ def run_command(command: str) -> str:
     return result.stdout.strip()
 
 def get_module_list(ref: str) -> tuple[list[str], list[str]]:
-    diff_output = run_command(f"git diff --name-status {ref}").splitlines()
-    
-    changed_files = [
-        file
-        for line in diff_output
-        for file in line.split("\t", 2)[1:]
-    ]
-        
-    modules = set()
-    libs = set()
-    deleted = set()
-    core_files_changed = False
-
-    for file in map(lambda x: Path(x).as_posix(), changed_files):
-        if CORE_FILES_REGEX.search(file):
-            core_files_changed = True
-            break
-        elif match := EXTENSION_REGEX.search(file):
-            lang = match.group("lang")
-            extension = match.group("extension")
-            if Path("src", lang, extension).is_dir():
-                modules.add(f':src:{lang}:{extension}')
-            deleted.add(f"{lang}.{extension}")
-        elif match := MULTISRC_LIB_REGEX.search(file):
-            multisrc = match.group("multisrc")
-            if Path("lib-multisrc", multisrc).is_dir():
-                libs.add(f":lib-multisrc:{multisrc}:printDependentExtensions")
-        elif match := LIB_REGEX.search(file):
-            lib = match.group("lib")
-            if Path("lib", lib).is_dir():
-                libs.add(f":lib:{lib}:printDependentExtensions")
+    with span("git diff"):
+        diff = run_command(f"git diff --name-status {ref}")
+    with span("classify"):
+        changes = classify(parse_name_status(diff))
+    print(f"Changed: {changes.summary()}")
+
+    modules = set(changes.extensions)
+    libs = changes.libs
+    deleted = set(changes.deleted)
+    core_files_changed = changes.core_files_changed
 
     def is_extension_module(module: str) -> bool:
         if not (match := MODULE_REGEX.search(module)):
@@ -64,9 +50,11 @@ def get_module_list(ref: str) -> tuple[list[str], list[str]]:
         return True
 
     if libs and not core_files_changed:
+        with span("build graph"):
+            graph = load_graph()
         modules.update([
-            module for module in
-            run_command("./gradlew -q " + " ".join(libs)).splitlines()
+            module for lib in libs
+            for module in graph.dependent_extensions(lib)
             if is_extension_module(module)
         ])
 
@@ -94,18 +82,67 @@ def get_all_modules() -> tuple[list[str], list[str]]:
             deleted.append(f"{lang.name}.{extension.name}")
     return modules, deleted
 
+def get_listed_modules(listed: list[str]) -> tuple[list[str], list[str]]:
+    if not listed:
+        return get_all_modules()
+    return listed, [module.removeprefix(":src:").replace(":", ".") for module in listed]
+
+def skip_unchanged(modules: list[str], deleted: list[str], build_type: str) -> tuple[list[str], list[str]]:
+    """
+    Drops the modules whose inputs are identical to those their published APK
+    was built from, and keeps their APKs from being deleted.
+    """
+    if not BUILD_INPUTS_FILE:
+        return modules, deleted
+    with span("build avoidance"):
+        unchanged = unchanged_modules(modules, build_type, load_inputs(BUILD_INPUTS_FILE))
+    count("modules skipped", len(unchanged))
+    if not unchanged:
+        print("Build avoidance: no scheduled module matches a published build")
+        return modules, deleted
+
+    print(f"Skipping {len(unchanged)} module(s) with unchanged inputs:")
+    for module, (digest, apk) in sorted(unchanged.items()):
+        print(f"  {module}: inputs {digest[:12]} already built into {apk}")
+    kept = {module.removeprefix(":src:").replace(":", ".") for module in unchanged}
+    return [x for x in modules if x not in unchanged], [x for x in deleted if x not in kept]
+
+def pack_chunks(modules: list[str], durations: dict[str, float], chunk_count: int) -> list[list[str]]:
+    """
+    Longest-processing-time-first bin packing: modules are handed out from the
+    slowest to the fastest, each to the chunk with the least total build time.
+    Modules without history cost the median of the known durations.
+    """
+    if not modules:
+        return []
+    known = sorted(durations[x] for x in modules if x in durations)
+    default_cost = known[len(known) // 2] if known else 1.0
+
+    chunks: list[list[str]] = [[] for _ in range(min(chunk_count, len(modules)))]
+    heap = [(0.0, i) for i in range(len(chunks))]
+    for module in sorted(modules, key=lambda x: (-durations.get(x, default_cost), x)):
+        load, i = heapq.heappop(heap)
+        chunks[i].append(module)
+        heapq.heappush(heap, (load + durations.get(module, default_cost), i))
+    return chunks
+
 def main() -> NoReturn:
     _, ref, build_type = sys.argv
-    modules, deleted = get_module_list(ref)
+    if BUILD_MODULES is not None:
+        modules, deleted = get_listed_modules(json.loads(BUILD_MODULES))
+    else:
+        modules, deleted = get_module_list(ref)
+    modules, deleted = skip_unchanged(modules, deleted, build_type)
+
+    chunk_count = math.ceil(len(modules) / int(os.getenv("CI_CHUNK_SIZE", 65)))
+    with span("pack chunks"):
+        chunks = pack_chunks(modules, load_durations(BUILD_DURATIONS_FILE), chunk_count)
+    count("modules", len(modules))
 
     chunked = {
         "chunk": [
-            {"number": i + 1, "modules": modules}
-            for i, modules in
-            enumerate(itertools.batched(
-                map(lambda x: f"{x}:assemble{build_type}", modules),
-                int(os.getenv("CI_CHUNK_SIZE", 65))
-            ))
+            {"number": i + 1, "modules": [f"{x}:assemble{build_type}" for x in chunk]}
+            for i, chunk in enumerate(chunks)
         ]
     }
 
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from instrument import count, span
+
+CHUNK_SIZE = 1024 * 1024
+
+def file_digest(file_path, algorithm="sha256"):
+    """
+    Hashes a file in fixed-size chunks so memory use doesn't depend on its size.
+    Returns (size, hexdigest), both taken from the same open file.
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if hasattr(hashlib, "file_digest"):
+            digest = hashlib.file_digest(f, algorithm)
+        else:
+            digest = hashlib.new(algorithm)
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    count("files hashed")
+    count("bytes hashed", size)
+    return size, digest.hexdigest()
+
+def digest_many(file_paths, workers=None, algorithm="sha256"):
+    """
+    Hashes several files concurrently. hashlib releases the GIL while hashing
+    large buffers, so threads scale with the number of cores.
+    Returns a dict of file path -> (size, hexdigest).
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return {}
+    with span("hash"), ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        results = executor.map(lambda x: file_digest(x, algorithm), file_paths)
+        return dict(zip(file_paths, results))
+
+class DigestCache:
+    """
+    File digests remembered across runs by (size, mtime), so unchanged files
+    aren't read again. Keys are the paths as given, so pass them consistently.
+    """
+
+    def __init__(self, path, algorithm="sha256"):
+        self.path = path
+        self.algorithm = algorithm
+        self.hits = 0
+        self.misses = 0
+        self._records = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("algorithm") == algorithm:
+                    self._records = data["files"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable digest cache: {e}")
+
+    def digest_many(self, file_paths, workers=None):
+        """
+        Like digest_many(), but only hashes the files whose (size, mtime) changed.
+        """
+        results = {}
+        stale = []
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            record = self._records.get(str(file_path))
+            if record and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+                results[file_path] = (stat.st_size, record["digest"])
+            else:
+                stale.append((file_path, stat))
+        self.hits += len(results)
+        self.misses += len(stale)
+        count("digest cache hits", len(results))
+        count("digest cache misses", len(stale))
+
+        digests = digest_many([x for x, _ in stale], workers, self.algorithm)
+        for file_path, stat in stale:
+            size, digest = digests[file_path]
+            results[file_path] = (size, digest)
+            # A file modified while being hashed would be recorded with a stale digest
+            if size == stat.st_size:
+                self._records[str(file_path)] = {"size": size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        return results
+
+    def save(self, keep=None):
+        """
+        Writes the cache, keeping only the given paths if keep is set.
+        """
+        if not self.path:
+            return
+        records = self._records
+        if keep is not None:
+            keep = {str(x) for x in keep}
+            records = {k: v for k, v in records.items() if k in keep}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"algorithm": self.algorithm, "files": records}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        return f"Digest cache: {self.hits} hit(s), {self.misses} miss(es)"
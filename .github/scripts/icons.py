@@ -0,0 +1,161 @@
+"""
+Icon extraction and optimization.
+
+Icons are streamed out of the APK and only written when their content
+differs from what is already on disk, so unchanged icons keep their mtime and
+don't show up as changes when the repo is merged and deployed.
+
+Optimization is lossless: PNG image data is re-deflated at the highest zlib
+level and metadata chunks that don't affect rendering are dropped. A WebP
+variant can be written next to each PNG when Pillow is installed.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from zipfile import ZipFile
+
+from hashing import file_digest
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# none: copy icons as is, png: lossless PNG recompression, webp: png plus a .webp variant
+ICON_OPTIMIZATION_MODES = ("none", "png", "webp")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Chunks that affect how the image renders; everything else is metadata
+RENDERING_CHUNKS = {b"IHDR", b"PLTE", b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT", b"IEND"}
+# Animated PNGs are left alone
+ANIMATION_CHUNKS = {b"acTL", b"fcTL", b"fdAT"}
+
+def _replace_if_changed(tmp_path, dest):
+    """
+    Moves tmp_path to dest unless dest already has the same content.
+    Returns True if dest was written.
+    """
+    dest = Path(dest)
+    if dest.exists() and file_digest(dest) == file_digest(tmp_path):
+        os.unlink(tmp_path)
+        return False
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, dest)
+    return True
+
+def extract_icon(apk_path, member, dest):
+    """
+    Streams an icon out of the APK into dest. Returns True if dest was written.
+    """
+    dest = Path(dest)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    try:
+        with ZipFile(apk_path) as z, z.open(member) as src, os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(src, f)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return _replace_if_changed(tmp, dest)
+
+def install_icon(src, dest):
+    """
+    Copies src to dest unless they are already identical. Returns True if dest was written.
+    """
+    dest = Path(dest)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f, open(src, "rb") as s:
+        shutil.copyfileobj(s, f)
+    return _replace_if_changed(tmp, dest)
+
+def _chunk(chunk_type, body):
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+def optimize_png(data):
+    """
+    Losslessly shrinks a PNG. Returns the input unchanged if it isn't a static
+    PNG or nothing could be saved.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+
+    chunks = []
+    idat = bytearray()
+    idat_position = None
+    position = len(PNG_SIGNATURE)
+    try:
+        while position < len(data):
+            length, chunk_type = struct.unpack_from(">I4s", data, position)
+            body = data[position + 8:position + 8 + length]
+            position += 12 + length
+            if chunk_type in ANIMATION_CHUNKS:
+                return data
+            if chunk_type == b"IDAT":
+                if idat_position is None:
+                    idat_position = len(chunks)
+                idat += body
+            elif chunk_type in RENDERING_CHUNKS:
+                chunks.append((chunk_type, body))
+            if chunk_type == b"IEND":
+                break
+        raw = zlib.decompress(bytes(idat))
+    except (struct.error, zlib.error):
+        return data
+    if idat_position is None:
+        return data
+
+    candidates = []
+    for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        candidates.append(compressor.compress(raw) + compressor.flush())
+    chunks.insert(idat_position, (b"IDAT", min(candidates, key=len)))
+
+    optimized = PNG_SIGNATURE + b"".join(_chunk(t, b) for t, b in chunks)
+    return optimized if len(optimized) < len(data) else data
+
+def optimize_icon(path, webp=False):
+    """
+    Optimizes one icon in place, optionally writing a .webp variant next to it.
+    Returns (bytes before, bytes after) for the PNG.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    optimized = optimize_png(data)
+    if optimized is not data:
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(optimized)
+        _replace_if_changed(tmp, path)
+
+    if webp and Image is not None:
+        webp_path = path.with_suffix(".webp")
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{webp_path.name}.", suffix=".tmp")
+        os.close(fd)
+        with Image.open(path) as image:
+            image.save(tmp, "WEBP", lossless=True, quality=100, method=6)
+        _replace_if_changed(tmp, webp_path)
+
+    return len(data), len(optimized)
+
+def optimize_icons(paths, webp=False, workers=None):
+    """
+    Optimizes icons on a process pool, or inline with a single worker.
+    Returns (bytes before, bytes after).
+    """
+    paths = [str(x) for x in paths]
+    if webp and Image is None:
+        print("Pillow is not installed, skipping WebP icons")
+        webp = False
+    if not paths:
+        return 0, 0
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        results = [optimize_icon(x, webp) for x in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(optimize_icon, paths, [webp] * len(paths)))
+    return sum(x[0] for x in results), sum(x[1] for x in results)
@@ -0,0 +1,204 @@
+"""
+Compact model of repo index entries, and a streaming index reader.
+
+Entry and Source keep the known fields in __slots__ rather than a dict per
+object, and normalize once when they are loaded (apk and icon paths, the
+default signature, dropping source versionIds). Unknown fields are kept
+aside and key order is remembered, so to_dict() gives back exactly what the
+index would have held after normalization.
+
+iter_json_array() decodes a JSON array one element at a time, so an index
+can be merged without holding its text and every parsed dict in memory.
+"""
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+NUMBER_DELIMITERS = frozenset(",] \t\n\r")
+
+# Key orders are shared between records instead of stored once per record
+_ORDERS = {}
+# (class, key order) -> (shared order, unknown keys, missing fields)
+_LAYOUTS = {}
+_NO_EXTRA = {}
+
+class IndexFormatError(ValueError):
+    pass
+
+class _Record:
+    __slots__ = ("_order", "_extra")
+    FIELDS = ()
+
+    def _load(self, data):
+        # Most records share a handful of layouts, so sort the keys out once per layout
+        order = tuple(data)
+        layout = _LAYOUTS.get((type(self), order))
+        if layout is None:
+            layout = _LAYOUTS[type(self), order] = (
+                _ORDERS.setdefault(order, order),
+                tuple(x for x in order if x not in self.FIELDS),
+                tuple(x for x in self.FIELDS if x not in data),
+            )
+        self._order, unknown, missing = layout
+        for key in missing:
+            setattr(self, key, None)
+        if unknown:
+            self._extra = {key: data[key] for key in unknown}
+            for key, value in data.items():
+                if key not in self._extra:
+                    setattr(self, key, value)
+        else:
+            self._extra = None
+            for key, value in data.items():
+                setattr(self, key, value)
+
+    def _set_order(self, order):
+        self._order = _ORDERS.setdefault(order, order)
+
+    def get(self, key, default=None):
+        if key not in self._order:
+            return default
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return getattr(self, key)
+
+    def to_dict(self):
+        extra = self._extra or _NO_EXTRA
+        return {key: extra[key] if key in extra else getattr(self, key) for key in self._order}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return (
+            set(self._order) == set(other._order)
+            and self._extra == other._extra
+            and all(getattr(self, x) == getattr(other, x) for x in self.FIELDS)
+        )
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class Source(_Record):
+    FIELDS = ("name", "id", "lang", "baseUrl")
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_dict(cls, data):
+        source = cls()
+        # versionId changes with every build, so it isn't published
+        if "versionId" in data:
+            data = {k: v for k, v in data.items() if k != "versionId"}
+        source._load(data)
+        return source
+
+class Entry(_Record):
+    FIELDS = (
+        "name", "pkg", "apk", "lang", "code", "version", "nsfw", "hasReadme", "hasChangelog",
+        "icon", "sig", "size", "sha256", "sources",
+    )
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_dict(cls, data, default_sig=None):
+        """
+        Validates and normalizes an index entry. default_sig fills in a
+        missing or empty sig.
+        """
+        if not isinstance(data, dict):
+            raise IndexFormatError(f"index entry is not an object: {data!r:.80}")
+        pkg = data.get("pkg")
+        if not isinstance(pkg, str) or not pkg:
+            raise IndexFormatError(f"index entry without a pkg: {data.get('name')!r}")
+        if "apk" in data and not isinstance(data["apk"], str):
+            raise IndexFormatError(f"{pkg}: apk must be a string")
+        if "code" in data and not isinstance(data["code"], int):
+            raise IndexFormatError(f"{pkg}: code must be an integer")
+        if not isinstance(data.get("sources", []), list):
+            raise IndexFormatError(f"{pkg}: sources must be a list")
+
+        entry = cls()
+        entry._load(data)
+        if entry.apk is not None:
+            entry.apk = entry.apk.split("/")[-1]
+        if entry.icon is not None and not entry.icon.startswith("http"):
+            entry.icon = f"icon/{entry.icon.split('/')[-1]}"
+        if default_sig and ("sig" not in entry._order or entry.sig == ""):
+            if "sig" not in entry._order:
+                entry._set_order(entry._order + ("sig",))
+            entry.sig = default_sig
+        if entry.sources is not None:
+            entry.sources = [Source.from_dict(x) for x in entry.sources]
+        return entry
+
+    def to_dict(self):
+        data = super().to_dict()
+        # Reassigning an existing key keeps its position
+        if self.sources is not None:
+            data["sources"] = [x.to_dict() for x in self.sources]
+        return data
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields the elements of the JSON array in path one at a time, reading the
+    file in chunks.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        started = False
+        first = True
+        expect_value = True
+        while True:
+            pos = WHITESPACE_REGEX.match(buffer, pos).end()
+            if pos < len(buffer):
+                char = buffer[pos]
+                if not started:
+                    if char != "[":
+                        raise IndexFormatError(f"{path} is not a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if char == "]" and (not expect_value or first):
+                    return
+                if char == "," and not expect_value:
+                    pos += 1
+                    expect_value = True
+                    continue
+                if not expect_value:
+                    raise IndexFormatError(f"{path}: expected ',' or ']' at offset {pos}")
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely an element cut off by the end of the chunk
+                    if eof:
+                        raise
+                else:
+                    # A number cut off by the end of the chunk still decodes ("45" of
+                    # "45.5"), so it only counts once a delimiter follows it
+                    complete = end < len(buffer) and (
+                        not isinstance(value, (int, float)) or buffer[end] in NUMBER_DELIMITERS
+                    )
+                    if complete or eof:
+                        yield value
+                        pos = end
+                        expect_value = False
+                        first = False
+                        continue
+            elif eof:
+                raise IndexFormatError(f"{path} ends before the array does")
+
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+def load_entries(path, default_sig=None):
+    """
+    Yields the entries of an index file as normalized Entry objects.
+    """
+    for data in iter_json_array(path):
+        yield Entry.from_dict(data, default_sig)
@@ -0,0 +1,241 @@
+"""
+Writes the repo index files in a single pass over the entries.
+
+Every entry is serialized once per format and streamed into all outputs
+(index.min.json, index.json and optionally index.html) together. Each file
+goes to a temporary file first and is renamed into place, so readers never
+see a half-written index. Precompressed .gz/.br siblings are optional.
+
+write_shards() additionally splits the index per language and nsfw flag,
+with a small shards.json manifest so clients only fetch what they need, and
+write_search_index() writes the token and trigram index of search_index.py.
+"""
+import hashlib
+import html
+import json
+import os
+import tempfile
+import zlib
+from pathlib import Path
+
+from hashing import file_digest
+from instrument import count
+from search_index import SEARCH_INDEX, build
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIONS = ("gz", "br")
+
+SHARD_DIR = "shards"
+SHARD_MANIFEST = "shards.json"
+
+HTML_HEADER = '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n<title>apks</title>\n</head>\n<body>\n<pre>\n'
+HTML_FOOTER = '</pre>\n</body>\n</html>\n'
+
+def _compressor(kind):
+    if kind == "gz":
+        # wbits=31 emits a gzip stream with a zero mtime, so output is reproducible
+        return zlib.compressobj(9, zlib.DEFLATED, 31)
+    if kind == "br":
+        return brotli.Compressor(quality=11)
+    raise ValueError(f"unknown compression {kind}")
+
+class AtomicOutput:
+    """
+    A text file written through a temporary file and renamed into place on
+    commit(), with optional compressed siblings written alongside.
+    """
+
+    def __init__(self, path, compress=()):
+        self.path = Path(path)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._files = {}
+        self._compressors = {}
+        for kind in ("", *compress):
+            target = self.path.with_name(f"{self.path.name}.{kind}" if kind else self.path.name)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{target.name}.", suffix=".tmp")
+            self._files[kind] = (target, Path(tmp), os.fdopen(fd, "wb"))
+            if kind:
+                self._compressors[kind] = _compressor(kind)
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.digest.update(data)
+        self.size += len(data)
+        self._files[""][2].write(data)
+        for kind, compressor in self._compressors.items():
+            self._files[kind][2].write(compressor.compress(data))
+
+    def _unchanged(self):
+        if not self.path.exists() or not all(target.exists() for target, _, _ in self._files.values()):
+            return False
+        return file_digest(self.path)[1] == self.digest.hexdigest()
+
+    def commit(self, only_if_changed=False):
+        """
+        Moves the file into place. Returns False when only_if_changed is set and
+        the existing file already had this content.
+        """
+        for kind, compressor in self._compressors.items():
+            self._files[kind][2].write(compressor.flush())
+        for _, _, f in self._files.values():
+            f.close()
+
+        if only_if_changed and self._unchanged():
+            self.discard()
+            return False
+        for target, tmp, _ in self._files.values():
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+        return True
+
+    def discard(self):
+        for _, tmp, f in self._files.values():
+            f.close()
+            tmp.unlink(missing_ok=True)
+
+def _indented(entry, ensure_ascii):
+    # Matches json.dump(index, indent=2) for an entry nested one level deep
+    return "  " + json.dumps(entry, ensure_ascii=ensure_ascii, indent=2).replace("\n", "\n  ")
+
+def _html_line(entry):
+    apk_escaped = 'apk/' + html.escape(entry["apk"].split("/")[-1])
+    name_escaped = html.escape(entry["name"])
+    return f'<a href="{apk_escaped}">{name_escaped}</a>\n'
+
+def _check_compress(compress):
+    compress = tuple(compress)
+    if "br" in compress and brotli is None:
+        print("brotli is not installed, skipping .br files")
+        compress = tuple(x for x in compress if x != "br")
+    return compress
+
+def write_index(repo_dir, entries, repo_info, ensure_ascii=False, write_html=False, compress=(),
+                only_if_changed=False):
+    """
+    Writes index.min.json, index.json, repo.json and, with write_html,
+    index.html into repo_dir. Returns the names of the files that were written.
+    """
+    repo_dir = Path(repo_dir)
+    compress = _check_compress(compress)
+
+    outputs = {
+        "index.min.json": AtomicOutput(repo_dir / "index.min.json", compress),
+        "index.json": AtomicOutput(repo_dir / "index.json", compress),
+    }
+    if write_html:
+        outputs["index.html"] = AtomicOutput(repo_dir / "index.html")
+
+    try:
+        minified, pretty = outputs["index.min.json"], outputs["index.json"]
+        minified.write("[")
+        pretty.write("[")
+        if write_html:
+            outputs["index.html"].write(HTML_HEADER)
+
+        # entries may be any iterable, so it is only walked once
+        entry_count = 0
+        for entry in entries:
+            minified.write(("," if entry_count else "") + json.dumps(entry, ensure_ascii=ensure_ascii, separators=(",", ":")))
+            pretty.write((",\n" if entry_count else "\n") + _indented(entry, ensure_ascii))
+            if write_html:
+                outputs["index.html"].write(_html_line(entry))
+            entry_count += 1
+
+        minified.write("]")
+        pretty.write("\n]" if entry_count else "]")
+        if write_html:
+            outputs["index.html"].write(HTML_FOOTER)
+
+        repo_output = AtomicOutput(repo_dir / "repo.json")
+        outputs["repo.json"] = repo_output
+        repo_output.write(json.dumps(repo_info, indent=2))
+    except BaseException:
+        for output in outputs.values():
+            output.discard()
+        raise
+
+    written = [name for name, output in outputs.items() if output.commit(only_if_changed)]
+    count("index files written", len(written))
+    return written
+
+def shard_name(entry):
+    # en.min.json for sfw extensions, en.nsfw.min.json for nsfw ones
+    return f"{entry['lang']}.nsfw.min.json" if entry.get("nsfw") else f"{entry['lang']}.min.json"
+
+def write_shards(repo_dir, entries, ensure_ascii=False, compress=(), only_if_changed=False):
+    """
+    Writes one minified index per language and nsfw flag into repo_dir/shards,
+    plus a shards.json manifest with the name, entry count, size and sha256 of
+    each shard. Shards that no longer have entries are removed.
+    Returns the names of the files that were written.
+    """
+    repo_dir = Path(repo_dir)
+    shard_dir = repo_dir / SHARD_DIR
+    shard_dir.mkdir(exist_ok=True)
+    compress = _check_compress(compress)
+
+    groups = {}
+    for entry in entries:
+        groups.setdefault(shard_name(entry), []).append(entry)
+
+    outputs = {}
+    manifest = {"shards": []}
+    try:
+        for name in sorted(groups):
+            output = AtomicOutput(shard_dir / name, compress)
+            outputs[f"{SHARD_DIR}/{name}"] = output
+            output.write("[" + ",".join(
+                json.dumps(entry, ensure_ascii=ensure_ascii, separators=(",", ":")) for entry in groups[name]
+            ) + "]")
+            first = groups[name][0]
+            manifest["shards"].append({
+                "file": f"{SHARD_DIR}/{name}",
+                "lang": first["lang"],
+                "nsfw": 1 if first.get("nsfw") else 0,
+                "count": len(groups[name]),
+                "size": output.size,
+                "sha256": output.digest.hexdigest(),
+            })
+        manifest["count"] = sum(x["count"] for x in manifest["shards"])
+
+        manifest_output = AtomicOutput(repo_dir / SHARD_MANIFEST)
+        outputs[SHARD_MANIFEST] = manifest_output
+        manifest_output.write(json.dumps(manifest, indent=2))
+    except BaseException:
+        for output in outputs.values():
+            output.discard()
+        raise
+
+    written = [name for name, output in outputs.items() if output.commit(only_if_changed)]
+    count("index files written", len(written))
+
+    for file in sorted(shard_dir.iterdir()):
+        base = file.name
+        for kind in COMPRESSIONS:
+            base = base.removesuffix(f".{kind}")
+        if base.endswith(".min.json") and base not in groups:
+            print(f"Deleting stale shard {file.name}")
+            file.unlink()
+    return written
+
+def write_search_index(repo_dir, entries, index_sha256, compress=(), only_if_changed=False):
+    """
+    Writes repo_dir/search.json for entries, in index.min.json order, built
+    from the index whose sha256 is index_sha256.
+    Returns the names of the files that were written.
+    """
+    repo_dir = Path(repo_dir)
+    output = AtomicOutput(repo_dir / SEARCH_INDEX, _check_compress(compress))
+    try:
+        output.write(json.dumps(build(entries, index_sha256), ensure_ascii=False, separators=(",", ":")))
+    except BaseException:
+        output.discard()
+        raise
+    written = [SEARCH_INDEX] if output.commit(only_if_changed) else []
+    count("index files written", len(written))
+    return written
@@ -0,0 +1,144 @@
+"""
+Phase timing and counters for the publishing scripts.
+
+Disabled unless REPO_METRICS names a file. When enabled, nested span()
+timings are aggregated per path (e.g. "merge/sync apk") and count()
+totals are kept, and on exit both are appended to that file as JSON lines
+and rendered as a table into the GitHub step summary (or stderr outside of
+Actions). When disabled, span() hands back a shared no-op object and
+count() returns immediately, so instrumented code pays next to nothing.
+
+    with span("inspect"):
+        count("apks")
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+METRICS_FILE = os.environ.get("REPO_METRICS")
+ENABLED = bool(METRICS_FILE)
+
+_lock = threading.Lock()
+# Each thread nests its own spans; spans opened on worker threads are
+# attributed to whatever span the main thread is in
+_local = threading.local()
+_main_stack = []
+# span path -> [calls, total seconds, max seconds]
+_spans = {}
+_counters = {}
+_start = time.perf_counter()
+
+class _Span:
+    __slots__ = ("name", "path", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = _main_stack if threading.current_thread() is threading.main_thread() else []
+        parent = stack or _main_stack
+        self.path = f"{parent[-1]}/{self.name}" if parent else self.name
+        stack.append(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _local.stack.pop()
+        with _lock:
+            record = _spans.get(self.path)
+            if record is None:
+                record = _spans[self.path] = [0, 0.0, 0.0]
+            record[0] += 1
+            record[1] += elapsed
+            record[2] = max(record[2], elapsed)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name):
+    """
+    Times a block. Spans opened inside it on the same thread are nested under it.
+    """
+    return _Span(name) if ENABLED else _NO_SPAN
+
+def count(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def records(script=None):
+    """
+    The collected metrics as a list of JSON-serializable dicts.
+    """
+    script = script or Path(sys.argv[0]).stem
+    with _lock:
+        lines = [{
+            "type": "run",
+            "script": script,
+            "wall_s": round(time.perf_counter() - _start, 6),
+        }]
+        lines += [
+            {"type": "span", "script": script, "path": path, "calls": calls,
+             "total_s": round(total, 6), "max_s": round(longest, 6)}
+            # Sorted by path components so children follow their parent
+            for path, (calls, total, longest) in sorted(_spans.items(), key=lambda x: x[0].split("/"))
+        ]
+        lines += [
+            {"type": "counter", "script": script, "name": name, "value": value}
+            for name, value in sorted(_counters.items())
+        ]
+    return lines
+
+def summary_table(lines):
+    """
+    Renders records() as a Markdown table.
+    """
+    run, spans = lines[0], [x for x in lines if x["type"] == "span"]
+    counters = [x for x in lines if x["type"] == "counter"]
+    out = [f"### {run['script']}: {run['wall_s']:.3f} s", ""]
+    if spans:
+        out += ["| Phase | Calls | Total (s) | Max (s) |", "| :--- | ---: | ---: | ---: |"]
+        for x in spans:
+            # Indent nested phases under their parent
+            depth = x["path"].count("/")
+            name = "&nbsp;&nbsp;" * depth + x["path"].rsplit("/", 1)[-1]
+            out.append(f"| {name} | {x['calls']} | {x['total_s']:.3f} | {x['max_s']:.3f} |")
+        out.append("")
+    if counters:
+        out += ["| Counter | Value |", "| :--- | ---: |"]
+        out += [f"| {x['name']} | {x['value']} |" for x in counters]
+        out.append("")
+    return "\n".join(out) + "\n"
+
+def _flush():
+    lines = records()
+    with open(METRICS_FILE, "a", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+
+    table = summary_table(lines)
+    if summary_file := os.environ.get("GITHUB_STEP_SUMMARY"):
+        with open(summary_file, "a", encoding="utf-8") as f:
+            f.write(table)
+    else:
+        sys.stderr.write(table)
+
+if ENABLED:
+    atexit.register(_flush)
@@ -0,0 +1,370 @@
+"""
+Simulates many app clients polling a published repo over HTTP.
+
+Each client polls repo.json and index.min.json with If-None-Match, as the
+app does, fetches a few icons the first time it sees the index, and every
+so often downloads an APK, sometimes resuming it with a Range request.
+Requests go over keep-alive connections opened with asyncio, and the run
+reports latency percentiles, throughput and bytes transferred per kind of
+request. Point it at repo_server.py, or let --serve start one, to compare
+index formats and compression settings before publishing them.
+
+    python .github/scripts/load_test.py --serve repo --clients 200 --duration 30
+    python .github/scripts/load_test.py http://127.0.0.1:8000/ --compare load.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import subprocess
+import sys
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+KINDS = ("repo.json", "index", "icon", "apk", "apk range")
+
+class ResponseError(Exception):
+    pass
+
+class Connection:
+    """
+    A minimal HTTP/1.1 client connection. Bodies are counted and discarded
+    unless asked for.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, path, headers=None, keep_body=False, method="GET"):
+        """
+        Returns (status, headers, body bytes received, body or None).
+        Reconnects once if a kept-alive connection was closed by the server.
+        """
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                return await self._exchange(path, headers or {}, keep_body, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if not reused or attempt:
+                    raise
+
+    async def _exchange(self, path, headers, keep_body, method):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self.reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "identity") != "identity":
+            raise ResponseError(f"{path}: unsupported transfer encoding {response_headers['transfer-encoding']}")
+        # 304 and responses to HEAD never have a body, whatever their headers say
+        length = 0 if status == 304 or method == "HEAD" else int(response_headers.get("content-length", 0))
+        body = bytearray() if keep_body else None
+        remaining = length
+        while remaining:
+            chunk = await self.reader.read(min(remaining, 256 * 1024))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(chunk)
+            if keep_body:
+                body += chunk
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, length, body
+
+class Stats:
+    def __init__(self):
+        self.latencies = {kind: [] for kind in KINDS}
+        self.statuses = {kind: {} for kind in KINDS}
+        self.bytes = {kind: 0 for kind in KINDS}
+        self.errors = {}
+
+    def record(self, kind, seconds, status, size):
+        self.latencies[kind].append(seconds)
+        self.statuses[kind][status] = self.statuses[kind].get(status, 0) + 1
+        self.bytes[kind] += size
+
+    def error(self, kind, error):
+        name = f"{kind}: {type(error).__name__}"
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+async def timed(connection, stats, kind, path, headers=None, keep_body=False):
+    start = time.perf_counter()
+    try:
+        status, response_headers, size, body = await connection.request(path, headers, keep_body)
+    except (OSError, asyncio.IncompleteReadError, ResponseError, ValueError) as e:
+        stats.error(kind, e)
+        await connection.close()
+        return None, {}, None
+    stats.record(kind, time.perf_counter() - start, status, size)
+    return status, response_headers, body
+
+async def client(base_path, host, port, catalog, args, stats, deadline, rng):
+    """
+    One simulated app: polls, fetches icons once, downloads the odd APK.
+    """
+    connection = Connection(host, port)
+    etags = {}
+    seen_icons = False
+    encoding = {} if args.encoding == "identity" else {"Accept-Encoding": args.encoding}
+    # Clients don't all start polling at the same moment
+    await asyncio.sleep(rng.uniform(0, args.interval))
+    try:
+        while time.perf_counter() < deadline:
+            for kind, name in (("repo.json", "repo.json"), ("index", "index.min.json")):
+                headers = dict(encoding)
+                if name in etags:
+                    headers["If-None-Match"] = etags[name]
+                status, response_headers, _ = await timed(connection, stats, kind, base_path + name, headers)
+                if status == 200 and "etag" in response_headers:
+                    etags[name] = response_headers["etag"]
+
+            if not seen_icons and catalog["icons"]:
+                for icon in rng.sample(catalog["icons"], min(args.icons, len(catalog["icons"]))):
+                    await timed(connection, stats, "icon", base_path + icon)
+                seen_icons = True
+
+            if catalog["apks"] and rng.random() < args.apk_rate:
+                apk, size = rng.choice(catalog["apks"])
+                path = base_path + "apk/" + urllib.parse.quote(apk)
+                if size > 1 and rng.random() < args.range_rate:
+                    # An interrupted download, resumed from where it stopped
+                    split = rng.randrange(1, size)
+                    await timed(connection, stats, "apk range", path, {"Range": f"bytes=0-{split - 1}"})
+                    await timed(connection, stats, "apk range", path, {"Range": f"bytes={split}-"})
+                else:
+                    await timed(connection, stats, "apk", path)
+
+            await asyncio.sleep(rng.expovariate(1 / args.interval) if args.interval else 0)
+    finally:
+        await connection.close()
+
+async def apk_sizes(host, port, base_path, apks):
+    """
+    Fills in the sizes the index doesn't give (generate_repo.py doesn't write
+    them) from the Content-Length of HEAD requests, so Range requests can be
+    split. APKs whose size can't be found keep 0 and are never split.
+    """
+    connection = Connection(host, port)
+    sized = []
+    try:
+        for apk, size in apks:
+            if not size:
+                status, headers, _, _ = await connection.request(
+                    base_path + "apk/" + urllib.parse.quote(apk), method="HEAD",
+                )
+                if status == 200:
+                    size = int(headers.get("content-length", 0))
+            sized.append((apk, size))
+    finally:
+        await connection.close()
+    return sized
+
+async def load_catalog(host, port, base_path):
+    """
+    Reads the APKs and icons to request from the served index.
+    """
+    connection = Connection(host, port)
+    try:
+        status, headers, _, body = await connection.request(
+            base_path + "index.min.json", {"Accept-Encoding": "gzip"}, keep_body=True,
+        )
+    finally:
+        await connection.close()
+    if status != 200:
+        raise SystemExit(f"Fetching index.min.json returned {status}")
+    if headers.get("content-encoding") == "gzip":
+        body = gzip.decompress(body)
+    index = json.loads(body)
+    apks = [(x["apk"].split("/")[-1], x.get("size", 0)) for x in index if x.get("apk")]
+    if any(not size for _, size in apks):
+        apks = await apk_sizes(host, port, base_path, apks)
+    return {
+        "apks": apks,
+        "icons": [
+            f"icon/{x['icon'].split('/')[-1]}"
+            for x in index if x.get("icon") and not x["icon"].startswith("http")
+        ],
+        "entries": len(index),
+    }
+
+async def run_load(url, args):
+    parts = urllib.parse.urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    base_path = parts.path if parts.path.endswith("/") else parts.path + "/"
+
+    catalog = await load_catalog(host, port, base_path)
+    print(
+        f"Loaded {catalog['entries']} entries; {args.clients} clients for {args.duration:g} s, "
+        f"Accept-Encoding: {args.encoding}"
+    )
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        client(base_path, host, port, catalog, args, stats, deadline, random.Random(rng.random()))
+        for _ in range(args.clients)
+    ))
+    return stats, time.perf_counter() - start
+
+def report(stats, elapsed):
+    results = {"elapsed_s": round(elapsed, 3), "kinds": {}, "errors": stats.errors}
+    total_requests = total_bytes = 0
+    print(f"{'Request':<10} {'Count':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'MiB':>9}  Statuses")
+    for kind in KINDS:
+        latencies = sorted(stats.latencies[kind])
+        if not latencies:
+            continue
+        result = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+            "bytes": stats.bytes[kind],
+            "statuses": {str(k): v for k, v in sorted(stats.statuses[kind].items())},
+        }
+        results["kinds"][kind] = result
+        total_requests += len(latencies)
+        total_bytes += stats.bytes[kind]
+        statuses = ", ".join(f"{k}: {v}" for k, v in result["statuses"].items())
+        print(
+            f"{kind:<10} {len(latencies):>8} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['max_ms']:>9.2f} {stats.bytes[kind] / 2**20:>9.2f}  {statuses}"
+        )
+
+    results["requests"] = total_requests
+    results["bytes"] = total_bytes
+    results["requests_per_s"] = round(total_requests / elapsed, 2) if elapsed else 0.0
+    results["mib_per_s"] = round(total_bytes / 2**20 / elapsed, 3) if elapsed else 0.0
+    print(
+        f"Total: {total_requests} requests in {elapsed:.2f} s, {results['requests_per_s']} req/s, "
+        f"{total_bytes / 2**20:.2f} MiB ({results['mib_per_s']} MiB/s)"
+    )
+    for name, value in sorted(stats.errors.items()):
+        print(f"  error {name}: {value}")
+    return results
+
+def compare(previous, current):
+    print(f"Compared with {previous['timestamp']}:")
+    for kind, result in current["kinds"].items():
+        old = previous.get("kinds", {}).get(kind)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p99_ms", "bytes"):
+            if not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            print(f"  {kind:<10} {metric:<8} {old[metric]:>12} -> {result[metric]:>12}  {change:+7.1f}%")
+    for metric in ("requests_per_s", "mib_per_s"):
+        if previous.get(metric):
+            change = (current[metric] - previous[metric]) / previous[metric] * 100
+            print(f"  {metric:<19} {previous[metric]:>12} -> {current[metric]:>12}  {change:+7.1f}%")
+
+def start_server(directory):
+    """
+    Starts repo_server.py on a free port. Returns the process and its URL.
+    """
+    process = subprocess.Popen(
+        [sys.executable, SCRIPTS_DIR / "repo_server.py", directory, "--port", "0", "--quiet"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        raise SystemExit("repo_server.py didn't start")
+    return process, line.split()[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate app clients polling a published repo")
+    parser.add_argument("url", nargs="?", help="base URL of the repo, e.g. http://127.0.0.1:8000/")
+    parser.add_argument("--serve", metavar="DIR", help="start repo_server.py for this directory and load it")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent clients (default: 100)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run for (default: 10)")
+    parser.add_argument("--interval", type=float, default=1.0, help="mean seconds between a client's polls (default: 1)")
+    parser.add_argument("--icons", type=int, default=20, help="icons each client fetches once (default: 20)")
+    parser.add_argument("--apk-rate", type=float, default=0.05, help="chance a poll downloads an APK (default: 0.05)")
+    parser.add_argument(
+        "--range-rate",
+        type=float,
+        default=0.2,
+        help="chance an APK download is split into two Range requests (default: 0.2)",
+    )
+    parser.add_argument(
+        "--encoding",
+        default="br, gzip",
+        help="Accept-Encoding sent with repo.json and the index, or 'identity' (default: 'br, gzip')",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable runs")
+    parser.add_argument("-o", "--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="previous results to compare with")
+    args = parser.parse_args()
+    if bool(args.url) == bool(args.serve):
+        parser.error("give either a URL or --serve")
+
+    server = None
+    url = args.url
+    if args.serve:
+        server, url = start_server(args.serve)
+        print(f"Started repo_server.py on {url}")
+    try:
+        stats, elapsed = asyncio.run(run_load(url, args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "url": url,
+        "params": {k: v for k, v in vars(args).items() if k not in ("url", "serve", "output", "compare")},
+        **report(stats, elapsed),
+    }
+
+    if args.compare:
+        with args.compare.open(encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
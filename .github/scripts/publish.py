@@ -0,0 +1,677 @@
+"""
+In-process publish pipeline: collect -> inspect -> merge -> write -> gc.
+
+The stages used to be separate scripts talking through files on disk
+(move-built-apks.py, generate_repo.py, merge-repo.py). Here they pass the
+index entries in memory, and APKs and icons are renamed into place instead
+of copied when both sides are on the same filesystem. Each finished stage is
+recorded in a state file, so a failed run can be resumed with --resume.
+The old scripts (and create-repo.py) are kept as thin wrappers around these
+functions.
+
+    python .github/scripts/publish.py --remote ../repo
+    python .github/scripts/publish.py --remote ../repo --resume
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR, ApkCache
+from apk_signature import REPO_FINGERPRINT, SignatureError, check_signer, signer_fingerprint
+from badging import find_aapt, read_badging, tool_version
+from delta_feed import DEFAULT_MAX_DELTAS, max_deltas_arg, read_generation, write_delta
+from extension_metadata import extension_sources
+from hashing import file_digest
+from icons import ICON_OPTIMIZATION_MODES, extract_icon, optimize_icons
+from index_model import Entry, iter_json_array, load_entries
+from index_writer import COMPRESSIONS, write_index, write_search_index, write_shards
+from instrument import count, span
+from source_registry import get_source_ids, registry_entry
+
+STAGES = ("collect", "inspect", "merge", "write", "gc")
+
+DEFAULT_ARTIFACTS_DIR = Path.home() / "apk-artifacts"
+
+LANGUAGE_REGEX = re.compile(r"tachiyomi-([^.]+)")
+
+def repo_info(generation):
+    # CORRECT REPO.JSON GENERATION (Metadata)
+    return {
+        "meta": {
+            "name": "SalmanBappi Manga Repo",
+            "shortName": "SBManga",
+            "website": "https://salmanbappi.github.io/salmanbappi-manga-extension/",
+            "signingKeyFingerprint": REPO_FINGERPRINT
+        },
+        "generation": generation,
+    }
+
+def place_file(src: Path, dst: Path, move: bool = False):
+    """
+    Copies src to dst, or renames it when move is set and both are on the
+    same filesystem.
+    """
+    if move and src.stat().st_dev == dst.parent.stat().st_dev:
+        os.replace(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+# Stage 1: collect
+
+def collect(artifacts_dir: Path, apk_dir: Path) -> int:
+    """
+    Moves the built APKs out of the downloaded artifacts into apk_dir,
+    dropping the -release suffix. Returns the number of APKs collected.
+    """
+    shutil.rmtree(apk_dir, ignore_errors=True)
+    apk_dir.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    for apk in Path(artifacts_dir).glob("**/*.apk"):
+        apk_name = apk.name.replace("-release.apk", ".apk")
+        # shutil.move() renames within a filesystem and only copies across them
+        shutil.move(apk, apk_dir.joinpath(apk_name))
+        count += 1
+    return count
+
+# Stage 2: inspect
+
+@dataclass
+class ApkInfo:
+    sha256: str
+    size: int
+    sig: str
+    # None if neither the native reader nor aapt could read it
+    badging: dict
+
+def read_apk(apk_path: Path, icon_dir: Path, aapt_cmd: str, cache: ApkCache = None, fresh_icons: list = None) -> ApkInfo:
+    """
+    Hashes an APK, checks its signer, reads its badging and extracts its icon
+    into icon_dir, going through cache for APKs inspected before. Icons
+    extracted rather than restored from the cache are appended to fresh_icons.
+    Raises SignatureError if the APK isn't signed by the repo key.
+    """
+    if cache is not None:
+        sha256, size, entry = cache.lookup(apk_path)
+    else:
+        (size, sha256), entry = file_digest(apk_path), None
+
+    # Cached with the badging, so only new APKs are read for their signer
+    if entry is not None:
+        sig = entry["sig"]
+    else:
+        with span("signer"):
+            sig = signer_fingerprint(apk_path)
+    check_signer(apk_path.name, sig)
+
+    # Unchanged APKs reuse the cached badging and icon instead of reading them again
+    if entry is not None:
+        badging = entry["badging"]
+        with span("icon"):
+            cache.restore_icon(entry, icon_dir / f"{badging['pkg'] or apk_path.stem}.png")
+        return ApkInfo(sha256, size, sig, badging)
+
+    try:
+        with span("badging"):
+            badging = read_badging(apk_path, aapt_cmd)
+    except Exception as e:
+        print(f"Failed to read badging of {apk_path.name}: {e}")
+        return ApkInfo(sha256, size, sig, None)
+
+    icon_path = icon_dir / f"{badging['pkg'] or apk_path.stem}.png"
+    extracted = False
+    if badging["icon"]:
+        try:
+            with span("icon"):
+                extract_icon(apk_path, badging["icon"], icon_path)
+            extracted = True
+            if fresh_icons is not None:
+                fresh_icons.append(icon_path)
+        except Exception as e:
+            print(f"Failed to extract icon: {e}")
+
+    # Don't cache an entry whose icon we failed to extract
+    if cache is not None and (extracted or not badging["icon"]):
+        cache.store(sha256, badging, icon_path if extracted else None, sig)
+    return ApkInfo(sha256, size, sig, badging)
+
+def index_item(apk_name: str, apk: ApkInfo, sources: dict = None):
+    """
+    Builds the index entry of an inspected APK, falling back to defaults
+    derived from its file name for whatever its badging lacks. sources maps
+    pkg to the sources read from the extension modules; registered and other
+    packages get a single source from the registry. Returns a (pkg, item) tuple.
+    """
+    pkg = apk_name.replace(".apk", "")
+    # e.g. eu.kanade.tachiyomi.extension.en.comix -> Comix
+    name = pkg.split(".")[-1].capitalize()
+    code = 1
+    version = "1.0"
+    lang = "en"
+
+    badging = apk.badging
+    if badging is not None:
+        if badging["pkg"]: pkg = badging["pkg"]
+        if badging["code"] is not None: code = badging["code"]
+        if badging["version"]: version = badging["version"]
+        # Strip "Tachiyomi: " from the label to get a clean source name
+        if badging["label"]:
+            name = badging["label"].replace("Tachiyomi: ", "")
+        if match := LANGUAGE_REGEX.search(apk_name):
+            lang = match[1]
+
+    # Registered sources keep their pinned ID and base URL, whatever their code says
+    if sources and pkg in sources and registry_entry(pkg, name) is None:
+        item_sources = sources[pkg]
+    else:
+        [(source_id, base_url)] = get_source_ids([(pkg, name, lang)])
+        item_sources = [{"name": name, "id": source_id, "lang": lang, "baseUrl": base_url}]
+
+    return pkg, {
+        "name": f"Tachiyomi: {name}", # Keep full name for app display
+        "pkg": pkg,
+        "apk": apk_name,
+        "lang": lang,
+        "code": code,
+        "version": version,
+        "nsfw": 1,
+        "hasReadme": 0,
+        "hasChangelog": 0,
+        "icon": f"icon/{pkg}.png",
+        "sig": apk.sig,
+        "sources": item_sources,
+        "sha256": apk.sha256,
+    }
+
+def inspect_apk(apk_dir, icon_dir, apk_name, aapt_cmd, cache=None, fresh_icons=None, sources=None, make_item=index_item):
+    """
+    Reads a single APK and turns it into an index entry with
+    make_item(apk_name, ApkInfo, sources), which may return None to leave the
+    APK out. Returns a (pkg, item) tuple, or None if the APK could not be processed.
+    Raises SignatureError if the APK isn't signed by the repo key.
+    """
+    print(f"Processing {apk_name}...")
+    try:
+        apk = read_apk(Path(apk_dir, apk_name), Path(icon_dir), aapt_cmd, cache, fresh_icons)
+        return make_item(apk_name, apk, sources)
+    except SignatureError:
+        raise
+    except Exception as e:
+        print(f"Skipping {apk_name} due to error: {e}")
+        return None
+
+def inspect_repo(base_dir="repo", workers=None, cache_dir=DEFAULT_CACHE_DIR, optimize_icons_mode="none",
+                 sources=None, make_item=index_item):
+    """
+    Inspects every APK in base_dir/apk, extracting icons into base_dir/icon.
+    sources and make_item are passed on to inspect_apk().
+    Returns the index entries sorted by name.
+    """
+    repo_data = {}
+
+    apk_dir = Path(base_dir, "apk")
+    icon_dir = Path(base_dir, "icon")
+    apk_dir.mkdir(parents=True, exist_ok=True)
+    icon_dir.mkdir(parents=True, exist_ok=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    aapt_cmd = find_aapt()
+    # Cached icons are stored post-optimization, so the mode is part of the cache key
+    cache = ApkCache(cache_dir, f"{tool_version(aapt_cmd)}/icons-{optimize_icons_mode}") if cache_dir else None
+    fresh_icons = []
+
+    print(f"Scanning {apk_dir} with {workers} worker(s)...")
+
+    # Sort the listing so the result doesn't depend on directory order or worker count
+    apk_names = sorted(x.name for x in apk_dir.iterdir() if x.name.endswith(".apk"))
+    if cache is not None:
+        # Hash the new and touched APKs in one batch rather than one per lookup
+        cache.prefetch([apk_dir / x for x in apk_names], workers)
+
+    # aapt and hashing spend their time outside the GIL, so threads are enough here.
+    # map() yields results in submission order, which keeps the merge below deterministic.
+    with span("inspect apks"), ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda apk_name: inspect_apk(apk_dir, icon_dir, apk_name, aapt_cmd, cache, fresh_icons, sources, make_item),
+            apk_names,
+        )
+        try:
+            for result in results:
+                if result is None:
+                    count("apks skipped")
+                    continue
+                count("apks inspected")
+                pkg, item = result
+                repo_data[pkg] = item
+        except SignatureError:
+            # A wrongly signed APK fails the whole run, so don't inspect the rest
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    if optimize_icons_mode != "none":
+        webp = optimize_icons_mode == "webp"
+        targets = set(fresh_icons)
+        if webp:
+            targets.update(x for x in icon_dir.glob("*.png") if not x.with_suffix(".webp").exists())
+        with span("optimize icons"):
+            before, after = optimize_icons(sorted(targets), webp, workers)
+        print(f"Optimized {len(targets)} icon(s): {before} -> {after} bytes")
+
+    if cache is not None:
+        with span("save cache"):
+            cache.save()
+        print(cache.summary())
+
+    return sorted(repo_data.values(), key=lambda x: x["name"])
+
+# Stage 3: merge
+
+@dataclass
+class MergeResult:
+    index: list
+    added: list
+    updated: list
+    removed: list
+    generation: int
+
+def module_of(pkg: str) -> str:
+    # eu.kanade.tachiyomi.extension.en.comix -> en.comix
+    return ".".join(pkg.rsplit(".", 2)[-2:])
+
+def same_file(src: Path, dst: Path) -> bool:
+    if not dst.exists() or src.stat().st_size != dst.stat().st_size:
+        return False
+    return file_digest(src) == file_digest(dst)
+
+def sync_dir(src: Path, dst: Path, full: bool = False, move: bool = False) -> tuple[int, int]:
+    """
+    Copies (or with move, renames) the files of src into dst, skipping those
+    already identical. Returns (copied, skipped).
+    """
+    copied = skipped = 0
+    if not src.exists():
+        return copied, skipped
+    for file in src.iterdir():
+        target = dst.joinpath(file.name)
+        if not full and same_file(file, target):
+            skipped += 1
+            continue
+        place_file(file, target, move)
+        copied += 1
+    count("files copied", copied)
+    count("files skipped", skipped)
+    return copied, skipped
+
+def normalize(item) -> Entry:
+    # ADD SIG IF MISSING (Universal Fingerprint for this repo)
+    return item if isinstance(item, Entry) else Entry.from_dict(item, REPO_FINGERPRINT)
+
+def list_local_files(local_repo: Path) -> set[str]:
+    return {
+        file.name
+        for folder in ("apk", "icon") if local_repo.joinpath(folder).exists()
+        for file in local_repo.joinpath(folder).iterdir()
+    }
+
+def merge(remote_repo: Path, local_repo: Path, local_index, to_delete: set[str],
+          full: bool = False, move: bool = False, local_files: set[str] = None) -> MergeResult:
+    """
+    Removes the deleted modules from remote_repo, brings over the APKs and
+    icons of local_repo and merges local_index, any iterable of entries or
+    dicts, into the published index.
+    local_files overrides the listing of local_repo, for when a previous,
+    interrupted run already moved some of them.
+    """
+    # Ensure apk and icon directories exist in remote repo
+    remote_repo.joinpath("apk").mkdir(exist_ok=True)
+    remote_repo.joinpath("icon").mkdir(exist_ok=True)
+
+    # Files about to be replaced by the local repo are compared instead of deleted
+    if local_files is None:
+        local_files = list_local_files(local_repo)
+
+    for module in to_delete:
+        apk_name = f"tachiyomi-{module}-v*.*.*.apk"
+        icon_name = f"eu.kanade.tachiyomi.extension.{module}.png"
+        for file in remote_repo.joinpath("apk").glob(apk_name):
+            if file.name in local_files and not full:
+                continue
+            print(f"Deleting {file.name}")
+            file.unlink(missing_ok=True)
+        for file in remote_repo.joinpath("icon").glob(icon_name):
+            if file.name in local_files and not full:
+                continue
+            print(f"Deleting {file.name}")
+            file.unlink(missing_ok=True)
+
+    with span("sync apk"):
+        apk_copied, apk_skipped = sync_dir(local_repo.joinpath("apk"), remote_repo.joinpath("apk"), full, move)
+    with span("sync icon"):
+        icon_copied, icon_skipped = sync_dir(local_repo.joinpath("icon"), remote_repo.joinpath("icon"), full, move)
+    print(f"APKs: {apk_copied} copied, {apk_skipped} unchanged")
+    print(f"Icons: {icon_copied} copied, {icon_skipped} unchanged")
+
+    # Copy .nojekyll
+    nojekyll_src = local_repo.joinpath(".nojekyll")
+    if nojekyll_src.exists():
+        shutil.copy(nojekyll_src, remote_repo.joinpath(".nojekyll"))
+
+    # The published index is streamed in and each entry is held once: in
+    # merged, or in dropped if it belongs to a deleted module or is the
+    # "Example Extension"
+    merged = {}
+    dropped = {}
+    # Handle missing index.json (first run case)
+    index_file_path = remote_repo.joinpath("index.json")
+    if index_file_path.exists():
+        with span("read index"):
+            for entry in load_entries(index_file_path, REPO_FINGERPRINT):
+                if module_of(entry.pkg) not in to_delete and "example" not in entry.pkg:
+                    merged[entry.pkg] = entry
+                else:
+                    dropped[entry.pkg] = entry
+
+    # pkg -> published entry it replaces (None if new), compared once everything is merged
+    replaced = {}
+    for item in local_index:
+        entry = normalize(item)
+        if entry.pkg not in replaced:
+            replaced[entry.pkg] = merged.get(entry.pkg) or dropped.pop(entry.pkg, None)
+        merged[entry.pkg] = entry
+
+    added = sorted(pkg for pkg, old in replaced.items() if old is None)
+    updated = sorted(pkg for pkg, old in replaced.items() if old is not None and old != merged[pkg])
+    removed = sorted(dropped)
+    count("index entries", len(merged))
+
+    index = sorted(merged.values(), key=lambda x: x.pkg)
+
+    for label, pkgs in (("Added", added), ("Updated", updated), ("Removed", removed)):
+        print(f"{label} ({len(pkgs)}):")
+        for pkg in pkgs:
+            version = (merged.get(pkg) or dropped[pkg]).get("version", "")
+            print(f"  {pkg} {version}")
+
+    # Each published change to the index gets a new generation and a delta
+    generation = read_generation(remote_repo)
+    if added or updated or removed:
+        generation += 1
+
+    return MergeResult(index, added, updated, removed, generation)
+
+# Stage 4: write
+
+def write(remote_repo: Path, result: MergeResult, compress=(), shards: bool = False, full: bool = False,
+          max_deltas: int = DEFAULT_MAX_DELTAS, search: bool = False) -> list[str]:
+    """
+    Writes the merged index, its delta and optionally its shards and search index.
+    Returns the names of the files that were written.
+    """
+    written = []
+    # The delta goes first: if this is interrupted, a rerun sees the old
+    # generation in repo.json and rewrites the same delta
+    if result.added or result.updated or result.removed:
+        changed = set(result.added) | set(result.updated)
+        by_pkg = {entry.pkg: entry.to_dict() for entry in result.index if entry.pkg in changed}
+        with span("write delta"):
+            written += write_delta(
+                remote_repo, result.generation, by_pkg, result.added, result.updated, result.removed, max_deltas,
+            )
+    with span("write index"):
+        written += write_index(
+            remote_repo,
+            (entry.to_dict() for entry in result.index),
+            repo_info(result.generation),
+            write_html=True,
+            compress=compress,
+            only_if_changed=not full,
+        )
+    if shards:
+        with span("write shards"):
+            written += write_shards(
+                remote_repo, (entry.to_dict() for entry in result.index), compress=compress, only_if_changed=not full,
+            )
+    if search:
+        with span("write search index"):
+            # Tied to the index it was built from, which is on disk by now
+            index_sha256 = file_digest(remote_repo / "index.min.json")[1]
+            written += write_search_index(
+                remote_repo, (entry.to_dict() for entry in result.index), index_sha256,
+                compress=compress, only_if_changed=not full,
+            )
+
+    print(f"Rewrote: {', '.join(written) if written else 'nothing, index unchanged'}")
+    return written
+
+# Stage 5: gc
+
+def collect_garbage(remote_repo: Path, index, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Deletes (or with dry_run, lists) every file in apk/ and icon/ that no
+    entry of the merged index references. Returns (files, bytes) reclaimed.
+    """
+    referenced = set()
+    for entry in index:
+        if entry.apk:
+            referenced.add(entry.apk)
+        if entry.icon and not entry.icon.startswith("http"):
+            icon_name = entry.icon.split("/")[-1]
+            # Optimized icons may come with a WebP variant
+            referenced.update((icon_name, Path(icon_name).with_suffix(".webp").name))
+
+    if not referenced:
+        print("Not collecting garbage: the merged index references no files")
+        return 0, 0
+
+    files = reclaimed = 0
+    for folder in ("apk", "icon"):
+        directory = remote_repo.joinpath(folder)
+        if not directory.exists():
+            continue
+        for file in sorted(directory.iterdir()):
+            if file.name in referenced or file.name.startswith("."):
+                continue
+            size = file.stat().st_size
+            print(f"{'Would delete' if dry_run else 'Deleting'} orphan {folder}/{file.name} ({size} bytes)")
+            if not dry_run:
+                file.unlink()
+            files += 1
+            reclaimed += size
+    count("orphans collected", files)
+    count("bytes reclaimed", reclaimed)
+    print(f"{'Would reclaim' if dry_run else 'Reclaimed'} {reclaimed} bytes in {files} orphan file(s)")
+    return files, reclaimed
+
+# Pipeline
+
+class State:
+    """
+    Progress of a pipeline run, saved after every stage.
+    """
+
+    def __init__(self, path: Path, resume: bool):
+        self.path = path
+        self.data = {"completed": []}
+        if resume and path.exists():
+            with path.open(encoding="utf-8") as f:
+                self.data = json.load(f)
+            print(f"Resuming after: {', '.join(self.data['completed']) or 'nothing'}")
+
+    def done(self, stage: str) -> bool:
+        return stage in self.data["completed"]
+
+    def save(self, stage: str = None, **values):
+        self.data.update(values)
+        if stage:
+            self.data["completed"].append(stage)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+def run(args):
+    local_repo = Path(args.local)
+    stages = args.stages
+    state = State(Path(args.state), args.resume)
+
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        if state.done(stage):
+            print(f"== {stage} (already done)")
+            continue
+        print(f"== {stage}")
+
+        if stage == "collect":
+            with span("collect"):
+                collected = collect(args.artifacts, local_repo / "apk")
+            print(f"Collected {collected} APK(s)")
+            state.save(stage)
+
+        elif stage == "inspect":
+            cache_dir = None if args.no_cache else args.cache_dir
+            sources = None
+            if args.static_sources:
+                with span("read sources"):
+                    sources = extension_sources(".", cache_dir, args.workers)
+            with span("inspect"):
+                entries = inspect_repo(local_repo, args.workers, cache_dir, args.optimize_icons, sources)
+            state.save(stage, entries=entries)
+
+        elif stage == "merge":
+            # Remember what the local repo held before anything is moved out of it
+            if "local_files" not in state.data:
+                state.save(local_files=sorted(list_local_files(local_repo)))
+            if "entries" in state.data:
+                entries = state.data["entries"]
+            else:
+                entries = iter_json_array(local_repo.joinpath("index.min.json"))
+            with span("merge"):
+                result = merge(
+                    args.remote, local_repo, entries, set(json.loads(args.delete)),
+                    full=args.full, move=not args.copy, local_files=set(state.data["local_files"]),
+                )
+            state.save(stage, merge={**vars(result), "index": [entry.to_dict() for entry in result.index]})
+
+        elif stage == "write":
+            if "merge" not in state.data:
+                raise SystemExit("The write stage needs the merge stage to have run")
+            with span("write"):
+                data = state.data["merge"]
+                write(
+                    args.remote, MergeResult(**{**data, "index": [normalize(x) for x in data["index"]]}),
+                    compress=args.compress, shards=args.shards, full=args.full, max_deltas=args.max_deltas,
+                    search=args.search,
+                )
+            state.save(stage)
+
+        elif stage == "gc":
+            if args.gc or args.gc_dry_run:
+                if "merge" not in state.data:
+                    raise SystemExit("The gc stage needs the merge stage to have run")
+                with span("gc"):
+                    collect_garbage(
+                        args.remote, [normalize(x) for x in state.data["merge"]["index"]], dry_run=not args.gc,
+                    )
+            else:
+                print("Skipped, enable with --gc or --gc-dry-run")
+            state.save(stage)
+
+    # Partial runs keep their state so the remaining stages can follow with --resume
+    if state.done(STAGES[-1]):
+        state.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect, inspect, merge and publish the extension repo")
+    parser.add_argument("--remote", type=Path, required=True, help="checkout of the published repo")
+    parser.add_argument("--local", default="repo", help="local repo to collect into and inspect (default: repo)")
+    parser.add_argument(
+        "--artifacts",
+        type=Path,
+        default=DEFAULT_ARTIFACTS_DIR,
+        help=f"where the built APKs were downloaded (default: {DEFAULT_ARTIFACTS_DIR})",
+    )
+    parser.add_argument("--delete", default="[]", help="JSON list of modules (lang.extension) to remove")
+    parser.add_argument(
+        "--stages",
+        type=lambda x: x.split(","),
+        default=list(STAGES),
+        help=f"comma separated stages to run (default: {','.join(STAGES)})",
+    )
+    parser.add_argument("--resume", action="store_true", help="skip the stages a failed run already finished")
+    parser.add_argument(
+        "--state",
+        default=os.path.join(DEFAULT_CACHE_DIR, "publish-state.json"),
+        help="where progress is saved for --resume",
+    )
+    parser.add_argument("--copy", action="store_true", help="copy APKs and icons into the remote repo instead of moving them")
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=int(os.environ["REPO_WORKERS"]) if os.environ.get("REPO_WORKERS") else None,
+        help="number of APKs to inspect concurrently (default: CPU count)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"APK metadata cache location (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="inspect every APK from scratch")
+    parser.add_argument(
+        "--optimize-icons",
+        choices=ICON_OPTIMIZATION_MODES,
+        default=os.environ.get("REPO_OPTIMIZE_ICONS", "none"),
+        help="losslessly recompress newly extracted icons, optionally adding WebP variants",
+    )
+    parser.add_argument(
+        "--static-sources",
+        action="store_true",
+        default=bool(os.environ.get("REPO_STATIC_SOURCES")),
+        help="take unregistered extensions' sources from their code (see extension_metadata.py --diff)",
+    )
+    parser.add_argument("--full", action="store_true", help="copy and rewrite everything, even if unchanged")
+    parser.add_argument(
+        "--compress",
+        action="append",
+        choices=COMPRESSIONS,
+        default=[],
+        help="also write precompressed copies of the indexes (repeatable)",
+    )
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="also write per-language/nsfw index shards and a shards.json manifest",
+    )
+    parser.add_argument("--search", action="store_true", help="also write a search.json token and trigram index")
+    parser.add_argument(
+        "--max-deltas",
+        type=max_deltas_arg,
+        default=DEFAULT_MAX_DELTAS,
+        help=f"delta files to keep in the chain, at least 1 (default: {DEFAULT_MAX_DELTAS})",
+    )
+    parser.add_argument("--gc", action="store_true", help="delete APKs and icons the merged index doesn't reference")
+    parser.add_argument("--gc-dry-run", action="store_true", help="only list what --gc would delete")
+    args = parser.parse_args()
+    if unknown := set(args.stages) - set(STAGES):
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        run(args)
+    except SignatureError as e:
+        # Earlier stages stay saved, so a rerun with --resume picks up from inspect
+        raise SystemExit(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
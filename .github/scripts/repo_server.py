@@ -0,0 +1,250 @@
+"""
+Serves a published repo directory over HTTP, the way a static host would.
+
+Responses carry an ETag (from size and mtime) and answer If-None-Match with
+304, single byte ranges are honoured with 206, and a request that accepts
+gzip or brotli gets the precompressed .gz/.br sibling written by
+index_writer when there is one. Meant for trying out layout and compression
+changes locally, e.g. with load_test.py, not for production.
+
+    python .github/scripts/repo_server.py repo --port 8000
+"""
+import argparse
+import email.utils
+import mimetypes
+import os
+import posixpath
+import sys
+import urllib.parse
+from functools import partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Preferred first when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CONTENT_TYPES = {
+    ".apk": "application/vnd.android.package-archive",
+    ".json": "application/json",
+    ".webp": "image/webp",
+}
+
+def parse_accept_encoding(header):
+    """
+    Returns the content codings the client accepts, without the ones it
+    refuses with q=0.
+    """
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+def parse_range(header, size):
+    """
+    Parses a single "bytes=" range against a file of the given size.
+    Returns (start, end) inclusive, None when the header should be ignored
+    (absent, malformed or several ranges), or "unsatisfiable".
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        # Multipart responses aren't worth it here; the whole file is a valid answer
+        return None
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if end < start:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                return "unsatisfiable"
+            start, end = max(size - length, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+def make_etag(stat, suffix=""):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return etag in (x.strip().removeprefix("W/") for x in header.split(","))
+
+class RepoRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "RepoServer"
+    # Headers and body go out in separate writes, which Nagle would hold back
+    disable_nagle_algorithm = True
+
+    def __init__(self, *args, directory, quiet=False, **kwargs):
+        self.directory = directory
+        self.quiet = quiet
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def resolve(self):
+        """
+        Maps the request path to a file under the served directory, or None.
+        """
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        path = posixpath.normpath(path).lstrip("/")
+        if path.startswith("..") or "\0" in path:
+            return None
+        file = self.directory / path if path not in ("", ".") else self.directory
+        if file.is_dir():
+            file = file / "index.html"
+        return file if file.is_file() else None
+
+    def choose_variant(self, file):
+        """
+        Picks the precompressed sibling the client accepts, if there is one.
+        Returns (path, content coding or None).
+        """
+        accepted = parse_accept_encoding(self.headers.get("Accept-Encoding"))
+        for coding, suffix in ENCODINGS:
+            if coding in accepted:
+                variant = file.with_name(file.name + suffix)
+                if variant.is_file():
+                    return variant, coding
+        return file, None
+
+    def do_HEAD(self):
+        self.send_file(head=True)
+
+    def do_GET(self):
+        self.send_file(head=False)
+
+    def send_error_status(self, status, head):
+        body = f"{status.value} {status.phrase}\n".encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_file(self, head):
+        file = self.resolve()
+        if file is None:
+            self.send_error_status(HTTPStatus.NOT_FOUND, head)
+            return
+
+        variant, coding = self.choose_variant(file)
+        try:
+            f = variant.open("rb")
+        except OSError:
+            self.send_error_status(HTTPStatus.NOT_FOUND, head)
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            # Each representation needs its own validator
+            etag = make_etag(stat, f"-{coding}" if coding else "")
+            has_variants = any(file.with_name(file.name + x).is_file() for _, x in ENCODINGS)
+
+            def common_headers():
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+                self.send_header("Accept-Ranges", "bytes")
+                if has_variants:
+                    self.send_header("Vary", "Accept-Encoding")
+
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                common_headers()
+                self.end_headers()
+                return
+
+            byte_range = parse_range(self.headers.get("Range"), size)
+            if_range = self.headers.get("If-Range")
+            if byte_range is not None and if_range and if_range.strip() != etag:
+                # The client's partial copy is stale, so it gets the whole file
+                byte_range = None
+            if byte_range == "unsatisfiable":
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_response(HTTPStatus.OK)
+            length = end - start + 1
+            content_type = CONTENT_TYPES.get(file.suffix) or mimetypes.guess_type(file.name)[0]
+            self.send_header("Content-Type", content_type or "application/octet-stream")
+            if coding:
+                self.send_header("Content-Encoding", coding)
+            self.send_header("Content-Length", str(length))
+            common_headers()
+            self.end_headers()
+            if head or length <= 0:
+                return
+            # wfile is unbuffered, so the body can go straight from the file to the socket
+            self.connection.sendfile(f, start, length)
+
+def serve(directory, host="127.0.0.1", port=8000, quiet=False):
+    """
+    Creates (but doesn't start) a threaded server for directory.
+    """
+    handler = partial(RepoRequestHandler, directory=Path(directory).resolve(), quiet=quiet)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a published repo directory locally")
+    parser.add_argument("directory", nargs="?", default=".", help="repo directory to serve (default: current directory)")
+    parser.add_argument("--bind", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on, 0 picks a free one (default: 8000)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't log requests")
+    args = parser.parse_args()
+
+    server = serve(args.directory, args.bind, args.port, args.quiet)
+    host, port = server.server_address[:2]
+    # load_test.py --serve reads the port from this line
+    print(f"Serving {args.directory} on http://{host}:{port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped", file=sys.stderr)
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Precomputed search index over the repo index.
+
+Extension names, the last part of their package names and source names are
+split into normalized tokens (case and accents folded). The index keeps the
+sorted token list, the entries each token occurs in and, for typos, the
+tokens each trigram occurs in. Entries are referred to by their position in
+index.min.json, so a client looks results up there instead of scanning every
+entry. Posting lists are stored as gaps between ascending IDs.
+
+The index records the sha256 of the index.min.json it was built from; a
+client should ignore a search.json whose hash doesn't match the index it has.
+"""
+import json
+import re
+import unicodedata
+from bisect import bisect_left
+from itertools import accumulate
+
+# Bump whenever the layout below changes, so clients can fall back to scanning
+FORMAT_VERSION = 1
+
+SEARCH_INDEX = "search.json"
+LABEL_PREFIX = "Tachiyomi: "
+# Marks the start of a token, so prefixes get their own trigrams
+PAD = " "
+
+NON_WORD_REGEX = re.compile(r"[\W_]+")
+
+class SearchIndexError(ValueError):
+    pass
+
+def tokenize(text):
+    """
+    Splits text into lowercase tokens without accents or punctuation.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(x for x in text if not unicodedata.combining(x))
+    return NON_WORD_REGEX.sub(" ", text.casefold()).split()
+
+def trigrams(token):
+    padded = PAD + token
+    if len(padded) < 3:
+        return {padded}
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _gaps(ids):
+    return [b - a for a, b in zip([0, *ids], ids)]
+
+def _entry_tokens(entry):
+    texts = [entry["name"].removeprefix(LABEL_PREFIX), entry["pkg"].rsplit(".", 1)[-1]]
+    texts += [x["name"] for x in entry.get("sources", ())]
+    return {token for text in texts for token in tokenize(text)}
+
+def build(entries, index_sha256):
+    """
+    Builds the search index of entries, given in index.min.json order.
+    """
+    postings = {}
+    langs = {}
+    count = 0
+    for entry_id, entry in enumerate(entries):
+        for token in _entry_tokens(entry):
+            postings.setdefault(token, []).append(entry_id)
+        langs.setdefault(entry["lang"], []).append(entry_id)
+        count += 1
+
+    tokens = sorted(postings)
+    grams = {}
+    for token_id, token in enumerate(tokens):
+        for gram in trigrams(token):
+            grams.setdefault(gram, []).append(token_id)
+    return {
+        "version": FORMAT_VERSION,
+        "index": index_sha256,
+        "count": count,
+        "tokens": tokens,
+        "postings": [_gaps(postings[x]) for x in tokens],
+        "trigrams": {gram: _gaps(ids) for gram, ids in sorted(grams.items())},
+        "langs": {lang: _gaps(ids) for lang, ids in sorted(langs.items())},
+    }
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, or limit + 1 if it exceeds limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+class SearchIndex:
+    """
+    Lookups on a loaded search.json. Results are sorted entry IDs.
+    """
+
+    def __init__(self, data, index_sha256=None):
+        if data.get("version") != FORMAT_VERSION:
+            raise SearchIndexError(f"search index version {data.get('version')}, expected {FORMAT_VERSION}")
+        if index_sha256 is not None and data["index"] != index_sha256:
+            raise SearchIndexError("search index was built from a different index")
+        self.count = data["count"]
+        self.tokens = data["tokens"]
+        self._postings = data["postings"]
+        self._trigrams = data["trigrams"]
+        self._langs = data["langs"]
+
+    @classmethod
+    def load(cls, path, index_sha256=None):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), index_sha256)
+
+    def _entries(self, token_ids):
+        ids = set()
+        for token_id in token_ids:
+            ids.update(accumulate(self._postings[token_id]))
+        return ids
+
+    def prefix_tokens(self, prefix):
+        """
+        IDs of the tokens starting with prefix, found by bisecting the sorted tokens.
+        """
+        start = bisect_left(self.tokens, prefix)
+        end = start
+        while end < len(self.tokens) and self.tokens[end].startswith(prefix):
+            end += 1
+        return range(start, end)
+
+    def fuzzy_tokens(self, token, max_distance=1):
+        """
+        IDs of the tokens within max_distance edits of token. Candidates come
+        from the trigrams they share with it; a token that many edits away
+        shares at least len(token) - 3 * max_distance of them.
+        """
+        shared = {}
+        query_grams = trigrams(token)
+        for gram in query_grams:
+            for token_id in accumulate(self._trigrams.get(gram, ())):
+                shared[token_id] = shared.get(token_id, 0) + 1
+        threshold = max(1, len(query_grams) - 3 * max_distance)
+        return [
+            token_id
+            for token_id, hits in shared.items()
+            if hits >= threshold and edit_distance(token, self.tokens[token_id], max_distance) <= max_distance
+        ]
+
+    def search(self, query, lang=None, fuzzy=True, max_distance=1):
+        """
+        Entries matching every word of query as a token prefix, or, for words
+        that match no prefix and with fuzzy set, as a token within
+        max_distance edits. lang restricts the results to one language.
+        """
+        result = None
+        for word in tokenize(query):
+            ids = self._entries(self.prefix_tokens(word))
+            if not ids and fuzzy:
+                ids = self._entries(self.fuzzy_tokens(word, max_distance))
+            result = ids if result is None else result & ids
+            if not result:
+                return []
+        if lang is not None:
+            in_lang = set(accumulate(self._langs.get(lang, ())))
+            result = in_lang if result is None else result & in_lang
+        return sorted(result or ())
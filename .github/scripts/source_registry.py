@@ -0,0 +1,101 @@
+"""
+Source metadata that can't be read from the APK itself.
+
+sources.json maps a package name to its source's name and, where the source
+pins one, its fixed ID and base URL. It is read once on import.
+"""
+import hashlib
+import json
+import struct
+from functools import lru_cache
+from pathlib import Path
+
+REGISTRY_PATH = Path(__file__).with_name("sources.json")
+
+@lru_cache(maxsize=None)
+def java_hash_code(s):
+    """
+    Java's String.hashCode() as a signed 32-bit integer.
+    """
+    units = s.encode("utf-16-le")
+    h = 0
+    for unit in struct.unpack(f"<{len(units) // 2}H", units):
+        h = 31 * h + unit
+    # Wrap once at the end, then convert to signed 32-bit integer
+    h &= 0xFFFFFFFF
+    if h > 0x7FFFFFFF:
+        h -= 0x100000000
+    return h
+
+def get_source_id(name, lang):
+    """
+    Calculates the Source ID using Tachiyomi's hashCode logic.
+    Formula: (name.hashCode() & 0x7fffffff) + (if (lang == "all") 0 else lang.hashCode())
+    """
+    name_hash = java_hash_code(name) & 0x7fffffff
+    if lang == "all":
+        return str(name_hash)
+
+    lang_hash = java_hash_code(lang)
+    return str(name_hash + lang_hash)
+
+def get_http_source_id(name, lang, version_id=1):
+    """
+    The ID HttpSource generates for sources that don't override it: the first
+    8 bytes of MD5("name/lang/versionId"), with the name lowercased, as a
+    non-negative Long.
+    """
+    key = f"{name.lower()}/{lang}/{version_id}"
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return str(int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF)
+
+def load_registry(path=REGISTRY_PATH):
+    with open(path, encoding="utf-8") as f:
+        by_pkg = json.load(f)
+    by_name = {entry["name"]: entry for entry in by_pkg.values()}
+    return by_pkg, by_name
+
+REGISTRY_BY_PKG, REGISTRY_BY_NAME = load_registry()
+
+def registry_entry(pkg, name):
+    """
+    The registry entry of a package, matched by pkg, then by exact source name.
+    """
+    return REGISTRY_BY_PKG.get(pkg) or REGISTRY_BY_NAME.get(name)
+
+def get_source_ids(sources):
+    """
+    Resolves the (pkg, name, lang) of several sources in one pass, returning
+    their (id, baseUrl) in the same order. Registered packages are matched by
+    pkg, then by exact source name; anything else gets a computed ID and no
+    base URL. hashCodes are memoized, so each language is hashed once.
+    """
+    results = []
+    for pkg, name, lang in sources:
+        entry = registry_entry(pkg, name)
+        if entry is None:
+            results.append((get_source_id(name, lang), ""))
+        else:
+            results.append((entry.get("id") or get_source_id(name, lang), entry.get("baseUrl", "")))
+    return results
+
+def pin_sources(sources):
+    """
+    Takes pkg -> sources read from the code, and replaces those of each
+    registered package with the single source the registry publishes for it,
+    in the extension's language, so IDs already in users' libraries don't
+    change. Other packages are returned as is.
+    """
+    pins = []
+    for pkg, pkg_sources in sources.items():
+        entry = REGISTRY_BY_PKG.get(pkg) or next(
+            (REGISTRY_BY_NAME[x["name"]] for x in pkg_sources if x["name"] in REGISTRY_BY_NAME), None,
+        )
+        if entry is not None:
+            # eu.kanade.tachiyomi.extension.all.mangafire -> all
+            pins.append((pkg, entry["name"], pkg.rsplit(".", 2)[-2]))
+
+    pinned = dict(sources)
+    for (pkg, name, lang), (source_id, base_url) in zip(pins, get_source_ids(pins)):
+        pinned[pkg] = [{"name": name, "lang": lang, "id": source_id, "baseUrl": base_url}]
+    return pinned
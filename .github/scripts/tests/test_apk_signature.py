@@ -0,0 +1,111 @@
+import hashlib
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from apk_signature import (
+    SignatureError, SignerMismatchError, check_signer, signer_certificate, signer_fingerprint, signer_fingerprints,
+)
+from bench_fixtures import FIXTURE_CERTIFICATE, sign_apk
+
+# SHA-256 of bench_fixtures.FIXTURE_CERTIFICATE
+FIXTURE_FINGERPRINT = "253c07e7c506c1883e35f674ec2810d0ab5c822e2274eb0da665829a4361b2df"
+SIGNATURE_SCHEME_V3_ID = 0xF05368C0
+
+def der(tag, *children):
+    content = b"".join(children)
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    size = (len(content).bit_length() + 7) // 8
+    return bytes([tag, 0x80 | size]) + len(content).to_bytes(size, "big") + content
+
+def name(common_name):
+    # Name ::= SEQUENCE OF SET OF { commonName OID, UTF8String }
+    return der(0x30, der(0x31, der(0x30, der(0x06, b"\x55\x04\x03"), der(0x0C, common_name.encode()))))
+
+def certificate(serial, issuer):
+    tbs = der(
+        0x30, der(0xA0, der(0x02, b"\x02")), der(0x02, bytes([serial])), der(0x30, der(0x05)),
+        name(issuer), der(0x30), name("Subject"), der(0x30),
+    )
+    return der(0x30, tbs, der(0x30, der(0x05)), der(0x03, b"\x00signature"))
+
+def pkcs7(certificates, signer_serial, signer_issuer):
+    signer_info = der(
+        0x30, der(0x02, b"\x01"), der(0x30, name(signer_issuer), der(0x02, bytes([signer_serial]))),
+        der(0x30, der(0x05)), der(0x30, der(0x05)), der(0x04, b"signature"),
+    )
+    signed_data = der(
+        0x30, der(0x02, b"\x01"), der(0x31), der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01")),
+        der(0xA0, *certificates), der(0x31, signer_info),
+    )
+    return der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02"), der(0xA0, signed_data))
+
+class SignerTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.apk = Path(tmp.name) / "extension.apk"
+        with zipfile.ZipFile(self.apk, "w") as z:
+            z.writestr("AndroidManifest.xml", b"manifest")
+            z.writestr("classes.dex", b"dex")
+
+    def test_v2_block(self):
+        sign_apk(self.apk)
+        self.assertEqual(signer_certificate(self.apk), ("v2", FIXTURE_CERTIFICATE))
+        self.assertEqual(signer_fingerprint(self.apk), FIXTURE_FINGERPRINT)
+
+    def test_v3_block(self):
+        sign_apk(self.apk, scheme_id=SIGNATURE_SCHEME_V3_ID)
+        self.assertEqual(signer_certificate(self.apk), ("v3", FIXTURE_CERTIFICATE))
+        self.assertEqual(signer_fingerprint(self.apk), FIXTURE_FINGERPRINT)
+        # The APK still reads as a ZIP with the block in front of the central directory
+        with zipfile.ZipFile(self.apk) as z:
+            self.assertIn("AndroidManifest.xml", z.namelist())
+
+    def test_v1_signature_file(self):
+        first, second = certificate(1, "Other CA"), certificate(2, "Repo CA")
+        with zipfile.ZipFile(self.apk, "a") as z:
+            z.writestr("META-INF/CERT.RSA", pkcs7([first, second], 2, "Repo CA"))
+        # The signer is matched by issuer and serial number, not taken as the first certificate
+        self.assertEqual(signer_certificate(self.apk), ("v1", second))
+        self.assertEqual(signer_fingerprint(self.apk), hashlib.sha256(second).hexdigest())
+
+    def test_unsigned(self):
+        with self.assertRaisesRegex(SignatureError, "not signed"):
+            signer_fingerprint(self.apk)
+        result = signer_fingerprints([self.apk], workers=1)[self.apk]
+        self.assertIsInstance(result, SignatureError)
+
+    def test_malformed(self):
+        sign_apk(self.apk)
+        data = bytearray(self.apk.read_bytes())
+        # Break the block's leading size so it no longer matches the trailing one
+        cd_offset = data.index(b"APK Sig Block 42") + 16
+        size = int.from_bytes(data[cd_offset - 24:cd_offset - 16], "little")
+        block_start = cd_offset - size - 8
+        data[block_start:block_start + 8] = (size + 1).to_bytes(8, "little")
+        self.apk.write_bytes(data)
+        with self.assertRaises(SignatureError):
+            signer_fingerprint(self.apk)
+
+        self.apk.write_bytes(b"not an apk")
+        with self.assertRaises(SignatureError):
+            signer_fingerprint(self.apk)
+
+        with zipfile.ZipFile(self.apk, "w") as z:
+            z.writestr("META-INF/CERT.RSA", b"\x30\x03\x06\x01\x00")
+        with self.assertRaises(SignatureError):
+            signer_fingerprint(self.apk)
+
+    def test_check_signer(self):
+        check_signer("extension.apk", FIXTURE_FINGERPRINT, FIXTURE_FINGERPRINT)
+        with self.assertRaises(SignerMismatchError):
+            check_signer("extension.apk", "0" * 64, FIXTURE_FINGERPRINT)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import sys
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from badging import parse_badging, read_native_badging
+from bench_fixtures import DENSITIES, binary_manifest, make_apk, resource_table
+
+ICON_LINES = """\
+application-icon-160:'res/mipmap-mdpi-v4/ic_launcher.png'
+application-icon-240:'res/mipmap-hdpi-v4/ic_launcher.png'
+application-icon-320:'res/mipmap-xhdpi-v4/ic_launcher.png'
+application-icon-480:'res/mipmap-xxhdpi-v4/ic_launcher.png'
+application-icon-640:'res/mipmap-xxxhdpi-v4/ic_launcher.png'
+"""
+
+# `aapt dump --include-meta-data badging` output for the APKs built below,
+# following aapt's formatting: int-typed values (booleans included) as signed
+# decimals, versionCode='' unless it is positive, only \ " and newlines escaped
+CASES = {
+    "literal label": (
+        dict(label="Tachiyomi: Comix", version_code=1, nsfw=0),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='1' versionName='1.4.1' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='0'\n",
+    ),
+    "label from resources, utf-8 pool": (
+        dict(label="Tachiyomi: Comix", version_code=3, nsfw=1, label_from_resources=True, utf8=True),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='3' versionName='1.4.3' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='1'\n",
+    ),
+    "label with quotes and non-ascii": (
+        dict(label='Tachiyomi: Reaper\'s "Scans" \\ 漫画', version_code=2, nsfw=1, label_from_resources=True),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='2' versionName='1.4.2' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Reaper's \\\"Scans\\\" \\\\ 漫画'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Reaper's \\\"Scans\\\" \\\\ 漫画' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='1'\n",
+    ),
+    "boolean nsfw": (
+        dict(label="Tachiyomi: Comix", version_code=1, nsfw=0xFFFFFFFF, nsfw_type=0x12),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='1' versionName='1.4.1' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='-1'\n",
+    ),
+    "no nsfw meta-data": (
+        dict(label="Tachiyomi: Comix", version_code=1, nsfw=None),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='1' versionName='1.4.1' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n",
+    ),
+    "hex versionCode": (
+        dict(label="Tachiyomi: Comix", version_code=0x2A, version_code_type=0x11, nsfw=0),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='42' versionName='1.4.42' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='0'\n",
+    ),
+    "zero versionCode": (
+        dict(label="Tachiyomi: Comix", version_code=0, nsfw=0),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='' versionName='1.4.0' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='0'\n",
+    ),
+    "negative versionCode": (
+        dict(label="Tachiyomi: Comix", version_code=0x80000001, nsfw=0),
+        "package: name='eu.kanade.tachiyomi.extension.en.comix' versionCode='' versionName='1.4.2147483649' "
+        "platformBuildVersionName='' platformBuildVersionCode=''\n"
+        "application-label:'Tachiyomi: Comix'\n" + ICON_LINES
+        + "application: label='Tachiyomi: Comix' icon='res/mipmap-mdpi-v4/ic_launcher.png'\n"
+        "meta-data: name='tachiyomi.extension.nsfw' value='0'\n",
+    ),
+}
+
+def build_apk(path, label, version_code, nsfw, label_from_resources=False, utf8=False, **manifest_args):
+    table, ids = resource_table([
+        ("mipmap", [("ic_launcher", [
+            ("", density, f"res/mipmap-{qualifier}-v4/ic_launcher.png") for density, qualifier in DENSITIES.items()
+        ])]),
+        ("string", [("app_name", [("", 0, label)])]),
+    ])
+    manifest = binary_manifest(
+        "eu.kanade.tachiyomi.extension.en.comix", version_code, f"1.4.{version_code}", label,
+        ids[("mipmap", "ic_launcher")], nsfw,
+        label_id=ids[("string", "app_name")] if label_from_resources else None, utf8=utf8, **manifest_args,
+    )
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("AndroidManifest.xml", manifest)
+        z.writestr("resources.arsc", table)
+
+class NativeBadgingTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def test_matches_aapt(self):
+        for name, (apk_args, aapt_output) in CASES.items():
+            with self.subTest(name):
+                apk = self.tmp / "extension.apk"
+                build_apk(apk, **apk_args)
+                self.assertEqual(read_native_badging(apk), parse_badging(aapt_output))
+
+    def test_edge_cases(self):
+        expected = {
+            "label with quotes and non-ascii": ("label", 'Tachiyomi: Reaper\'s "Scans" \\ 漫画'),
+            "boolean nsfw": ("nsfw", -1),
+            "no nsfw meta-data": ("nsfw", None),
+            "hex versionCode": ("code", 42),
+            "zero versionCode": ("code", None),
+            "negative versionCode": ("code", None),
+        }
+        for name, (key, value) in expected.items():
+            with self.subTest(name):
+                self.assertEqual(parse_badging(CASES[name][1])[key], value)
+
+    def test_bench_fixtures(self):
+        # Covers literal and referenced labels, both string pool encodings and "all" extensions
+        for i in range(7):
+            with self.subTest(i=i):
+                apk = self.tmp / f"bench{i}.apk"
+                package = make_apk(apk, i)
+                self.assertEqual(read_native_badging(apk), {
+                    "pkg": package,
+                    "code": i % 50 + 1,
+                    "version": f"1.4.{i % 50 + 1}",
+                    "label": f"Tachiyomi: Bench Extension {i}",
+                    "icon": "res/mipmap-xhdpi-v4/ic_launcher.png",
+                    "nsfw": i % 2,
+                })
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from build_durations import parse_duration, parse_profile, record
+
+ROOT = Path(__file__).resolve().parents[3]
+
+# Task Execution table of a `gradlew --profile` report
+PROFILE = """\
+<div class="tab" id="tab3">
+<h2>Task Execution</h2>
+<table>
+<thead><tr><th>Task</th><th class="numeric">Duration</th><th>Result</th></tr></thead>
+<tr>
+<td>:core</td>
+<td class="numeric">4.210s</td>
+<td>(total)</td>
+</tr>
+<tr>
+<td class="indentPath">:core:compileReleaseKotlin</td>
+<td class="numeric">4.210s</td>
+<td></td>
+</tr>
+<tr>
+<td>:src:en:comix</td>
+<td class="numeric">1m2.500s</td>
+<td>(total)</td>
+</tr>
+<tr>
+<td class="indentPath">:src:en:comix:compileReleaseKotlin</td>
+<td class="numeric">50.000s</td>
+<td></td>
+</tr>
+<tr>
+<td>:src:all:mangafire</td>
+<td class="numeric">0.750s</td>
+<td>(total)</td>
+</tr>
+</table>
+</div>
+"""
+
+class BuildDurationsTest(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("0.750s"), 0.75)
+        self.assertEqual(parse_duration("1m2.500s"), 62.5)
+        self.assertEqual(parse_duration("1h 0m 1s"), 3601)
+        self.assertIsNone(parse_duration("-"))
+
+    def test_parse_profile(self):
+        self.assertEqual(parse_profile(PROFILE), {":src:en:comix": 62.5, ":src:all:mangafire": 0.75})
+
+    def test_record_merges_and_drops_removed_modules(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = Path(tmp)
+            profile = repo / "profile.html"
+            profile.write_text(PROFILE, encoding="utf-8")
+            (repo / "build-durations.json").write_text(
+                json.dumps({":src:en:comix": 37.5, ":src:en:elftoon": 20.0, ":src:en:removed": 5.0}),
+            )
+            record(repo, [profile], root=ROOT)
+            self.assertEqual(
+                json.loads((repo / "build-durations.json").read_text()),
+                {":src:all:mangafire": 0.75, ":src:en:comix": 50.0, ":src:en:elftoon": 20.0},
+            )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import importlib.util
+import sys
+import unittest
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from build_inputs import module_hashes, unchanged_modules
+
+ROOT = SCRIPTS_DIR.parents[1]
+
+spec = importlib.util.spec_from_file_location("generate_build_matrices", SCRIPTS_DIR / "generate-build-matrices.py")
+matrices = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(matrices)
+
+class BuildAvoidanceTest(unittest.TestCase):
+    def test_listed_modules(self):
+        self.assertEqual(
+            matrices.get_listed_modules([":src:en:comix"]), ([":src:en:comix"], ["en.comix"]),
+        )
+
+    def test_only_matching_build_type_is_skipped(self):
+        modules = [":src:en:comix", ":src:en:elftoon", ":src:en:madokami"]
+        hashes = module_hashes(modules, "Release", ROOT, cache_dir=None)
+        published = {
+            ":src:en:comix": {"hash": hashes[":src:en:comix"], "buildType": "Release", "apk": "comix.apk"},
+            ":src:en:elftoon": {"hash": hashes[":src:en:elftoon"], "buildType": "Debug", "apk": "elftoon.apk"},
+            ":src:en:madokami": {"hash": "0" * 64, "buildType": "Release", "apk": "madokami.apk"},
+        }
+        unchanged = unchanged_modules(modules, "Release", published, ROOT, cache_dir=None)
+        self.assertEqual(unchanged, {":src:en:comix": (hashes[":src:en:comix"], "comix.apk")})
+        self.assertEqual(unchanged_modules(modules, "Debug", published, ROOT, cache_dir=None), {})
+
+class PackChunksTest(unittest.TestCase):
+    def test_balances_by_duration(self):
+        durations = {":a": 50.0, ":b": 40.0, ":c": 30.0, ":d": 20.0, ":e": 10.0}
+        chunks = matrices.pack_chunks(list(durations), durations, 2)
+        self.assertEqual(chunks, [[":a", ":d", ":e"], [":b", ":c"]])
+
+    def test_unknown_modules_cost_the_median(self):
+        durations = {":a": 100.0, ":b": 10.0, ":c": 30.0}
+        chunks = matrices.pack_chunks([":a", ":b", ":c", ":new"], durations, 2)
+        # :new costs 30s, so it goes with :b and :c rather than with :a
+        self.assertEqual(chunks, [[":a"], [":c", ":new", ":b"]])
+
+    def test_without_durations(self):
+        chunks = matrices.pack_chunks([":c", ":a", ":b"], {}, 2)
+        self.assertEqual(chunks, [[":a", ":c"], [":b"]])
+        self.assertEqual(matrices.pack_chunks([], {}, 1), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import argparse
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from delta_feed import max_deltas_arg, write_delta
+
+class DeltaChainTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.repo = Path(tmp.name)
+
+    def write(self, generation, max_deltas):
+        current = {"pkg": {"pkg": "pkg", "code": generation}}
+        write_delta(self.repo, generation, current, [], ["pkg"], [], max_deltas)
+        return json.loads((self.repo / "deltas" / "index.json").read_text())
+
+    def test_chain_is_trimmed(self):
+        for generation in range(1, 4):
+            chain = self.write(generation, 2)
+        self.assertEqual([x["generation"] for x in chain["deltas"]], [2, 3])
+        self.assertEqual(chain["oldest"], 1)
+        self.assertFalse((self.repo / "deltas" / "1.json").exists())
+
+        chain = self.write(4, 1)
+        self.assertEqual([x["generation"] for x in chain["deltas"]], [4])
+        self.assertEqual(sorted(x.name for x in (self.repo / "deltas").iterdir()), ["4.json", "index.json"])
+
+    def test_max_deltas_below_one(self):
+        self.assertEqual(max_deltas_arg("1"), 1)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            max_deltas_arg("0")
+        with self.assertRaises(ValueError):
+            self.write(1, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from index_model import IndexFormatError, iter_json_array
+
+class IterJsonArrayTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "index.json"
+
+    def read(self, text, chunk_size):
+        self.path.write_text(text, encoding="utf-8")
+        return list(iter_json_array(self.path, chunk_size))
+
+    def test_chunk_boundaries(self):
+        text = '[45000000000.0, -1.5e10,12 ,{"a": [1, 2.5]}, "x,]", true, null, 3e-2, 7]'
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.read(text, chunk_size), json.loads(text))
+
+    def test_number_at_end_of_file(self):
+        # A bare number right before a truncated end is still cut off, so the array is incomplete
+        with self.assertRaises(IndexFormatError):
+            self.read("[1, 45000000000.0", 1)
+
+    def test_empty_and_invalid(self):
+        self.assertEqual(self.read(" [ ] ", 1), [])
+        with self.assertRaises(IndexFormatError):
+            self.read('{"a": 1}', 1)
+        with self.assertRaises(IndexFormatError):
+            self.read("[1 2]", 1)
+
+if __name__ == "__main__":
+    unittest.main()
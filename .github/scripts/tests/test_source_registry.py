@@ -0,0 +1,109 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from extension_metadata import extension_sources
+from publish import ApkInfo, index_item
+from source_registry import (
+    REGISTRY_BY_PKG, get_http_source_id, get_source_id, get_source_ids, java_hash_code, pin_sources,
+)
+
+ROOT = Path(__file__).resolve().parents[3]
+
+# IDs already in users' libraries; changing any of them orphans their manga
+KNOWN_SOURCES = {
+    "eu.kanade.tachiyomi.extension.en.comix": ("Comix", "7537715367149829912", "https://comix.to"),
+    "eu.kanade.tachiyomi.extension.en.elftoon": ("Elf Toon", "884729104728194726", "https://elftoon.xyz"),
+    "eu.kanade.tachiyomi.extension.en.likemanga": ("Like Manga", "411833355147795520", "https://likemanga.ink"),
+    "eu.kanade.tachiyomi.extension.en.likemangain": ("Like Manga In", "611833355147795521", "https://likemanga.in"),
+    "eu.kanade.tachiyomi.extension.en.madokami": ("Madokami", "-366516493107589975", "https://manga.madokami.al"),
+    "eu.kanade.tachiyomi.extension.all.mangafire": ("MangaFire", "1695572115", "https://mangafire.to"),
+}
+
+def module_lang(pkg):
+    return pkg.rsplit(".", 2)[-2]
+
+class JavaHashCodeTest(unittest.TestCase):
+    def test_known_values(self):
+        self.assertEqual(java_hash_code(""), 0)
+        self.assertEqual(java_hash_code("hello"), 99162322)
+        self.assertEqual(java_hash_code("en"), 3241)
+        self.assertEqual(java_hash_code("all"), 96673)
+
+    def test_wraps_to_signed_32_bit(self):
+        self.assertEqual(java_hash_code("polygenelubricants"), -2**31)
+
+    def test_hashes_utf16_code_units(self):
+        # A surrogate pair, as Java sees it: 0xD83D * 31 + 0xDE00
+        self.assertEqual(java_hash_code("\U0001F600"), 1772899)
+
+class SourceIdTest(unittest.TestCase):
+    def test_pinned_ids(self):
+        # The registry's MangaFire ID came from the hashCode formula with lang "en"
+        self.assertEqual(get_source_id("MangaFire", "en"), "1695572115")
+        self.assertEqual(get_source_id("MangaFire", "all"), "1695568874")
+
+    def test_http_source_id(self):
+        self.assertEqual(get_http_source_id("MangaDex", "en"), "2499283573021220255")
+        self.assertEqual(get_http_source_id("mangadex", "en"), get_http_source_id("MangaDex", "en"))
+        self.assertNotEqual(get_http_source_id("MangaDex", "en", 2), get_http_source_id("MangaDex", "en"))
+
+class RegistryTest(unittest.TestCase):
+    def test_known_sources(self):
+        self.assertEqual(
+            {pkg: (x["name"], x["id"], x["baseUrl"]) for pkg, x in REGISTRY_BY_PKG.items()}, KNOWN_SOURCES,
+        )
+
+    def test_ids_are_unique(self):
+        ids = [entry["id"] for entry in REGISTRY_BY_PKG.values()]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_get_source_ids(self):
+        sources = [(pkg, name, module_lang(pkg)) for pkg, (name, _, _) in KNOWN_SOURCES.items()] + [
+            # "Like Manga" must not pick up Like Manga In's ID, or the other way around
+            ("eu.kanade.tachiyomi.extension.en.likemanganew", "Like Manga", "en"),
+            ("eu.kanade.tachiyomi.extension.en.other", "Other", "en"),
+            ("eu.kanade.tachiyomi.extension.all.other", "Other", "all"),
+        ]
+        self.assertEqual(get_source_ids(sources), [(x[1], x[2]) for x in KNOWN_SOURCES.values()] + [
+            ("411833355147795520", "https://likemanga.ink"),
+            (get_source_id("Other", "en"), ""),
+            (get_source_id("Other", "all"), ""),
+        ])
+        self.assertEqual(get_source_ids([]), [])
+
+    def test_index_items_use_registry(self):
+        # Sources read from the code must not override the registry, even when they disagree
+        static = extension_sources(ROOT, cache_dir=None, workers=1, pinned=False)
+        for pkg, (name, source_id, base_url) in KNOWN_SOURCES.items():
+            lang = module_lang(pkg)
+            apk_name = f"tachiyomi-{lang}.{pkg.rsplit('.', 1)[-1]}-v1.4.1.apk"
+            badging = {
+                "pkg": pkg, "code": 1, "version": "1.4.1", "label": f"Tachiyomi: {name}", "icon": None, "nsfw": 0,
+            }
+            expected = [{"name": name, "id": source_id, "lang": lang, "baseUrl": base_url}]
+            for sources in (None, static):
+                with self.subTest(pkg=pkg, static=sources is not None):
+                    _, item = index_item(apk_name, ApkInfo("0" * 64, 1, "sig", badging), sources)
+                    self.assertEqual(item["sources"], expected)
+
+    def test_extension_sources_are_pinned(self):
+        sources = extension_sources(ROOT, cache_dir=None, workers=1)
+        for pkg, (name, source_id, base_url) in KNOWN_SOURCES.items():
+            with self.subTest(pkg=pkg):
+                self.assertEqual(
+                    sources[pkg], [{"name": name, "lang": module_lang(pkg), "id": source_id, "baseUrl": base_url}],
+                )
+
+    def test_pin_sources_matches_by_name(self):
+        comix = "eu.kanade.tachiyomi.extension.en.comixnew"
+        other = "eu.kanade.tachiyomi.extension.en.other"
+        unregistered = [{"name": "Other", "lang": "en", "id": "1", "baseUrl": ""}]
+        pinned = pin_sources({comix: [{"name": "Comix", "lang": "en", "id": "1", "baseUrl": ""}], other: unregistered})
+        self.assertEqual(pinned[comix][0]["id"], "7537715367149829912")
+        self.assertIs(pinned[other], unregistered)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Checks a published repo against its index.
+
+Every entry of index.json must point at an APK in apk/ whose size and
+sha256 match, and at an icon in icon/ that exists. Files in apk/ and icon/
+that no entry references are reported as orphans. APKs are hashed
+concurrently and their digests cached by (size, mtime), so reruns only read
+what changed. Exits with status 1 if anything is wrong.
+
+    python .github/scripts/verify_repo.py [repo dir]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR
+from hashing import DigestCache
+from instrument import count, span
+
+def verify(repo_dir, cache_path=None, workers=None):
+    """
+    Returns a dict of problem kind -> list of descriptions, and the entry count.
+    """
+    repo_dir = Path(repo_dir)
+    with repo_dir.joinpath("index.json").open(encoding="utf-8") as f:
+        index = json.load(f)
+
+    problems = {
+        "duplicate": [],
+        "missing apk": [],
+        "size mismatch": [],
+        "sha256 mismatch": [],
+        "missing icon": [],
+        "orphan apk": [],
+        "orphan icon": [],
+    }
+
+    counts = Counter(item["pkg"] for item in index)
+    problems["duplicate"] = sorted(pkg for pkg, count in counts.items() if count > 1)
+
+    apk_dir = repo_dir.resolve() / "apk"
+    icon_dir = repo_dir / "icon"
+    apk_files = {x.name for x in apk_dir.iterdir()} if apk_dir.exists() else set()
+    icon_files = {x.name for x in icon_dir.iterdir()} if icon_dir.exists() else set()
+
+    referenced_apks = set()
+    referenced_icons = set()
+    to_hash = []
+    for item in index:
+        apk_name = item["apk"].split("/")[-1]
+        referenced_apks.add(apk_name)
+        if apk_name not in apk_files:
+            problems["missing apk"].append(f"{item['pkg']}: {apk_name}")
+        elif "sha256" in item or "size" in item:
+            to_hash.append((item, apk_dir / apk_name))
+
+        icon = item.get("icon", "")
+        if icon and not icon.startswith("http"):
+            icon_name = icon.split("/")[-1]
+            referenced_icons.add(icon_name)
+            # Optimized icons may come with a WebP variant
+            referenced_icons.add(Path(icon_name).with_suffix(".webp").name)
+            if icon_name not in icon_files:
+                problems["missing icon"].append(f"{item['pkg']}: {icon_name}")
+
+    cache = DigestCache(cache_path)
+    with span("hash apks"):
+        digests = cache.digest_many([path for _, path in to_hash], workers)
+    cache.save(keep=digests)
+    count("entries verified", len(index))
+    if cache_path:
+        print(cache.summary())
+
+    for item, path in to_hash:
+        size, sha256 = digests[path]
+        if "size" in item and item["size"] != size:
+            problems["size mismatch"].append(f"{path.name}: index {item['size']}, file {size}")
+        if "sha256" in item and item["sha256"] != sha256:
+            problems["sha256 mismatch"].append(f"{path.name}: index {item['sha256'][:12]}, file {sha256[:12]}")
+
+    problems["orphan apk"] = sorted(x for x in apk_files - referenced_apks if x.endswith(".apk"))
+    problems["orphan icon"] = sorted(icon_files - referenced_icons)
+    return problems, len(index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a published repo against its index.json")
+    parser.add_argument("repo", nargs="?", default=".", help="published repo directory (default: current directory)")
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"where to cache APK digests (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="hash every APK from scratch")
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=int(os.environ["REPO_WORKERS"]) if os.environ.get("REPO_WORKERS") else None,
+        help="number of APKs to hash concurrently (default: CPU count)",
+    )
+    parser.add_argument("--limit", type=int, default=10, help="problems to list per kind (default: 10)")
+    args = parser.parse_args()
+
+    cache_path = None if args.no_cache else os.path.join(args.cache_dir, "verify-digests.json")
+    problems, entries = verify(args.repo, cache_path, args.workers)
+
+    total = sum(len(x) for x in problems.values())
+    if not total:
+        print(f"OK: {entries} entries verified")
+        return
+    print(f"FAILED: {total} problem(s) in {entries} entries")
+    for kind, items in problems.items():
+        if not items:
+            continue
+        print(f"  {kind} ({len(items)}):")
+        for item in items[:args.limit]:
+            print(f"    {item}")
+        if len(items) > args.limit:
+            print(f"    ... and {len(items) - args.limit} more")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Keeps a local repo up to date with the APKs Gradle builds.
+
+Watches the artifacts directory (recursively) with inotify, waits for a
+burst of writes to settle, and then only inspects the APKs that changed:
+each one is copied into the repo, its icon extracted, and the index files
+rewritten in place, the same way publish.py does it. Point a local client at
+the repo (e.g. through repo_server.py) to pick up builds as they land.
+Without inotify (not Linux), the artifacts directory is polled instead.
+
+APKs that disappear from the artifacts directory, e.g. after a Gradle clean,
+stay in the repo. Debug builds aren't signed with the repo key, so set
+REPO_SIGNING_FINGERPRINT to the debug key's fingerprint.
+
+    python .github/scripts/watch_repo.py --artifacts src --remote repo
+"""
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from apk_cache import DEFAULT_CACHE_DIR, ApkCache
+from apk_signature import REPO_FINGERPRINT, SignatureError
+from badging import find_aapt, tool_version
+from delta_feed import read_generation
+from extension_metadata import extension_sources
+from index_model import load_entries
+from index_writer import COMPRESSIONS
+from instrument import count, span
+from publish import MergeResult, inspect_apk, normalize, place_file, same_file, write
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+DEFAULT_DEBOUNCE = 0.25
+# A build that keeps writing still gets picked up this often
+MAX_DELAY = 5.0
+
+def published_name(apk):
+    # Same renaming as the collect stage of publish.py
+    return apk.name.replace("-release.apk", ".apk")
+
+class InotifyWatcher:
+    """
+    Reports the APKs written or moved into a directory tree.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        self.add_tree(self.root)
+
+    def add_tree(self, directory):
+        """
+        Watches directory and its subdirectories. Returns the APKs already in them.
+        """
+        found = []
+        for current, dirs, files in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"can't watch {current}")
+            self._dirs[wd] = Path(current)
+            found += [Path(current, x) for x in files if x.endswith(".apk")]
+        return found
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(readable)
+
+    def read(self):
+        changed = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0")
+            pos += EVENT_HEADER.size + length
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            if wd not in self._dirs:
+                continue
+            path = self._dirs[wd] / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # Files may have landed in a new directory before it was watched
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed += self.add_tree(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and path.suffix == ".apk":
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Same as InotifyWatcher, by comparing (size, mtime) of the APKs every interval.
+    """
+
+    def __init__(self, root, interval=1.0):
+        self.root = Path(root)
+        self.interval = interval
+        self._seen = self._snapshot()
+
+    def _snapshot(self):
+        snapshot = {}
+        for apk in self.root.glob("**/*.apk"):
+            try:
+                stat = apk.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[apk] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval) if timeout is not None else self.interval)
+        return True
+
+    def read(self):
+        snapshot = self._snapshot()
+        changed = [apk for apk, record in snapshot.items() if self._seen.get(apk) != record]
+        self._seen = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def batches(watcher, debounce):
+    """
+    Yields sets of changed APKs once no new change came in for debounce seconds.
+    """
+    pending = set()
+    first = last = 0.0
+    while True:
+        timeout = None
+        if pending:
+            timeout = max(0.0, min(last + debounce, first + MAX_DELAY) - time.monotonic())
+        changed = watcher.read() if watcher.wait(timeout) else []
+        now = time.monotonic()
+        if changed:
+            if not pending:
+                first = now
+            last = now
+            pending.update(changed)
+        if pending and (now - last >= debounce or now - first >= MAX_DELAY):
+            yield pending
+            pending = set()
+
+class RepoUpdater:
+    """
+    Applies changed APKs to a repo directory and rewrites its index.
+    """
+
+    def __init__(self, remote_repo, cache_dir=DEFAULT_CACHE_DIR, compress=(), shards=False, source_root=".",
+                 search=False):
+        self.remote_repo = Path(remote_repo)
+        self.cache_dir = cache_dir
+        self.source_root = source_root
+        self.apk_dir = self.remote_repo / "apk"
+        self.icon_dir = self.remote_repo / "icon"
+        self.apk_dir.mkdir(parents=True, exist_ok=True)
+        self.icon_dir.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
+        self.shards = shards
+        self.search = search
+        self.aapt_cmd = find_aapt()
+        self.cache = ApkCache(cache_dir, f"{tool_version(self.aapt_cmd)}/icons-none") if cache_dir else None
+        self.generation = read_generation(self.remote_repo)
+        self.entries = {}
+        index_path = self.remote_repo / "index.json"
+        if index_path.exists():
+            self.entries = {x.pkg: x for x in load_entries(index_path, REPO_FINGERPRINT)}
+
+    def update(self, apks):
+        """
+        Inspects the given APKs and rewrites the index if any entry changed.
+        Returns the (added, updated) package names.
+        """
+        start = time.perf_counter()
+        added, updated = [], []
+        unchanged = skipped = 0
+        # Read again each time, as the sources may have been edited since; only changed modules are parsed
+        sources = None
+        for apk in sorted(apks):
+            # Gradle also leaves unpackaged APKs in its intermediates
+            if not apk.is_file() or "intermediates" in apk.parts:
+                continue
+            name = published_name(apk)
+            target = self.apk_dir / name
+            if same_file(apk, target):
+                unchanged += 1
+                continue
+            if sources is None:
+                with span("read sources"):
+                    sources = extension_sources(self.source_root, self.cache_dir)
+            # Inspected where it was built, so a rejected APK never replaces a published one
+            try:
+                with span("inspect"):
+                    result = inspect_apk(
+                        str(apk.parent), str(self.icon_dir), apk.name, self.aapt_cmd, self.cache, sources=sources,
+                    )
+            except SignatureError as e:
+                print(f"Skipping {name}: {e}")
+                result = None
+            if result is None:
+                skipped += 1
+                continue
+            place_file(apk, target)
+            result[1]["apk"] = name
+            entry = normalize(result[1])
+            old = self.entries.get(entry.pkg)
+            if old is not None and old.apk != entry.apk:
+                # A new version replaces the previous APK of the same extension
+                self.apk_dir.joinpath(old.apk).unlink(missing_ok=True)
+            if old is None:
+                added.append(entry.pkg)
+            elif old != entry:
+                updated.append(entry.pkg)
+            else:
+                unchanged += 1
+            self.entries[entry.pkg] = entry
+        if self.cache is not None:
+            self.cache.save()
+
+        if added or updated:
+            self.generation += 1
+            result = MergeResult(
+                sorted(self.entries.values(), key=lambda x: x.pkg), sorted(added), sorted(updated), [], self.generation,
+            )
+            with span("write"):
+                write(self.remote_repo, result, compress=self.compress, shards=self.shards, search=self.search)
+        count("apks added", len(added))
+        count("apks updated", len(updated))
+        count("apks unchanged", unchanged)
+        print(
+            f"Updated the repo in {time.perf_counter() - start:.3f} s: "
+            f"{len(added)} added, {len(updated)} updated, {unchanged} unchanged, {skipped} skipped"
+        )
+        return added, updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate a local repo whenever built APKs change")
+    parser.add_argument("--artifacts", default="src", help="directory tree to watch for APKs (default: src)")
+    parser.add_argument("--remote", default="repo", help="repo directory to update (default: repo)")
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        help=f"seconds without new writes before updating (default: {DEFAULT_DEBOUNCE})",
+    )
+    parser.add_argument("--poll", type=float, metavar="SECONDS", help="poll instead of using inotify")
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"APK metadata cache location (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="inspect every APK from scratch")
+    parser.add_argument("--compress", nargs="*", choices=COMPRESSIONS, default=[], help="also write compressed indexes")
+    parser.add_argument("--shards", action="store_true", help="also write per-language/nsfw index shards")
+    parser.add_argument("--search", action="store_true", help="also write a search.json token and trigram index")
+    parser.add_argument("--no-initial", action="store_true", help="don't sync the APKs already there on startup")
+    args = parser.parse_args()
+
+    artifacts = Path(args.artifacts)
+    artifacts.mkdir(parents=True, exist_ok=True)
+    updater = RepoUpdater(
+        args.remote, None if args.no_cache else args.cache_dir, tuple(args.compress), args.shards, search=args.search,
+    )
+
+    watcher = None
+    if args.poll is None:
+        try:
+            watcher = InotifyWatcher(artifacts)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling every second instead")
+    if watcher is None:
+        watcher = PollingWatcher(artifacts, args.poll or 1.0)
+
+    if not args.no_initial:
+        updater.update(set(artifacts.glob("**/*.apk")))
+    print(f"Watching {artifacts} for APKs, updating {args.remote}")
+    try:
+        for apks in batches(watcher, args.debounce):
+            updater.update(apks)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    main()